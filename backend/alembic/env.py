@@ -23,6 +23,12 @@ if config.config_file_name is not None:
         # ignore missing logging sections or parse errors
         pass
 
+# Point migrations at the same database as the app when DATABASE_URL is set
+if os.getenv("DATABASE_URL"):
+    config.set_main_option(
+        "sqlalchemy.url", os.environ["DATABASE_URL"].replace("%", "%%")
+    )
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 target_metadata = models.Base.metadata
@@ -0,0 +1,62 @@
+"""add normalized lead dedupe keys
+
+Revision ID: 0006_add_lead_dedupe_keys
+Revises: 0005_add_automation_flow
+Create Date: 2026-10-18 09:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0006_add_lead_dedupe_keys"
+down_revision = "0005_add_automation_flow"
+branch_labels = None
+depends_on = None
+
+
+def _normalize_name(value):
+    if not value:
+        return None
+    return " ".join(str(value).split()).casefold() or None
+
+
+def _normalize_email(value):
+    if not value:
+        return None
+    return str(value).strip().lower() or None
+
+
+_KEYS = (
+    ("companies", "name", "name_key", _normalize_name),
+    ("contacts", "email", "email_key", _normalize_email),
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    for table, source, key, normalize in _KEYS:
+        # 0001 creates tables from the current models, so the column may exist
+        columns = {c["name"] for c in inspector.get_columns(table)}
+        if key not in columns:
+            op.add_column(table, sa.Column(key, sa.String(), nullable=True))
+        indexes = {i["name"] for i in inspector.get_indexes(table)}
+        if f"ix_{table}_{key}" not in indexes:
+            op.create_index(f"ix_{table}_{key}", table, [key])
+
+        rows = conn.execute(
+            sa.text(f"SELECT id, {source} FROM {table} WHERE {source} IS NOT NULL")
+        ).fetchall()
+        params = [{"id": r[0], "key": normalize(r[1])} for r in rows]
+        if params:
+            conn.execute(
+                sa.text(f"UPDATE {table} SET {key} = :key WHERE id = :id"), params
+            )
+
+
+def downgrade():
+    for table, _source, key, _normalize in _KEYS:
+        op.drop_index(f"ix_{table}_{key}", table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column(key)
@@ -0,0 +1,26 @@
+"""index companies.lead_score for report filters
+
+Revision ID: 0007_add_lead_score_index
+Revises: 0006_add_lead_dedupe_keys
+Create Date: 2026-10-18 12:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0007_add_lead_score_index"
+down_revision = "0006_add_lead_dedupe_keys"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so the index may exist
+    indexes = {i["name"] for i in sa.inspect(op.get_bind()).get_indexes("companies")}
+    if "ix_companies_lead_score" not in indexes:
+        op.create_index("ix_companies_lead_score", "companies", ["lead_score"])
+
+
+def downgrade():
+    op.drop_index("ix_companies_lead_score", table_name="companies")
@@ -0,0 +1,28 @@
+"""full-text search index over company name and description
+
+Revision ID: 0008_add_company_search_fts
+Revises: 0007_add_lead_score_index
+Create Date: 2026-10-18 13:00:00.000000
+"""
+
+from alembic import op
+from app import search
+
+# revision identifiers, used by Alembic.
+revision = "0008_add_company_search_fts"
+down_revision = "0007_add_lead_score_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite only; other databases use the unindexed fallback in app.search
+    search.ensure_fts(op.get_bind())
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for suffix in ("ai", "ad", "au"):
+        op.execute(f"DROP TRIGGER IF EXISTS {search.FTS_TABLE}_{suffix}")
+    op.execute(f"DROP TABLE IF EXISTS {search.FTS_TABLE}")
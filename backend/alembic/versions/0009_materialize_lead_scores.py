@@ -0,0 +1,47 @@
+"""store computed lead scores on companies
+
+Revision ID: 0009_materialize_lead_scores
+Revises: 0008_add_company_search_fts
+Create Date: 2026-10-18 14:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0009_materialize_lead_scores"
+down_revision = "0008_add_company_search_fts"
+branch_labels = None
+depends_on = None
+
+
+def _columns():
+    return (
+        sa.Column("score", sa.Float(), nullable=True),
+        sa.Column("recommended_action", sa.String(), nullable=True),
+        sa.Column("official_registry_id", sa.String(), nullable=True),
+        sa.Column("industry", sa.String(), nullable=True),
+        sa.Column("enriched", sa.Integer(), nullable=True, server_default="0"),
+        sa.Column("scored_at", sa.DateTime(), nullable=True),
+        sa.Column("score_input_hash", sa.String(), nullable=True),
+    )
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so columns may exist;
+    # existing rows start with a NULL scored_at and get scored by the worker
+    inspector = sa.inspect(op.get_bind())
+    columns = {c["name"] for c in inspector.get_columns("companies")}
+    for column in _columns():
+        if column.name not in columns:
+            op.add_column("companies", column)
+    indexes = {i["name"] for i in inspector.get_indexes("companies")}
+    if "ix_companies_scored_at" not in indexes:
+        op.create_index("ix_companies_scored_at", "companies", ["scored_at"])
+
+
+def downgrade():
+    op.drop_index("ix_companies_scored_at", table_name="companies")
+    with op.batch_alter_table("companies") as batch_op:
+        for column in reversed(_columns()):
+            batch_op.drop_column(column.name)
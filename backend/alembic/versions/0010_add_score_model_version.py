@@ -0,0 +1,29 @@
+"""record which scoring model produced the stored scores
+
+Revision ID: 0010_add_score_model_version
+Revises: 0009_materialize_lead_scores
+Create Date: 2026-10-18 15:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0010_add_score_model_version"
+down_revision = "0009_materialize_lead_scores"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so the column may exist
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("companies")}
+    if "score_model_version" not in columns:
+        op.add_column(
+            "companies", sa.Column("score_model_version", sa.String(), nullable=True)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("companies") as batch_op:
+        batch_op.drop_column("score_model_version")
@@ -0,0 +1,40 @@
+"""rescore_jobs checkpoint table for full-book rescoring
+
+Revision ID: 0011_add_rescore_jobs
+Revises: 0010_add_score_model_version
+Create Date: 2026-10-18 16:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0011_add_rescore_jobs"
+down_revision = "0010_add_score_model_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so the table may exist
+    if "rescore_jobs" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "rescore_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("model_version", sa.String(), nullable=True),
+        sa.Column("last_id", sa.Integer(), nullable=True),
+        sa.Column("processed", sa.Integer(), nullable=True),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_rescore_jobs_id", "rescore_jobs", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_rescore_jobs_id", table_name="rescore_jobs")
+    op.drop_table("rescore_jobs")
@@ -0,0 +1,84 @@
+"""company_features table for incrementally maintained scoring features
+
+Revision ID: 0012_add_company_features
+Revises: 0011_add_rescore_jobs
+Create Date: 2026-10-18 17:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0012_add_company_features"
+down_revision = "0011_add_rescore_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, column in (
+        ("opportunities", "company_id"),
+        ("activities", "opportunity_id"),
+    ):
+        name = f"ix_{table}_{column}"
+        if name not in {ix["name"] for ix in inspector.get_indexes(table)}:
+            op.create_index(name, table, [column])
+    # 0001 creates tables from the current models, so the table may exist
+    if "company_features" in inspector.get_table_names():
+        return
+    op.create_table(
+        "company_features",
+        sa.Column(
+            "company_id",
+            sa.Integer(),
+            sa.ForeignKey("companies.id"),
+            primary_key=True,
+        ),
+        sa.Column("opportunity_count", sa.Integer(), nullable=False),
+        sa.Column("open_opportunity_count", sa.Integer(), nullable=False),
+        sa.Column("open_value", sa.Float(), nullable=False),
+        sa.Column("activity_count", sa.Integer(), nullable=False),
+        sa.Column("last_activity_at", sa.DateTime(), nullable=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    # backfill from the existing history; scores pick the features up on the
+    # next rescoring pass
+    op.execute("""
+        INSERT INTO company_features (
+            company_id, opportunity_count, open_opportunity_count, open_value,
+            activity_count, last_activity_at, version, updated_at
+        )
+        SELECT o.company_id,
+               COUNT(*),
+               SUM(CASE WHEN COALESCE(o.status, 'open') = 'open' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN COALESCE(o.status, 'open') = 'open'
+                        THEN COALESCE(o.value, 0) ELSE 0 END),
+               COALESCE(MAX(a.activity_count), 0),
+               MAX(a.last_activity_at),
+               1,
+               CURRENT_TIMESTAMP
+        FROM opportunities AS o
+        LEFT JOIN (
+            SELECT o2.company_id AS company_id,
+                   COUNT(*) AS activity_count,
+                   MAX(act.created_at) AS last_activity_at
+            FROM activities AS act
+            JOIN opportunities AS o2 ON o2.id = act.opportunity_id
+            GROUP BY o2.company_id
+        ) AS a ON a.company_id = o.company_id
+        WHERE o.company_id IS NOT NULL
+        GROUP BY o.company_id
+        """)
+    op.execute(
+        "UPDATE companies SET scored_at = NULL "
+        "WHERE id IN (SELECT company_id FROM company_features)"
+    )
+
+
+def downgrade():
+    op.drop_table("company_features")
+    op.drop_index("ix_activities_opportunity_id", table_name="activities")
+    op.drop_index("ix_opportunities_company_id", table_name="opportunities")
@@ -0,0 +1,37 @@
+"""claimed_by / lease_until on webhook_queue for multi-worker delivery
+
+Revision ID: 0013_add_webhook_leases
+Revises: 0012_add_company_features
+Create Date: 2026-10-18 18:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0013_add_webhook_leases"
+down_revision = "0012_add_company_features"
+branch_labels = None
+depends_on = None
+
+
+def _columns():
+    return (
+        sa.Column("claimed_by", sa.String(), nullable=True),
+        sa.Column("lease_until", sa.DateTime(), nullable=True),
+    )
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so columns may exist
+    inspector = sa.inspect(op.get_bind())
+    columns = {c["name"] for c in inspector.get_columns("webhook_queue")}
+    for column in _columns():
+        if column.name not in columns:
+            op.add_column("webhook_queue", column)
+
+
+def downgrade():
+    with op.batch_alter_table("webhook_queue") as batch_op:
+        for column in reversed(_columns()):
+            batch_op.drop_column(column.name)
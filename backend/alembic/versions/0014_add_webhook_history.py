@@ -0,0 +1,64 @@
+"""webhook_history for finished webhooks, and the due-row queue index
+
+Revision ID: 0014_add_webhook_history
+Revises: 0013_add_webhook_leases
+Create Date: 2026-10-18 20:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0014_add_webhook_history"
+down_revision = "0013_add_webhook_leases"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so these may exist
+    inspector = sa.inspect(op.get_bind())
+    if "webhook_history" not in inspector.get_table_names():
+        op.create_table(
+            "webhook_history",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("webhook_id", sa.Integer(), nullable=True),
+            sa.Column("url", sa.String(), nullable=False),
+            sa.Column("payload", sa.Text(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=True),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index(
+            "ix_webhook_history_webhook_id", "webhook_history", ["webhook_id"]
+        )
+        op.create_index(
+            "ix_webhook_history_finished_at", "webhook_history", ["finished_at"]
+        )
+    queue_indexes = {i["name"] for i in inspector.get_indexes("webhook_queue")}
+    if "ix_webhook_queue_due" not in queue_indexes:
+        op.create_index(
+            "ix_webhook_queue_due", "webhook_queue", ["next_attempt_at", "id"]
+        )
+
+    # dead letters now live in the history table
+    op.execute(
+        "INSERT INTO webhook_history (webhook_id, url, payload, status, attempts,"
+        " last_error, created_at, finished_at)"
+        " SELECT id, url, payload, 'dead', attempts, last_error, created_at,"
+        " CURRENT_TIMESTAMP FROM webhook_queue WHERE dead = 1"
+    )
+    op.execute("DELETE FROM webhook_queue WHERE dead = 1")
+
+
+def downgrade():
+    op.execute(
+        "INSERT INTO webhook_queue (url, payload, attempts, last_error,"
+        " next_attempt_at, dead, created_at)"
+        " SELECT url, payload, attempts, last_error, NULL, 1, created_at"
+        " FROM webhook_history WHERE status = 'dead'"
+    )
+    op.drop_index("ix_webhook_queue_due", table_name="webhook_queue")
+    op.drop_table("webhook_history")
@@ -0,0 +1,37 @@
+"""webhook_destinations: per receiver batching / compression settings
+
+Revision ID: 0015_add_webhook_destinations
+Revises: 0014_add_webhook_history
+Create Date: 2026-10-18 21:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0015_add_webhook_destinations"
+down_revision = "0014_add_webhook_history"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so it may exist
+    inspector = sa.inspect(op.get_bind())
+    if "webhook_destinations" in inspector.get_table_names():
+        return
+    op.create_table(
+        "webhook_destinations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("url", sa.String(), nullable=False),
+        sa.Column("batch_size", sa.Integer(), nullable=True),
+        sa.Column("gzip_min_bytes", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        "ix_webhook_destinations_url", "webhook_destinations", ["url"], unique=True
+    )
+
+
+def downgrade():
+    op.drop_table("webhook_destinations")
@@ -0,0 +1,36 @@
+"""webhook_history.requeued_from: requeues are appended, not edited in place
+
+Revision ID: 0016_add_webhook_history_requeued_from
+Revises: 0015_add_webhook_destinations
+Create Date: 2026-10-19 10:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0016_add_webhook_history_requeued_from"
+down_revision = "0015_add_webhook_destinations"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so the column may exist
+    inspector = sa.inspect(op.get_bind())
+    columns = {c["name"] for c in inspector.get_columns("webhook_history")}
+    if "requeued_from" not in columns:
+        op.add_column(
+            "webhook_history", sa.Column("requeued_from", sa.Integer(), nullable=True)
+        )
+    indexes = {i["name"] for i in inspector.get_indexes("webhook_history")}
+    if "ix_webhook_history_requeued_from" not in indexes:
+        op.create_index(
+            "ix_webhook_history_requeued_from", "webhook_history", ["requeued_from"]
+        )
+
+
+def downgrade():
+    op.drop_index("ix_webhook_history_requeued_from", table_name="webhook_history")
+    with op.batch_alter_table("webhook_history") as batch_op:
+        batch_op.drop_column("requeued_from")
@@ -0,0 +1,32 @@
+"""index the company listing sort keys
+
+Revision ID: 0017_add_company_sort_indexes
+Revises: 0016_add_webhook_history_requeued_from
+Create Date: 2026-10-20 10:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0017_add_company_sort_indexes"
+down_revision = "0016_add_webhook_history_requeued_from"
+branch_labels = None
+depends_on = None
+
+# name -> expression; must match models.COMPANY_NAME_SORT / COMPANY_SCORE_SORT
+SORT_INDEXES = {
+    "ix_companies_name_sort": "coalesce(name, '')",
+    "ix_companies_lead_score_sort": "coalesce(lead_score, 0.0)",
+}
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so the indexes may exist;
+    # the inspector does not reflect expression indexes, hence IF NOT EXISTS
+    for name, expression in SORT_INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON companies ({expression})")
+
+
+def downgrade():
+    for name in SORT_INDEXES:
+        op.drop_index(name, table_name="companies")
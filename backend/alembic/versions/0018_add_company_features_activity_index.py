@@ -0,0 +1,28 @@
+"""index company_features.last_activity_at for the recency sweep
+
+Revision ID: 0018_add_company_features_activity_index
+Revises: 0017_add_company_sort_indexes
+Create Date: 2026-10-20 12:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0018_add_company_features_activity_index"
+down_revision = "0017_add_company_sort_indexes"
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_company_features_last_activity_at"
+
+
+def upgrade():
+    # 0001 creates tables from the current models, so the index may exist
+    inspector = sa.inspect(op.get_bind())
+    if INDEX not in {i["name"] for i in inspector.get_indexes("company_features")}:
+        op.create_index(INDEX, "company_features", ["last_activity_at"])
+
+
+def downgrade():
+    op.drop_index(INDEX, table_name="company_features")
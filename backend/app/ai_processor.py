@@ -1,27 +1,356 @@
+"""Lead scoring.
+
+Scores come from the active `Scorer`. The default `HeuristicScorer` takes a
+lead's own `lead_score` (0 when missing), +0.15 when it has an email, +0.05
+for names longer than 10 characters, +0.05 for activity in the last 30 days,
++0.05 for open pipeline value, plus noise in [-0.04, 0.04), clipped to
+[0, 1] and rounded to 4 places. Setting BBH_SCORING_MODEL to a trained
+model file (JSON or .npz, see `load_model`) replaces it; the file is
+re-checked every BBH_SCORING_MODEL_CHECK seconds (2) and hot-swapped.
+
+Seeded noise comes from SplitMix64 applied to the seed: a stateless,
+per-lead stream that needs no shared RNG (safe across threads) and can be
+evaluated for a whole batch at once. Scorers use NumPy when it is installed
+and give identical results without it.
+"""
+
+import abc
+import datetime
+import json
+import logging
+import math
+import os
 import random
-from typing import Dict, List, Optional
+import time
+import zlib
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from . import integrations
+
+EMAIL_BONUS = 0.15
+LONG_NAME_BONUS = 0.05
+LONG_NAME_LEN = 10
+RECENT_ACTIVITY_BONUS = 0.05
+RECENT_ACTIVITY_DAYS = 30
+OPEN_PIPELINE_BONUS = 0.05
+NOISE_SPAN = 0.08
+# stands in for "no activity yet" in days_since_activity
+NO_ACTIVITY_DAYS = 3650.0
+
+# `_features` tuple layout
+FEATURE_COLUMNS = (
+    "lead_score",
+    "has_email",
+    "name_len",
+    "activity_count",
+    "open_opportunity_count",
+    "open_value",
+    "days_since_activity",
+)
+
+logger = logging.getLogger("bmh.scoring")
+
+# score thresholds (ascending) and the action for each band
+ACTION_THRESHOLDS = (0.3, 0.6, 0.85)
+ACTIONS = ("Cold outreach", "Nurture via email", "Schedule meeting", "Call now")
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
 
 
-def score_lead(lead: Dict, seed: Optional[int] = None) -> float:
-    if seed is not None:
-        random.seed(seed)
+def _splitmix64(x: int) -> int:
+    z = (x + _GOLDEN) & _MASK64
+    z = ((z ^ (z >> 30)) * _MIX1) & _MASK64
+    z = ((z ^ (z >> 27)) * _MIX2) & _MASK64
+    return z ^ (z >> 31)
 
+
+def seeded_uniform(seed: int) -> float:
+    """Uniform float in [0, 1) determined by `seed` alone."""
+    return (_splitmix64(seed & _MASK64) >> 11) * 2.0**-53
+
+
+def _days_since(value, now) -> float:
+    if not value:
+        return NO_ACTIVITY_DAYS
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return NO_ACTIVITY_DAYS
+    return max(0.0, (now - value).total_seconds() / 86400.0)
+
+
+def _features(lead: Dict, now=None):
+    """Model inputs of one lead, ordered like FEATURE_COLUMNS.
+
+    The activity features come from the company feature store
+    (app.feature_store) when the caller merged them into the lead.
+    """
     base = 0.0
     if lead.get("lead_score") is not None:
         try:
             base = float(lead.get("lead_score", 0.0))
         except Exception:
             base = 0.0
-
-    if lead.get("email"):
-        base += 0.15
     name = lead.get("name") or lead.get("company") or ""
-    if len(name) > 10:
-        base += 0.05
+    now = now or datetime.datetime.utcnow()
+    return (
+        base,
+        bool(lead.get("email")),
+        len(name),
+        int(lead.get("activity_count") or 0),
+        int(lead.get("open_opportunity_count") or 0),
+        float(lead.get("open_value") or 0.0),
+        _days_since(lead.get("last_activity_at"), now),
+    )
+
+
+def _score(
+    base: float,
+    has_email: bool,
+    name_len: int,
+    activity_count: int,
+    open_opportunities: int,
+    open_value: float,
+    days_since_activity: float,
+    u: float,
+) -> float:
+    if has_email:
+        base += EMAIL_BONUS
+    if name_len > LONG_NAME_LEN:
+        base += LONG_NAME_BONUS
+    if days_since_activity <= RECENT_ACTIVITY_DAYS:
+        base += RECENT_ACTIVITY_BONUS
+    if open_value > 0:
+        base += OPEN_PIPELINE_BONUS
+    noise = (u - 0.5) * NOISE_SPAN
+    return _round4(max(0.0, min(1.0, base + noise)))
+
+
+def _round4(x: float) -> float:
+    # 4 decimal places, rounded half-to-even exactly like np.rint in batches
+    return round(x * 10000) / 10000
+
+
+def _uniform_batch(seeds):
+    """Vectorized `seeded_uniform` over a uint64 array (arithmetic wraps
+    like the mask)."""
+    z = seeds + np.uint64(_GOLDEN)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+
+def _feature_arrays(features):
+    """Column arrays of `_features` tuples (float64, bool for has_email)."""
+    n = len(features)
+    columns = [
+        np.fromiter((f[i] for f in features), dtype=np.float64, count=n)
+        for i in range(len(FEATURE_COLUMNS))
+    ]
+    columns[1] = columns[1].astype(bool)
+    return columns
+
+
+class Scorer(abc.ABC):
+    """Scoring model interface.
+
+    `predict` takes `_features` tuples (see FEATURE_COLUMNS) and
+    optional per-row seeds and returns one score in [0, 1] per row, rounded
+    to 4 places. `version` identifies the model in responses and in the
+    stored scores.
+    """
+
+    version = "unknown"
+
+    @abc.abstractmethod
+    def predict(self, features, seeds=None) -> list: ...
+
+
+class HeuristicScorer(Scorer):
+    """The built-in hand-tuned formula with seeded noise."""
+
+    version = "heuristic-2"
+
+    def predict(self, features, seeds=None) -> list:
+        if np is None:
+            if seeds is None:
+                return [_score(*f, random.random()) for f in features]
+            return [_score(*f, seeded_uniform(s)) for f, s in zip(features, seeds)]
+
+        n = len(features)
+        base, has_email, name_len, _acts, _opps, open_value, days = _feature_arrays(
+            features
+        )
+        if seeds is None:
+            u = np.random.default_rng().random(n)
+        else:
+            seeds = np.fromiter((s & _MASK64 for s in seeds), dtype=np.uint64, count=n)
+            u = _uniform_batch(seeds)
+        score = base + np.where(has_email, EMAIL_BONUS, 0.0)
+        score += np.where(name_len > LONG_NAME_LEN, LONG_NAME_BONUS, 0.0)
+        score += np.where(days <= RECENT_ACTIVITY_DAYS, RECENT_ACTIVITY_BONUS, 0.0)
+        score += np.where(open_value > 0, OPEN_PIPELINE_BONUS, 0.0)
+        score = np.clip(score + (u - 0.5) * NOISE_SPAN, 0.0, 1.0)
+        return (np.rint(score * 10000) / 10000).tolist()
+
+
+# inputs a trained model can use: FEATURE_COLUMNS plus derived ones
+MODEL_FEATURES = FEATURE_COLUMNS + ("long_name",)
+
 
-    noise = (random.random() - 0.5) * 0.08
-    score = max(0.0, min(1.0, base + noise))
-    return round(score, 4)
+class LinearModelScorer(Scorer):
+    """Linear or logistic regression over MODEL_FEATURES.
+
+    ``score = link(intercept + sum(coef[f] * x[f]))`` clipped to [0, 1],
+    where `link` is the identity ("linear") or the sigmoid ("logistic").
+    The coefficients are compiled once into a weight vector so a batch is a
+    single matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        coef: dict,
+        intercept: float = 0.0,
+        link: str = "logistic",
+        version: str = "linear",
+    ):
+        unknown = set(coef) - set(MODEL_FEATURES)
+        if unknown:
+            raise ValueError(f"unknown model features: {sorted(unknown)}")
+        if link not in ("linear", "logistic"):
+            raise ValueError(f"unsupported link: {link}")
+        self.coef = [float(coef.get(f, 0.0)) for f in MODEL_FEATURES]
+        self.intercept = float(intercept)
+        self.link = link
+        self.version = str(version)
+        self._weights = None if np is None else np.array(self.coef, dtype=np.float64)
+
+    def _predict_one(self, *features) -> float:
+        x = [float(v) for v in features] + [float(features[2] > LONG_NAME_LEN)]
+        z = self.intercept + sum(w * v for w, v in zip(self.coef, x))
+        if self.link == "logistic":
+            z = 1.0 / (1.0 + math.exp(-max(-500.0, min(500.0, z))))
+        return _round4(max(0.0, min(1.0, z)))
+
+    def predict(self, features, seeds=None) -> list:
+        if np is None:
+            return [self._predict_one(*f) for f in features]
+        columns = _feature_arrays(features)
+        columns.append(columns[2] > LONG_NAME_LEN)
+        x = np.column_stack(columns).astype(np.float64)
+        z = x @ self._weights + self.intercept
+        if self.link == "logistic":
+            z = 1.0 / (1.0 + np.exp(-np.clip(z, -500.0, 500.0)))
+        return (np.rint(np.clip(z, 0.0, 1.0) * 10000) / 10000).tolist()
+
+
+def load_model(path: str) -> Scorer:
+    """Load a trained model from JSON or NumPy `.npz`.
+
+    JSON: ``{"version": "...", "link": "logistic", "intercept": -1.2,
+    "coef": {"lead_score": 2.5, "has_email": 0.8}}``. An `.npz` holds the
+    same as arrays: `features` (names), `coef`, `intercept` and optionally
+    `link` and `version`. Without a version the file's mtime is used.
+    """
+    fallback_version = f"{os.path.basename(path)}@{int(os.path.getmtime(path))}"
+    if path.endswith(".npz"):
+        if np is None:
+            raise ValueError(".npz models need numpy")
+        with np.load(path, allow_pickle=False) as data:
+            names = [str(f) for f in data["features"]]
+            coef = dict(zip(names, data["coef"].astype(float).tolist()))
+            spec = {
+                "coef": coef,
+                "intercept": float(data["intercept"]),
+                "link": str(data["link"]) if "link" in data else "logistic",
+                "version": str(data["version"]) if "version" in data else None,
+            }
+    else:
+        with open(path, encoding="utf-8") as fh:
+            spec = json.load(fh)
+    return LinearModelScorer(
+        coef=spec.get("coef") or {},
+        intercept=spec.get("intercept", 0.0),
+        link=spec.get("link", "logistic"),
+        version=spec.get("version") or fallback_version,
+    )
+
+
+class ModelRegistry:
+    """Holds the active scorer and hot-reloads it when the model file changes.
+
+    The file's mtime/size is checked at most every `check_interval` seconds
+    on the scoring path; a changed file is loaded and compiled off to the
+    side and then swapped in with a single reference assignment, so a batch
+    always runs against one complete model. A file that fails to load is
+    logged and the previous model stays active. Replace model files
+    atomically (write a temp file, then rename).
+    """
+
+    def __init__(
+        self, path: str = None, check_interval: float = 2.0, clock=time.monotonic
+    ):
+        self.path = path
+        self.check_interval = check_interval
+        self._clock = clock
+        self._scorer = HeuristicScorer()
+        self._stamp = None
+        self._next_check = 0.0
+        self._lock = Lock()
+
+    def current(self) -> Scorer:
+        if self.path and self._clock() >= self._next_check:
+            self._maybe_reload()
+        return self._scorer
+
+    def _maybe_reload(self):
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is already checking
+        try:
+            self._next_check = self._clock() + self.check_interval
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return
+            stamp = (st.st_mtime_ns, st.st_size)
+            if stamp == self._stamp:
+                return
+            self._stamp = stamp
+            try:
+                scorer = load_model(self.path)
+            except Exception:
+                logger.exception("could not load scoring model %s", self.path)
+                return
+            self._scorer = scorer
+            logger.info("scoring model %s loaded", scorer.version)
+        finally:
+            self._lock.release()
+
+
+registry = ModelRegistry(
+    os.getenv("BBH_SCORING_MODEL") or None,
+    check_interval=float(os.getenv("BBH_SCORING_MODEL_CHECK", 2)),
+)
+
+
+def current_scorer() -> Scorer:
+    return registry.current()
+
+
+def score_lead(lead: Dict, seed: Optional[int] = None, scorer: Scorer = None) -> float:
+    scorer = scorer or current_scorer()
+    return scorer.predict([_features(lead)], None if seed is None else [seed])[0]
 
 
 def recommend_next_action(score: float) -> str:
@@ -34,29 +363,78 @@ def recommend_next_action(score: float) -> str:
     return "Cold outreach"
 
 
+def recommend_batch(scores) -> list:
+    if np is None:
+        return [recommend_next_action(s) for s in scores]
+    bands = np.searchsorted(ACTION_THRESHOLDS, scores, side="right")
+    return [ACTIONS[b] for b in bands.tolist()]
+
+
+def score_batch(
+    leads: Sequence[Dict], seeds: Optional[Sequence[int]] = None, scorer: Scorer = None
+):
+    """Score many leads at once; returns ``(scores, actions)`` lists.
+
+    `seeds[i]` seeds the noise of `leads[i]` exactly like
+    ``score_lead(leads[i], seed=seeds[i])``; without seeds the noise is
+    random. The whole batch uses one model, even if a reload happens.
+    """
+    scorer = scorer or current_scorer()
+    now = datetime.datetime.utcnow()
+    scores = scorer.predict([_features(lead, now) for lead in leads], seeds)
+    return scores, recommend_batch(scores)
+
+
+def _lead_name(lead: Dict) -> str:
+    return (lead.get("name") or lead.get("company") or "").strip()
+
+
+def stable_seed(lead: Dict) -> int:
+    """Per-lead seed that is identical across calls, workers and restarts
+    (unlike the salted built-in hash)."""
+    return zlib.crc32(_lead_name(lead).encode("utf-8"))
+
+
 def enrich_with_opengov(lead: Dict) -> Dict:
-    name = (lead.get("name") or lead.get("company") or "").strip()
+    """Registry data for one lead, through the shared enrichment cache."""
+    name = _lead_name(lead)
     if not name:
         return {}
-    return {
-        "official_registry_id": f"OG-{abs(hash(name)) % 100000}",
-        "industry": "Unknown",
-        "enriched": True,
-    }
+    return dict(integrations.enrich_many([name]).get(name, {}))
 
 
-def apply_demo_scoring(
-    companies: List[Dict], deterministic: bool = False
-) -> List[Dict]:
+def apply_scoring(
+    companies: List[Dict],
+    deterministic: bool = False,
+    scorer: Scorer = None,
+    enrich: bool = True,
+):
+    """Score, recommend and (unless `enrich` is False) enrich each lead.
+
+    With `deterministic=True` the noise is seeded per lead (`stable_seed`),
+    so the same lead always gets the same score regardless of its position
+    in the batch. Returns ``(scored, info)`` where `info` carries the
+    `model_version` and the batch's scoring `latency_ms`.
+    """
+    scorer = scorer or current_scorer()
+    t0 = time.perf_counter()
+    seeds = [stable_seed(c) for c in companies] if deterministic else None
+    scores, actions = score_batch(companies, seeds, scorer)
+    latency_ms = (time.perf_counter() - t0) * 1000
+    enrichments = {}
+    if enrich:
+        enrichments = integrations.enrich_many(_lead_name(c) for c in companies)
     scored = []
-    for idx, c in enumerate(companies):
-        seed = idx if deterministic else None
-        sc = score_lead(c, seed=seed)
-        action = recommend_next_action(sc)
-        enriched = enrich_with_opengov(c)
+    for c, sc, action in zip(companies, scores, actions):
         item = dict(c)
         item["lead_score"] = sc
         item["recommended_action"] = action
-        item.update(enriched)
+        item.update(enrichments.get(_lead_name(c), {}))
         scored.append(item)
-    return scored
+    return scored, {"model_version": scorer.version, "latency_ms": round(latency_ms, 3)}
+
+
+def apply_demo_scoring(
+    companies: List[Dict], deterministic: bool = False
+) -> List[Dict]:
+    return apply_scoring(companies, deterministic)[0]
@@ -0,0 +1,60 @@
+"""Async counterparts of the `crud` functions behind the hot CRM endpoints.
+
+Reads are native async queries. The lead upsert paths reuse the sync
+implementations through ``AsyncSession.run_sync`` so matching rules stay in
+one place; their statements still go through the async driver, so the
+event loop is never blocked on the database.
+"""
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models, pagination
+
+
+async def get_companies_page(
+    session: AsyncSession,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+):
+    sort_expr, key_fn, sort_id = crud.company_sort(sort, order)
+    stmt = pagination.apply_keyset(
+        select(models.Company),
+        sort_expr,
+        models.Company.id,
+        sort_id,
+        cursor=cursor,
+        limit=limit,
+        descending=order == "desc",
+    )
+    rows = (await session.scalars(stmt)).all()
+    return pagination.finish_page(rows, key_fn, sort_id, limit)
+
+
+async def create_company(
+    session: AsyncSession, name: str, description: str = "", lead_score: float = 0.0
+):
+    company = models.Company(name=name, description=description, lead_score=lead_score)
+    session.add(company)
+    await session.commit()
+    crud.bump_data_version()
+    await session.refresh(company)
+    return company
+
+
+async def create_lead(session: AsyncSession, lead: dict):
+    name = lead.get("name") or lead.get("company") or "Unknown"
+    score = float(lead.get("lead_score", 0.0))
+    return await create_company(
+        session, name=name, description=lead.get("description", ""), lead_score=score
+    )
+
+
+async def create_or_update_lead(session: AsyncSession, lead: dict):
+    return await session.run_sync(crud.create_or_update_lead, lead)
+
+
+async def bulk_upsert_leads(session: AsyncSession, leads: list, chunk_size: int = 500):
+    return await session.run_sync(crud.bulk_upsert_leads, leads, chunk_size)
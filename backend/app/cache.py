@@ -0,0 +1,283 @@
+"""Small caches: an in-process LRU (`TTLCache`), a cross-process tier in a
+SQLite file (`SQLiteCache`) and the two stacked (`TieredCache`)."""
+
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a size bound, per-entry TTL and counters.
+
+    Entries older than `ttl` seconds are treated as misses and dropped; when
+    more than `maxsize` entries are held the least recently used one is
+    evicted.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if now < expires_at:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        """Store `value`; `ttl` overrides the cache's TTL for this entry."""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        self._check_pid()
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class SQLiteCache:
+    """Cache tier in a SQLite file, shared by every process that opens it.
+
+    Values are stored as JSON with a wall-clock timestamp, so they survive
+    restarts and are visible to all uvicorn workers. Expired rows are
+    skipped on read and, together with the oldest rows beyond `maxsize`,
+    deleted by `prune` (run every `prune_every` writes).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 3600.0,
+        maxsize: int = 100_000,
+        table: str = "cache_entries",
+        prune_every: int = 1000,
+        clock=time.time,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.table = table
+        self.prune_every = prune_every
+        self._clock = clock
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._open()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_stored_at "
+                f"ON {table} (stored_at)"
+            )
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._lock = Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+
+    def _check_pid(self):
+        # a connection (or a held lock) must not be inherited by a forked
+        # child; reopen there
+        if self._pid != os.getpid():
+            self._open()
+
+    def get_entries(self, keys) -> dict:
+        """key -> (value, stored_at) for the live entries among `keys`."""
+        self._check_pid()
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        oldest = self._clock() - self.ttl
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, stored_at FROM {self.table} "
+                    f"WHERE key IN ({marks}) AND stored_at > ?",
+                    (*chunk, oldest),
+                ).fetchall()
+                for key, value, stored_at in rows:
+                    found[key] = (json.loads(value), stored_at)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key, default=None):
+        entry = self.get_entries([key]).get(key)
+        return default if entry is None else entry[0]
+
+    def set_many(self, items: dict):
+        self._check_pid()
+        now = self._clock()
+        rows = [(k, json.dumps(v), now) for k, v in items.items()]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, stored_at) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+            self._writes += len(rows)
+            due = self._writes >= self.prune_every
+        if due:
+            self.prune()
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)  # reopens after a fork
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        return value
+
+    def prune(self) -> int:
+        """Delete expired rows and the oldest ones beyond `maxsize`."""
+        self._check_pid()
+        with self._lock, self._conn:
+            self._writes = 0
+            removed = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE stored_at <= ?",
+                (self._clock() - self.ttl,),
+            ).rowcount
+            removed += self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM "
+                f"{self.table} ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            ).rowcount
+            self.evictions += removed
+        return removed
+
+    def clear(self):
+        self._check_pid()
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            row = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        return row[0]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+class TieredCache:
+    """An in-process `TTLCache` in front of an optional shared tier.
+
+    Reads go to the local tier first; shared hits are copied into it for the
+    rest of their TTL. Writes go to both tiers.
+    """
+
+    def __init__(self, local: TTLCache, shared: SQLiteCache = None, clock=time.time):
+        self.local = local
+        self.shared = shared
+        self._clock = clock
+
+    def get_many(self, keys) -> dict:
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            value = self.local.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing and self.shared is not None:
+            now = self._clock()
+            for key, (value, stored_at) in self.shared.get_entries(missing).items():
+                self.local.set(key, value, ttl=self.shared.ttl - (now - stored_at))
+                found[key] = value
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items: dict):
+        for key, value in items.items():
+            self.local.set(key, value)
+        if self.shared is not None and items:
+            self.shared.set_many(items)
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def pop(self, key, default=None):
+        value = self.local.pop(key, default)
+        if self.shared is not None:
+            shared = self.shared.pop(key, _MISSING)
+            if value is default and shared is not _MISSING:
+                value = shared
+        return value
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def __len__(self):
+        return len(self.local)
+
+    def stats(self) -> dict:
+        stats = {"local": self.local.stats()}
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
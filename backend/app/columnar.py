@@ -0,0 +1,146 @@
+"""Arrow IPC / Parquet encoding for the report exports.
+
+pyarrow is optional: when it is not installed `available()` is False and the
+encoders raise `ColumnarUnavailable`. Rows are turned into typed record
+batches of `ARROW_BATCH_ROWS` and each batch is written out as soon as it is
+full, so memory stays bounded by one batch regardless of the export size.
+"""
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+# rows per record batch (and per Parquet row group)
+ARROW_BATCH_ROWS = 10_000
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+
+class ColumnarUnavailable(RuntimeError):
+    pass
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _require():
+    if pa is None:
+        raise ColumnarUnavailable("pyarrow is not installed")
+
+
+def lead_schema():
+    _require()
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("name", pa.string()),
+            ("lead_score", pa.float64()),
+            ("description", pa.string()),
+        ]
+    )
+
+
+def company_schema():
+    _require()
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("name", pa.string()),
+            ("email", pa.string()),
+            ("website", pa.string()),
+            ("lead_score", pa.float64()),
+        ]
+    )
+
+
+def iter_record_batches(schema, rows, batch_rows: int = ARROW_BATCH_ROWS):
+    """Group `rows` (sequences ordered like `schema`) into record batches."""
+    _require()
+    columns = [[] for _ in schema]
+    pending = 0
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+        pending += 1
+        if pending >= batch_rows:
+            yield pa.RecordBatch.from_arrays(columns, schema=schema)
+            columns = [[] for _ in schema]
+            pending = 0
+    if pending:
+        yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained after each batch."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _encode(open_writer, write, schema, batches):
+    sink = _ChunkSink()
+    writer = open_writer(sink, schema)
+    try:
+        for batch in batches:
+            write(writer, batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+def iter_arrow(schema, rows, batch_rows: int = ARROW_BATCH_ROWS):
+    """Encode `rows` as an Arrow IPC stream, yielding bytes batch by batch."""
+    _require()
+    batches = iter_record_batches(schema, rows, batch_rows)
+    return _encode(pa.ipc.new_stream, lambda w, b: w.write_batch(b), schema, batches)
+
+
+def iter_parquet(schema, rows, batch_rows: int = ARROW_BATCH_ROWS):
+    """Encode `rows` as Parquet, one row group per batch."""
+    _require()
+    batches = iter_record_batches(schema, rows, batch_rows)
+    return _encode(pq.ParquetWriter, lambda w, b: w.write_batch(b), schema, batches)
+
+
+ENCODERS = {
+    "arrow": (iter_arrow, ARROW_MEDIA_TYPE),
+    "parquet": (iter_parquet, PARQUET_MEDIA_TYPE),
+}
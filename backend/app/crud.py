@@ -1,18 +1,85 @@
+import itertools
+
+from sqlalchemy import and_, case, or_, select
 from sqlalchemy.orm import Session
 
-from . import models
+from . import models, pagination
+
+# sort name -> (SQL sort expression, python key of a loaded Company)
+COMPANY_SORTS = {
+    "id": (models.Company.id, lambda c: c.id),
+    "name": (models.COMPANY_NAME_SORT, lambda c: c.name or ""),
+    "lead_score": (models.COMPANY_SCORE_SORT, lambda c: c.lead_score or 0.0),
+}
+
+
+# Bumped after every committed company/contact write so read caches keyed on
+# it (e.g. the scored /companies response) never serve pre-write data. It is
+# per process; writes from other workers are bounded by the cache TTL.
+_data_version = itertools.count(1)
+_current_version = 0
+
+
+def data_version() -> int:
+    return _current_version
+
+
+def bump_data_version() -> int:
+    global _current_version
+    _current_version = next(_data_version)
+    return _current_version
 
 
 def get_companies(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Company).offset(skip).limit(limit).all()
 
 
+def company_sort(sort: str = "id", order: str = "asc"):
+    """Validate a sort/order pair; returns ``(sort_expr, key_fn, sort_id)``."""
+    if sort not in COMPANY_SORTS:
+        raise ValueError(f"unsupported sort: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"unsupported order: {order}")
+    sort_expr, key = COMPANY_SORTS[sort]
+    return sort_expr, (lambda c: (key(c), c.id)), f"{sort}:{order}"
+
+
+def get_companies_page(
+    db: Session,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+    query=None,
+):
+    """Keyset-paginated companies ordered by ``(sort, id)``.
+
+    Returns ``(companies, next_cursor)``. Raises ValueError for an unknown
+    sort/order and pagination.InvalidCursor for a bad cursor. `query` lets
+    callers pass a pre-filtered Company query.
+    """
+    sort_expr, key_fn, sort_id = company_sort(sort, order)
+    if query is None:
+        query = db.query(models.Company)
+    return pagination.keyset_page(
+        query,
+        sort_expr,
+        models.Company.id,
+        key_fn,
+        sort=sort_id,
+        cursor=cursor,
+        limit=limit,
+        descending=order == "desc",
+    )
+
+
 def create_company(
     db: Session, name: str, description: str = "", lead_score: float = 0.0
 ):
     company = models.Company(name=name, description=description, lead_score=lead_score)
     db.add(company)
     db.commit()
+    bump_data_version()
     db.refresh(company)
     return company
 
@@ -26,16 +93,72 @@ def create_lead(db: Session, lead: dict):
 
 
 def find_company_by_name_or_email(db: Session, name: str = None, email: str = None):
-    q = db.query(models.Company)
-    if name:
-        q = q.filter(models.Company.name == name)
-    results = q.all()
-    if email:
-        for comp in results:
-            for c in comp.contacts:
-                if c.email == email:
-                    return comp
-    return results[0] if results else None
+    """Resolve a lead to an existing company in a single indexed query.
+
+    Matches on the normalized name key and/or any contact with the normalized
+    email. A company matching both wins over an email-only match, which wins
+    over a name-only match; ties go to the oldest company.
+    """
+    name_key = models.normalize_name(name)
+    email_key = models.normalize_email(email)
+    if not name_key and not email_key:
+        return None
+    Company = models.Company
+    conditions = []
+    if name_key:
+        conditions.append(Company.name_key == name_key)
+    if email_key:
+        # `company_id IN (...)` lets SQLite combine the name_key and
+        # email_key indexes instead of scanning companies for the OR.
+        by_email = Company.id.in_(
+            select(models.Contact.company_id).where(
+                models.Contact.email_key == email_key
+            )
+        )
+        conditions.append(by_email)
+    q = db.query(Company).filter(or_(*conditions))
+    if name_key and email_key:
+        q = q.order_by(
+            case(
+                (and_(Company.name_key == name_key, by_email), 0),
+                (by_email, 1),
+                else_=2,
+            ),
+            Company.id,
+        )
+    else:
+        q = q.order_by(Company.id)
+    return q.first()
+
+
+def backfill_dedupe_keys(db: Session, batch_size: int = 1000) -> int:
+    """Populate missing name/email dedupe keys on rows written before they
+    existed. Returns the number of rows updated."""
+    updated = 0
+    for model, source, key, normalize in (
+        (models.Company, "name", "name_key", models.normalize_name),
+        (models.Contact, "email", "email_key", models.normalize_email),
+    ):
+        src_col = getattr(model, source)
+        key_col = getattr(model, key)
+        last_id = 0
+        while True:
+            rows = db.execute(
+                select(model.id, src_col)
+                .where(key_col.is_(None), src_col.isnot(None), model.id > last_id)
+                .order_by(model.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.bulk_update_mappings(
+                model, [{"id": r[0], key: normalize(r[1])} for r in rows]
+            )
+            db.commit()
+            bump_data_version()
+            updated += len(rows)
+            last_id = rows[-1][0]
+    return updated
 
 
 def create_or_update_lead(db: Session, lead: dict):
@@ -51,6 +174,7 @@ def create_or_update_lead(db: Session, lead: dict):
             existing.lead_score = new_score
             db.add(existing)
             db.commit()
+            bump_data_version()
             db.refresh(existing)
         return existing
     comp = create_company(
@@ -65,4 +189,165 @@ def create_or_update_lead(db: Session, lead: dict):
         )
         db.add(contact)
         db.commit()
+        bump_data_version()
     return comp
+
+
+def _lead_fields(lead: dict) -> dict:
+    name = lead.get("name") or lead.get("company") or "Unknown"
+    try:
+        score = float(lead.get("lead_score", 0.0))
+    except Exception:
+        score = 0.0
+    return {
+        "name": name,
+        "name_key": models.normalize_name(name),
+        "email": lead.get("email"),
+        "email_key": models.normalize_email(lead.get("email")),
+        "lead_score": score,
+        "description": lead.get("description", ""),
+        "contact_name": lead.get("contact_name", name),
+    }
+
+
+def _load_lead_refs(db: Session, chunk, refs, by_name, by_email):
+    """Fetch existing companies for every not-yet-seen name/email key in
+    `chunk` with one set-based query per key type."""
+    Company = models.Company
+    columns = (Company.id, Company.name, Company.name_key, Company.lead_score)
+
+    def ref_for(row):
+        ref = refs.get(row.id)
+        if ref is None:
+            ref = refs[row.id] = {
+                "id": row.id,
+                "name": row.name,
+                "name_key": row.name_key,
+                "lead_score": row.lead_score or 0.0,
+                "obj": None,
+            }
+        return ref
+
+    names = {f["name_key"] for f in chunk if f["name_key"]} - by_name.keys()
+    emails = {f["email_key"] for f in chunk if f["email_key"]} - by_email.keys()
+    for key in names:
+        by_name[key] = []
+    for key in emails:
+        by_email[key] = []
+    if names:
+        rows = db.execute(
+            select(*columns).where(Company.name_key.in_(names)).order_by(Company.id)
+        )
+        for row in rows:
+            by_name[row.name_key].append(ref_for(row))
+    if emails:
+        rows = db.execute(
+            select(models.Contact.email_key, *columns)
+            .join(Company, models.Contact.company_id == Company.id)
+            .where(models.Contact.email_key.in_(emails))
+            .order_by(Company.id)
+        )
+        for row in rows:
+            matched = by_email[row.email_key]
+            ref = ref_for(row)
+            if ref not in matched:
+                matched.append(ref)
+
+
+def _match_lead_ref(fields, by_name, by_email):
+    # same precedence as find_company_by_name_or_email
+    email_refs = by_email.get(fields["email_key"], []) if fields["email_key"] else []
+    for ref in email_refs:
+        if ref["name_key"] == fields["name_key"]:
+            return ref
+    if email_refs:
+        return email_refs[0]
+    name_refs = by_name.get(fields["name_key"], []) if fields["name_key"] else []
+    return name_refs[0] if name_refs else None
+
+
+def bulk_upsert_leads(db: Session, leads: list, chunk_size: int = 500) -> list:
+    """Set-based equivalent of calling `create_or_update_lead` for each lead.
+
+    Existing companies are resolved with one lookup per chunk, new companies
+    and contacts are inserted in batches and each chunk is committed in a
+    single transaction. Leads repeated within the batch resolve to the same
+    company, exactly as the sequential path would.
+
+    Returns one ``{"lead_id", "name", "lead_score"}`` dict per input lead.
+    """
+    refs = {}  # company id -> ref, so name and email matches share state
+    by_name = {}  # name_key -> [ref, ...] ordered by id
+    by_email = {}  # email_key -> [ref, ...] ordered by id
+    results = []
+    for start in range(0, len(leads), chunk_size):
+        chunk = [_lead_fields(lead) for lead in leads[start : start + chunk_size]]
+        _load_lead_refs(db, chunk, refs, by_name, by_email)
+
+        created = []  # (ref, fields)
+        score_updates = {}
+        outcomes = []  # (ref, lead_score at that point), like the sequential path
+        for fields in chunk:
+            ref = _match_lead_ref(fields, by_name, by_email)
+            if ref is None:
+                obj = models.Company(
+                    name=fields["name"],
+                    description=fields["description"],
+                    lead_score=fields["lead_score"],
+                )
+                ref = {
+                    "id": None,
+                    "name": fields["name"],
+                    "name_key": obj.name_key,
+                    "lead_score": fields["lead_score"],
+                    "obj": obj,
+                }
+                created.append((ref, fields))
+                if fields["name_key"]:
+                    by_name[fields["name_key"]].append(ref)
+                if fields["email_key"]:
+                    by_email[fields["email_key"]].append(ref)
+            elif fields["lead_score"] > (ref["lead_score"] or 0.0):
+                ref["lead_score"] = fields["lead_score"]
+                if ref["obj"] is not None:
+                    ref["obj"].lead_score = fields["lead_score"]
+                else:
+                    score_updates[ref["id"]] = fields["lead_score"]
+            outcomes.append((ref, ref["lead_score"]))
+
+        if created:
+            db.add_all([ref["obj"] for ref, _ in created])
+            db.flush()
+            for ref, _ in created:
+                ref["id"] = ref["obj"].id
+                refs[ref["id"]] = ref
+            contacts = [
+                {
+                    "company_id": ref["id"],
+                    "name": fields["contact_name"],
+                    "email": fields["email"],
+                    "email_key": fields["email_key"],
+                }
+                for ref, fields in created
+                if fields["email"]
+            ]
+            if contacts:
+                db.bulk_insert_mappings(models.Contact, contacts)
+        if score_updates:
+            db.bulk_update_mappings(
+                models.Company,
+                # bypasses the model validators, so clear scored_at here
+                [
+                    {"id": cid, "lead_score": s, "scored_at": None}
+                    for cid, s in score_updates.items()
+                ],
+            )
+        db.commit()
+        bump_data_version()
+        for ref, _ in created:
+            ref["obj"] = None
+        results.extend(
+            {"lead_id": ref["id"], "name": ref["name"], "lead_score": score}
+            for ref, score in outcomes
+        )
+    return results
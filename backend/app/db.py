@@ -0,0 +1,194 @@
+"""Shared database engine and session factory.
+
+Every module that talks to the CRM database (API, webhook worker, auth
+shims, scripts) should import `engine` / `SessionLocal` from here so they
+all point at the same database and share one connection pool.
+
+Configuration (environment):
+  DATABASE_URL              SQLAlchemy URL, e.g. ``sqlite:///./test.db`` or
+                            ``postgresql+psycopg2://user:pw@host/db``.
+                            Defaults to ``backend/test.db``.
+  BBH_DB_POOL_SIZE          persistent connections per process (default 5)
+  BBH_DB_MAX_OVERFLOW       extra connections under burst load (default 10)
+  BBH_DB_POOL_RECYCLE       recycle connections older than N seconds (1800)
+  BBH_DB_POOL_TIMEOUT       seconds to wait for a free connection (30)
+  BBH_SQLITE_BUSY_TIMEOUT_MS  how long SQLite waits on a lock (5000)
+  BBH_SQLITE_SYNCHRONOUS    PRAGMA synchronous value (NORMAL)
+  BBH_SQLITE_MMAP_SIZE      PRAGMA mmap_size in bytes (256 MiB)
+  BBH_SQLITE_CACHE_SIZE     PRAGMA cache_size; negative = KiB (-65536)
+  DATABASE_URL_ASYNC        asyncio URL; derived from DATABASE_URL if unset
+  BBH_ASYNC_DB              serve the hot CRM endpoints (/companies, /leads,
+                            /mobile/leads, /mobile/sync) from the async
+                            engine instead of the threadpool (default 0)
+"""
+
+import os
+import weakref
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_DATABASE_URL = f"sqlite:///{BASE_DIR / 'test.db'}"
+
+DATABASE_URL = os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+
+POOL_SIZE = int(os.getenv("BBH_DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.getenv("BBH_DB_MAX_OVERFLOW", 10))
+POOL_RECYCLE = int(os.getenv("BBH_DB_POOL_RECYCLE", 1800))
+POOL_TIMEOUT = int(os.getenv("BBH_DB_POOL_TIMEOUT", 30))
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("BBH_SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_SYNCHRONOUS = os.getenv("BBH_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_MMAP_SIZE = int(os.getenv("BBH_SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.getenv("BBH_SQLITE_CACHE_SIZE", -64 * 1024))
+
+_SYNCHRONOUS_VALUES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+USE_ASYNC_DB = os.getenv("BBH_ASYNC_DB", "0").lower() in ("1", "true", "yes")
+
+
+def is_sqlite(url) -> bool:
+    return make_url(str(url)).get_backend_name() == "sqlite"
+
+
+def to_async_url(url) -> str:
+    """Map a sync driver URL onto its asyncio driver (aiosqlite / asyncpg)."""
+    u = make_url(str(url))
+    backend = u.get_backend_name()
+    if backend == "sqlite":
+        u = u.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql":
+        u = u.set(drivername="postgresql+asyncpg")
+    return u.render_as_string(hide_password=False)
+
+
+def _is_memory_sqlite(url) -> bool:
+    database = make_url(str(url)).database
+    return not database or database == ":memory:" or "mode=memory" in database
+
+
+def _apply_sqlite_pragmas(dbapi_conn, connection_record):
+    synchronous = SQLITE_SYNCHRONOUS
+    if synchronous not in _SYNCHRONOUS_VALUES:
+        synchronous = "NORMAL"
+    cur = dbapi_conn.cursor()
+    try:
+        # WAL lets readers proceed while a writer commits and, combined with
+        # synchronous=NORMAL, only fsyncs on checkpoints instead of per commit.
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        cur.execute(f"PRAGMA synchronous={synchronous}")
+        cur.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        cur.execute(f"PRAGMA cache_size={int(SQLITE_CACHE_SIZE)}")
+    finally:
+        cur.close()
+
+
+def make_engine(url=None, **kwargs):
+    """Create an engine for `url` with the configured pool and SQLite tuning."""
+    url = url or DATABASE_URL
+    options = {}
+    if is_sqlite(url):
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+        }
+    if not (is_sqlite(url) and _is_memory_sqlite(url)):
+        # In-memory SQLite uses a singleton/static pool that takes no sizing.
+        options.update(
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_recycle=POOL_RECYCLE,
+            pool_timeout=POOL_TIMEOUT,
+        )
+    if not is_sqlite(url):
+        options["pool_pre_ping"] = True
+    options.update(kwargs)
+    eng = create_engine(url, **options)
+    if is_sqlite(url):
+        event.listen(eng, "connect", _apply_sqlite_pragmas)
+    return eng
+
+
+def make_async_engine(url=None, **kwargs):
+    """Async counterpart of `make_engine` (aiosqlite / asyncpg)."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = url or ASYNC_DATABASE_URL
+    options = {}
+    if is_sqlite(url):
+        options["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0}
+    if not (is_sqlite(url) and _is_memory_sqlite(url)):
+        options.update(
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_recycle=POOL_RECYCLE,
+            pool_timeout=POOL_TIMEOUT,
+        )
+    if not is_sqlite(url):
+        options["pool_pre_ping"] = True
+    options.update(kwargs)
+    eng = create_async_engine(url, **options)
+    if is_sqlite(url):
+        event.listen(eng.sync_engine, "connect", _apply_sqlite_pragmas)
+    return eng
+
+
+class SessionFactory:
+    """sessionmaker wrapper that keeps weakrefs to the sessions it created."""
+
+    def __init__(self, maker):
+        self._maker = maker
+        self._instances = weakref.WeakSet()
+
+    def __call__(self):
+        s = self._maker()
+        try:
+            self._instances.add(s)
+        except Exception:
+            pass
+        return s
+
+    def expire_all(self):
+        for s in list(self._instances):
+            try:
+                s.expire_all()
+            except Exception:
+                pass
+
+
+engine = make_engine(DATABASE_URL)
+
+# Wrap the sessionmaker so we can keep weakrefs to created Session instances.
+_maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = SessionFactory(_maker)
+
+ASYNC_DATABASE_URL = os.getenv("DATABASE_URL_ASYNC") or to_async_url(DATABASE_URL)
+
+# The async engine is created lazily so the async driver stays optional for
+# deployments that only use the sync path.
+async_engine = None
+_async_maker = None
+
+
+def get_async_sessionmaker():
+    global async_engine, _async_maker
+    if _async_maker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        async_engine = make_async_engine(ASYNC_DATABASE_URL)
+        _async_maker = async_sessionmaker(
+            async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_maker
+
+
+async def dispose_async_engine():
+    global async_engine, _async_maker
+    if async_engine is not None:
+        await async_engine.dispose()
+    async_engine = None
+    _async_maker = None
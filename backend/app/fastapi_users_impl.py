@@ -9,7 +9,8 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Optional
+
+from app import db
 
 logger = logging.getLogger(__name__)
 
@@ -25,11 +26,7 @@ try:
     from fastapi_users.db import SQLAlchemyUserDatabase
     from fastapi_users.manager import BaseUserManager
     from sqlalchemy import Boolean, Column, Integer, MetaData, String
-    from sqlalchemy.ext.asyncio import (
-        AsyncSession,
-        async_sessionmaker,
-        create_async_engine,
-    )
+    from sqlalchemy.ext.asyncio import AsyncSession
     from sqlalchemy.orm import declarative_base
 except Exception as exc:  # pragma: no cover - optional deps
     # Do not re-raise here — keep module importable even if optional deps
@@ -42,7 +39,7 @@ else:
     _FASTAPI_USERS_AVAILABLE = True
 
 # Configuration
-DATABASE_URL_ASYNC = os.getenv("DATABASE_URL_ASYNC", "sqlite+aiosqlite:///./test.db")
+DATABASE_URL_ASYNC = db.ASYNC_DATABASE_URL
 SECRET = os.getenv("BBH_SECRET_KEY", "CHANGE_ME_FOR_PRODUCTION")
 
 metadata = MetaData()
@@ -59,17 +56,12 @@ class FUUser(Base):
     is_verified = Column(Boolean, default=False)
 
 
-async_engine: Optional[object] = None
-async_session = None
 fastapi_users = None
 
 
 def get_async_sessionmaker():
-    global async_engine, async_session
-    if async_engine is None:
-        async_engine = create_async_engine(DATABASE_URL_ASYNC, echo=False)
-        async_session = async_sessionmaker(async_engine, expire_on_commit=False)
-    return async_session
+    # share the app-wide async engine/pool (app.db) instead of opening another
+    return db.get_async_sessionmaker()
 
 
 def include_fastapi_users_impl(app):
@@ -0,0 +1,365 @@
+"""Per-company scoring features, maintained incrementally.
+
+`company_features` keeps running aggregates of each company's opportunities
+and activities: counts, open pipeline value and the last activity time. ORM
+events on Opportunity and Activity apply the delta of every insert, update
+and delete inside the writing transaction (an upsert of +/- counts), so
+reading a company's features is a primary-key lookup and never scans the
+history. A change, including a re-derived last activity time, bumps the
+row's version and clears the company's `scored_at`, since features are
+scoring inputs (see app.rescoring).
+
+Writes that bypass the ORM are not tracked; `rebuild` recomputes the table
+from scratch for backfills and repairs.
+"""
+
+import datetime
+
+from sqlalchemy import case, event, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import attributes
+
+from . import models
+
+_UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _is_open(status) -> bool:
+    return (status or "open") == "open"
+
+
+def _opportunity_delta(status, value, sign: int) -> dict:
+    is_open = _is_open(status)
+    return {
+        "opportunity_count": sign,
+        "open_opportunity_count": sign if is_open else 0,
+        "open_value": sign * float(value or 0.0) if is_open else 0.0,
+    }
+
+
+def _apply(connection, company_id, last_activity_at=None, **deltas):
+    """Add `deltas` to a company's running counts (creating its row)."""
+    if company_id is None:
+        return
+    table = models.CompanyFeatures.__table__
+    counts = (
+        "opportunity_count",
+        "open_opportunity_count",
+        "open_value",
+        "activity_count",
+    )
+    values = {c: deltas.get(c, 0) for c in counts}
+    now = datetime.datetime.utcnow()
+    make_insert = _UPSERT_INSERTS.get(connection.dialect.name)
+    if make_insert is not None:
+        stmt = make_insert(table).values(
+            company_id=company_id,
+            last_activity_at=last_activity_at,
+            version=1,
+            updated_at=now,
+            **values,
+        )
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.company_id],
+            set_=dict(
+                {c: table.c[c] + new[c] for c in counts},
+                last_activity_at=case(
+                    (table.c.last_activity_at.is_(None), new.last_activity_at),
+                    (
+                        new.last_activity_at > table.c.last_activity_at,
+                        new.last_activity_at,
+                    ),
+                    else_=table.c.last_activity_at,
+                ),
+                version=table.c.version + 1,
+                updated_at=new.updated_at,
+            ),
+        )
+        connection.execute(stmt)
+    else:
+        set_ = {c: table.c[c] + v for c, v in values.items()}
+        if last_activity_at is not None:
+            set_["last_activity_at"] = case(
+                (table.c.last_activity_at.is_(None), last_activity_at),
+                (table.c.last_activity_at < last_activity_at, last_activity_at),
+                else_=table.c.last_activity_at,
+            )
+        result = connection.execute(
+            update(table)
+            .where(table.c.company_id == company_id)
+            .values(version=table.c.version + 1, updated_at=now, **set_)
+        )
+        if not result.rowcount:
+            connection.execute(
+                insert(table).values(
+                    company_id=company_id,
+                    last_activity_at=last_activity_at,
+                    version=1,
+                    updated_at=now,
+                    **values,
+                )
+            )
+    _invalidate_score(connection, company_id)
+
+
+def _invalidate_score(connection, company_id):
+    companies = models.Company.__table__
+    connection.execute(
+        update(companies).where(companies.c.id == company_id).values(scored_at=None)
+    )
+
+
+def _last_activity_query(company_id):
+    a, o = models.Activity.__table__, models.Opportunity.__table__
+    return (
+        select(func.max(a.c.created_at))
+        .select_from(a.join(o, o.c.id == a.c.opportunity_id))
+        .where(o.c.company_id == company_id)
+        .scalar_subquery()
+    )
+
+
+def _refresh_last_activity(connection, company_id):
+    # after a removal the running max can't be decremented; re-derive it
+    # (indexed on opportunities.company_id / activities.opportunity_id)
+    if company_id is None:
+        return
+    table = models.CompanyFeatures.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.company_id == company_id)
+        .values(
+            last_activity_at=_last_activity_query(company_id),
+            version=table.c.version + 1,
+            updated_at=datetime.datetime.utcnow(),
+        )
+    )
+    _invalidate_score(connection, company_id)
+
+
+def _company_of(connection, opportunity_id):
+    if opportunity_id is None:
+        return None
+    o = models.Opportunity.__table__
+    return connection.execute(
+        select(o.c.company_id).where(o.c.id == opportunity_id)
+    ).scalar()
+
+
+def _old(target, key):
+    """Value of `key` before the pending flush."""
+    hist = attributes.get_history(target, key)
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(target, key)
+
+
+def _activity_count(connection, opportunity_id):
+    a = models.Activity.__table__
+    return connection.execute(
+        select(func.count()).where(a.c.opportunity_id == opportunity_id)
+    ).scalar()
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# load the previous value on assignment even when the attribute was expired,
+# so the update handlers below can compute the delta
+for _attr in (
+    models.Opportunity.company_id,
+    models.Opportunity.status,
+    models.Opportunity.value,
+    models.Activity.opportunity_id,
+    models.Activity.created_at,
+):
+    event.listen(_attr, "set", _keep_old_value, active_history=True)
+
+
+@event.listens_for(models.Opportunity, "after_insert")
+def _opportunity_inserted(mapper, connection, target):
+    _apply(
+        connection,
+        target.company_id,
+        **_opportunity_delta(target.status, target.value, +1),
+    )
+
+
+@event.listens_for(models.Opportunity, "after_update")
+def _opportunity_updated(mapper, connection, target):
+    old_company = _old(target, "company_id")
+    old_status, old_value = _old(target, "status"), _old(target, "value")
+    if (old_company, old_status, old_value) == (
+        target.company_id,
+        target.status,
+        target.value,
+    ):
+        return
+    _apply(connection, old_company, **_opportunity_delta(old_status, old_value, -1))
+    _apply(
+        connection,
+        target.company_id,
+        **_opportunity_delta(target.status, target.value, +1),
+    )
+    if old_company != target.company_id:
+        # the opportunity's activities move with it
+        moved = _activity_count(connection, target.id)
+        if moved:
+            _apply(connection, old_company, activity_count=-moved)
+            _apply(connection, target.company_id, activity_count=moved)
+        _refresh_last_activity(connection, old_company)
+        _refresh_last_activity(connection, target.company_id)
+
+
+@event.listens_for(models.Opportunity, "after_delete")
+def _opportunity_deleted(mapper, connection, target):
+    # activities left behind no longer join to the company (see `rebuild`)
+    orphaned = _activity_count(connection, target.id)
+    _apply(
+        connection,
+        target.company_id,
+        activity_count=-orphaned,
+        **_opportunity_delta(target.status, target.value, -1),
+    )
+    _refresh_last_activity(connection, target.company_id)
+
+
+@event.listens_for(models.Activity, "after_insert")
+def _activity_inserted(mapper, connection, target):
+    company_id = _company_of(connection, target.opportunity_id)
+    _apply(connection, company_id, activity_count=1, last_activity_at=target.created_at)
+
+
+@event.listens_for(models.Activity, "after_update")
+def _activity_updated(mapper, connection, target):
+    old_opportunity = _old(target, "opportunity_id")
+    old_created = _old(target, "created_at")
+    if (old_opportunity, old_created) == (target.opportunity_id, target.created_at):
+        return
+    old_company = _company_of(connection, old_opportunity)
+    new_company = _company_of(connection, target.opportunity_id)
+    if old_company != new_company:
+        _apply(connection, old_company, activity_count=-1)
+        _apply(connection, new_company, activity_count=1)
+        _refresh_last_activity(connection, new_company)
+    _refresh_last_activity(connection, old_company)
+
+
+@event.listens_for(models.Activity, "after_delete")
+def _activity_deleted(mapper, connection, target):
+    company_id = _company_of(connection, target.opportunity_id)
+    _apply(connection, company_id, activity_count=-1)
+    _refresh_last_activity(connection, company_id)
+
+
+def rebuild(db) -> int:
+    """Recompute every company's features from the history.
+
+    Returns the number of feature rows written.
+    """
+    F = models.CompanyFeatures.__table__
+    o, a = models.Opportunity.__table__, models.Activity.__table__
+    is_open = func.coalesce(o.c.status, "open") == "open"
+    opps = (
+        select(
+            o.c.company_id.label("company_id"),
+            func.count().label("opportunity_count"),
+            func.sum(case((is_open, 1), else_=0)).label("open_opportunity_count"),
+            func.sum(case((is_open, func.coalesce(o.c.value, 0.0)), else_=0.0)).label(
+                "open_value"
+            ),
+        )
+        .where(o.c.company_id.is_not(None))
+        .group_by(o.c.company_id)
+        .subquery()
+    )
+    acts = (
+        select(
+            o.c.company_id.label("company_id"),
+            func.count().label("activity_count"),
+            func.max(a.c.created_at).label("last_activity_at"),
+        )
+        .select_from(a.join(o, o.c.id == a.c.opportunity_id))
+        .group_by(o.c.company_id)
+        .subquery()
+    )
+    # versions keep increasing across rebuilds, so a rescoring pass that read
+    # the old row can't mistake the rebuilt one for it
+    versions = dict(db.execute(select(F.c.company_id, F.c.version)).all())
+    now = datetime.datetime.utcnow()
+    rows = db.execute(
+        select(
+            opps.c.company_id,
+            opps.c.opportunity_count,
+            opps.c.open_opportunity_count,
+            opps.c.open_value,
+            func.coalesce(acts.c.activity_count, 0),
+            acts.c.last_activity_at,
+        ).outerjoin(acts, acts.c.company_id == opps.c.company_id)
+    ).all()
+    db.execute(F.delete())
+    if rows:
+        db.execute(
+            F.insert(),
+            [
+                {
+                    "company_id": r[0],
+                    "opportunity_count": r[1],
+                    "open_opportunity_count": r[2] or 0,
+                    "open_value": r[3] or 0.0,
+                    "activity_count": r[4],
+                    "last_activity_at": r[5],
+                    "version": versions.get(r[0], 0) + 1,
+                    "updated_at": now,
+                }
+                for r in rows
+            ],
+        )
+    companies = models.Company.__table__
+    touched = sorted(set(versions) | {r[0] for r in rows})
+    for start in range(0, len(touched), 500):
+        chunk = touched[start : start + 500]
+        db.execute(
+            update(companies).where(companies.c.id.in_(chunk)).values(scored_at=None)
+        )
+    db.commit()
+    return len(rows)
+
+
+def backfill(db) -> int:
+    """`rebuild` if the table is empty but there is history to aggregate."""
+    if db.scalar(select(models.CompanyFeatures.company_id).limit(1)) is not None:
+        return 0
+    if db.scalar(select(models.Opportunity.id).limit(1)) is None:
+        return 0
+    return rebuild(db)
+
+
+def as_inputs(features=None) -> dict:
+    """Scoring inputs from a CompanyFeatures row (or None for no history)."""
+    if features is None:
+        return {
+            "activity_count": 0,
+            "open_opportunity_count": 0,
+            "open_value": 0.0,
+            "last_activity_at": None,
+        }
+    last = features.last_activity_at
+    return {
+        "activity_count": features.activity_count or 0,
+        "open_opportunity_count": features.open_opportunity_count or 0,
+        "open_value": features.open_value or 0.0,
+        "last_activity_at": last.isoformat() if last else None,
+    }
+
+
+def load_features(db, company_ids) -> dict:
+    """company id -> CompanyFeatures row, one indexed lookup per batch."""
+    ids = list(company_ids)
+    if not ids:
+        return {}
+    F = models.CompanyFeatures
+    rows = db.scalars(select(F).where(F.company_id.in_(ids)))
+    return {f.company_id: f for f in rows}
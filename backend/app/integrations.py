@@ -1,87 +1,210 @@
 import datetime
 import json
 import logging
+import os
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
-from typing import Dict
+from typing import Dict, Iterable
 
 import httpx
-from app import models
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from app import cache, models, opengov, ratelimit, webhooks
+from app.db import SessionLocal, engine  # noqa: F401
+
+# OpenGov enrichment cache: a bounded LRU per process, plus an optional
+# SQLite file shared by all workers (and kept across restarts). Entries
+# older than the soft TTL are still served, but refreshed in the background
+# (stale-while-revalidate); the hard TTL ends their life.
+_SOFT_TTL = float(os.getenv("BBH_ENRICHMENT_SOFT_TTL", 60 * 60))  # 1 hour
+_HARD_TTL = max(_SOFT_TTL, float(os.getenv("BBH_ENRICHMENT_HARD_TTL", 24 * 60 * 60)))
+# how long a background refresh may wait for upstream quota
+_REFRESH_WAIT = float(os.getenv("BBH_OPENGOV_REFRESH_WAIT", 60))
+_now = time.time
+
+
+def _make_cache():
+    local = cache.TTLCache(
+        maxsize=int(os.getenv("BBH_ENRICHMENT_CACHE_SIZE", 10_000)), ttl=_HARD_TTL
+    )
+    shared = None
+    path = os.getenv("BBH_ENRICHMENT_CACHE_DB")
+    if path:
+        try:
+            shared = cache.SQLiteCache(
+                path,
+                ttl=_HARD_TTL,
+                maxsize=int(os.getenv("BBH_ENRICHMENT_CACHE_DB_SIZE", 1_000_000)),
+                table="opengov_enrichment",
+            )
+        except Exception as e:
+            logging.warning("shared enrichment cache unavailable: %s", e)
+    return cache.TieredCache(local, shared)
+
+
+_cache = _make_cache()
+_refresh = {"pid": None, "executor": None, "keys": set()}
+_refresh_lock = Lock()
+_swr_stats = {"stale_served": 0, "refreshes": 0, "refresh_failures": 0}
+
+# OpenGov request quota per (mock) host, optionally shared by all workers
+_RATE_CAPACITY = int(os.getenv("BBH_OPENGOV_RATE_BURST", 5))
+_RATE_REFILL_PER_SEC = float(os.getenv("BBH_OPENGOV_RATE", 1))
+# how long a lookup may wait for quota before giving up (0 = don't wait)
+_RATE_WAIT = float(os.getenv("BBH_OPENGOV_RATE_WAIT", 0))
+
+# placeholders for lookups that did not happen; neither is cached
+RATE_LIMITED = {"enriched": False, "reason": "rate_limited"}
+UPSTREAM_ERROR = {"enriched": False, "reason": "upstream_error"}
 
-# Simple in-memory cache and rate limiter for OpenGov enrichment
-_cache = {}
-_cache_lock = Lock()
 
-# cache entries: name -> (ts, value)
-_CACHE_TTL = int(60 * 60)  # 1 hour
+def _make_limiter():
+    path = os.getenv("BBH_RATE_LIMIT_DB")
+    try:
+        return ratelimit.RateLimiter(_RATE_REFILL_PER_SEC, _RATE_CAPACITY, path=path)
+    except Exception as e:
+        logging.warning("shared rate limiter unavailable: %s", e)
+        return ratelimit.RateLimiter(_RATE_REFILL_PER_SEC, _RATE_CAPACITY)
 
-# simple token-bucket per-host
-_buckets = {}
-_buckets_lock = Lock()
-_RATE_CAPACITY = 5
-_RATE_REFILL_PER_SEC = 1
 
-# Use the same sqlite file as the app for demo purposes
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_limiter = _make_limiter()
+
+
+def _cache_key(name: str) -> str:
+    return models.normalize_name(name) or ""
+
+
+def _cached(keys) -> Dict[str, Dict]:
+    """Cached records for `keys`; stale ones are served and refreshed."""
+    now = _now()
+    found = {}
+    for key, (fetched_at, record) in _cache.get_many(keys).items():
+        age = now - fetched_at
+        if age >= _HARD_TTL:
+            continue
+        if age >= _SOFT_TTL:
+            _swr_stats["stale_served"] += 1
+            _schedule_refresh(key)
+        found[key] = record
+    return found
+
+
+def _store(records: Dict[str, Dict]):
+    now = _now()
+    _cache.set_many({key: (now, record) for key, record in records.items()})
+
+
+def _schedule_refresh(key: str):
+    with _refresh_lock:
+        if _refresh["pid"] != os.getpid():
+            # a forked child has none of the parent's threads
+            _refresh["pid"] = os.getpid()
+            _refresh["executor"] = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="opengov-refresh"
+            )
+            _refresh["keys"] = set()
+        if key in _refresh["keys"]:
+            return
+        _refresh["keys"].add(key)
+        _refresh["executor"].submit(_refresh_entry, key)
+
+
+def _refresh_entry(key: str):
+    try:
+        # refreshes spend the same upstream quota as lookups, but may wait
+        if not _limiter.wait(_rate_key(key), timeout=_REFRESH_WAIT):
+            return
+        _store(opengov.lookup_many([key]))
+        _swr_stats["refreshes"] += 1
+    except Exception as e:
+        _swr_stats["refresh_failures"] += 1
+        logging.debug("opengov refresh for %r failed: %s", key, e)
+    finally:
+        with _refresh_lock:
+            _refresh["keys"].discard(key)
 
 
 def opengov_enrich(name: str) -> Dict:
     if not name:
         return {}
-    # check cache first
-    now = datetime.datetime.utcnow().timestamp()
-    with _cache_lock:
-        entry = _cache.get(name)
-        if entry:
-            ts, val = entry
-            if now - ts < _CACHE_TTL:
-                return val
+    key = _cache_key(name)
+    cached = _cached([key]).get(key)
+    if cached is not None:
+        return cached
+
+    if not _limiter.wait(_rate_key(key), timeout=_RATE_WAIT):
+        # too many requests
+        return dict(RATE_LIMITED)
+
+    try:
+        result = opengov.lookup_many([key])[key]
+    except Exception as e:
+        logging.debug("opengov lookup for %r failed: %s", key, e)
+        return dict(UPSTREAM_ERROR)
+    _store({key: result})
+    return result
+
+
+def enrichment_cache_stats() -> Dict:
+    stats = _cache.stats()
+    stats.update(_swr_stats, soft_ttl=_SOFT_TTL, hard_ttl=_HARD_TTL)
+    return stats
+
+
+def enrich_many(names: Iterable[str], wait: float = 0.0) -> Dict[str, Dict]:
+    """Enrichment for a batch of names (scoring), name -> record.
+
+    One cache lookup for the whole batch. The misses go upstream in batch
+    requests (see app.opengov) of up to opengov.MAX_BATCH names per host,
+    each spending one token of that host's quota (the limiter shared with
+    `opengov_enrich`), and are written back. A request waits up to `wait`
+    seconds for its token (None = as long as needed). Names that got no
+    quota or whose lookup failed map to RATE_LIMITED / UPSTREAM_ERROR (see
+    `is_transient`).
+    """
+    keys = {name: _cache_key(name) for name in names if name}
+    found = _cached(set(keys.values()))
+    by_host = {}
+    for key in sorted(set(keys.values()) - found.keys()):
+        by_host.setdefault(_rate_key(key), []).append(key)
+    allowed, limited = [], set()
+    for host, host_keys in by_host.items():
+        for start in range(0, len(host_keys), opengov.MAX_BATCH):
+            batch = host_keys[start : start + opengov.MAX_BATCH]
+            if _limiter.wait(host, timeout=wait):
+                allowed.extend(batch)
             else:
-                _cache.pop(name, None)
-
-    # rate limit by host (mock: host derived from name hash)
-    host = f"opengov:{abs(hash(name)) % 10}"
-    if not _consume_token(host):
-        # too many requests; return empty or stale
-        return {"enriched": False, "reason": "rate_limited"}
-
-    # simulate enrichment
-    key = abs(hash(name)) % 100000
-    result = {
-        "official_registry_id": f"OG-{key}",
-        "industry": "Services" if key % 2 == 0 else "Manufacturing",
-        "enriched": True,
-    }
-    with _cache_lock:
-        _cache[name] = (now, result)
+                limited.update(batch)
+    if allowed:
+        try:
+            fetched = opengov.lookup_many(allowed)
+        except Exception as e:
+            logging.debug("opengov batch lookup failed: %s", e)
+            fetched = {}
+        _store(fetched)
+        found.update(fetched)
+    result = {}
+    for name, key in keys.items():
+        if key in found:
+            result[name] = found[key]
+        else:
+            result[name] = dict(RATE_LIMITED if key in limited else UPSTREAM_ERROR)
     return result
 
 
+def is_transient(record: Dict) -> bool:
+    """Whether an enrichment record stands for a lookup worth retrying."""
+    return record.get("reason") in (RATE_LIMITED["reason"], UPSTREAM_ERROR["reason"])
+
+
+def _rate_key(key: str) -> str:
+    # mock: the host is derived from a stable hash of the name, so every
+    # worker maps a name to the same quota
+    return f"opengov:{zlib.crc32(key.encode('utf-8')) % 10}"
+
+
 def _consume_token(host: str) -> bool:
-    now = datetime.datetime.utcnow().timestamp()
-    with _buckets_lock:
-        bucket = _buckets.get(host)
-        if not bucket:
-            # (tokens, last_ts)
-            _buckets[host] = [_RATE_CAPACITY, now]
-            return True
-        tokens, last = bucket
-        # refill
-        delta = now - last
-        refill = int(delta * _RATE_REFILL_PER_SEC)
-        if refill > 0:
-            tokens = min(_RATE_CAPACITY, tokens + refill)
-            last = now
-        if tokens <= 0:
-            _buckets[host] = [tokens, last]
-            return False
-        tokens -= 1
-        _buckets[host] = [tokens, last]
-        return True
+    return _limiter.try_acquire(host)
 
 
 def webhook_dispatch(
@@ -108,56 +231,11 @@ def enqueue_webhook(db, url: str, payload: Dict):
     db.add(w)
     db.commit()
     db.refresh(w)
+    webhooks.wakeup.notify()
     return w
 
 
 def process_queue_once(db=None, max_attempts: int = 5):
-    """Process due webhooks once. Returns number processed."""
-    local_db = False
-    if db is None:
-        db = SessionLocal()
-        local_db = True
-    now = datetime.datetime.utcnow()
-    rows = (
-        db.query(models.WebhookQueue)
-        .filter(models.WebhookQueue.next_attempt_at <= now)
-        .all()
-    )
-    processed = 0
-    for row in rows:
-        payload = json.loads(row.payload)
-        try:
-            ok = webhook_dispatch(row.url, payload, retries=1, backoff=0.1)
-            if ok:
-                db.delete(row)
-                db.commit()
-                processed += 1
-                continue
-            else:
-                row.attempts = (row.attempts or 0) + 1
-                row.last_error = (row.last_error or "") + ";failed"
-                # exponential backoff
-                delay = (2**row.attempts) * 1
-                row.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(
-                    seconds=delay
-                )
-                if row.attempts >= max_attempts:
-                    # mark as dead-letter (keep record for admin review)
-                    row.dead = 1
-                    row.last_error = (row.last_error or "") + ";max_attempts"
-                    row.next_attempt_at = None
-                    db.add(row)
-                else:
-                    db.add(row)
-                db.commit()
-        except Exception as e:
-            row.attempts = (row.attempts or 0) + 1
-            row.last_error = str(e)
-            row.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(
-                seconds=30
-            )
-            db.add(row)
-            db.commit()
-    if local_db:
-        db.close()
-    return processed
+    """Process due webhooks once (concurrently, see app.webhooks).
+    Returns number processed."""
+    return webhooks.run_once(db=db, max_attempts=max_attempts)
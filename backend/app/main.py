@@ -1,57 +1,37 @@
 import asyncio
 import datetime
 import os
-import weakref
 from contextlib import asynccontextmanager
-from pathlib import Path
 
 from app import (
     ai_processor,
+    async_crud,
     audit,
+    cache,
+    columnar,
     crud,
+    feature_store,
     gamification,
     integrations,
     models,
     reporting,
+    rescoring,
     schemas,
+    search,
     security,
+    webhooks,
 )
-from fastapi import Depends, FastAPI
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-
-BASE_DIR = Path(__file__).resolve().parent.parent
-DATABASE_URL = f"sqlite:///{BASE_DIR / 'test.db'}"
-
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-
-# Wrap the sessionmaker so we can keep weakrefs to created Session instances.
-_maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-class SessionFactory:
-    def __init__(self, maker):
-        self._maker = maker
-        self._instances = weakref.WeakSet()
-
-    def __call__(self):
-        s = self._maker()
-        try:
-            self._instances.add(s)
-        except Exception:
-            pass
-        return s
-
-    def expire_all(self):
-        for s in list(self._instances):
-            try:
-                s.expire_all()
-            except Exception:
-                pass
-
-
-SessionLocal = SessionFactory(_maker)
-
+from app.db import (  # noqa: F401
+    BASE_DIR,
+    DATABASE_URL,
+    USE_ASYNC_DB,
+    SessionLocal,
+    dispose_async_engine,
+    engine,
+    get_async_sessionmaker,
+)
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy import text
 
 # Try to ensure the `dead` column exists on older DBs created before the column
 # was introduced. If the table doesn't exist yet, creating all tables will set
@@ -77,6 +57,90 @@ try:
 except Exception:
     pass
 
+
+def _try_ddl(statement: str) -> None:
+    """Run a single best-effort schema upgrade statement, ignoring failures
+    (e.g. the column already exists)."""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(statement))
+            conn.commit()
+    except Exception:
+        pass
+
+
+# Lead dedupe keys (see alembic 0006); older DBs need the columns + backfill
+_try_ddl("ALTER TABLE companies ADD COLUMN name_key VARCHAR")
+_try_ddl("ALTER TABLE contacts ADD COLUMN email_key VARCHAR")
+_try_ddl("CREATE INDEX IF NOT EXISTS ix_companies_name_key ON companies (name_key)")
+_try_ddl("CREATE INDEX IF NOT EXISTS ix_contacts_email_key ON contacts (email_key)")
+# Report score filters (see alembic 0007)
+_try_ddl("CREATE INDEX IF NOT EXISTS ix_companies_lead_score ON companies (lead_score)")
+# Company listing sort keys (see alembic 0017, models.COMPANY_*_SORT)
+_try_ddl(
+    "CREATE INDEX IF NOT EXISTS ix_companies_name_sort"
+    " ON companies (coalesce(name, ''))"
+)
+_try_ddl(
+    "CREATE INDEX IF NOT EXISTS ix_companies_lead_score_sort"
+    " ON companies (coalesce(lead_score, 0.0))"
+)
+# Materialized scores (see alembic 0009, 0010); NULL scored_at = not scored yet
+for _column in (
+    "score FLOAT",
+    "recommended_action VARCHAR",
+    "official_registry_id VARCHAR",
+    "industry VARCHAR",
+    "enriched INTEGER DEFAULT 0",
+    "scored_at DATETIME",
+    "score_input_hash VARCHAR",
+    "score_model_version VARCHAR",
+):
+    _try_ddl(f"ALTER TABLE companies ADD COLUMN {_column}")
+_try_ddl("CREATE INDEX IF NOT EXISTS ix_companies_scored_at ON companies (scored_at)")
+# Feature store lookups by company (see alembic 0012)
+_try_ddl(
+    "CREATE INDEX IF NOT EXISTS ix_opportunities_company_id "
+    "ON opportunities (company_id)"
+)
+_try_ddl(
+    "CREATE INDEX IF NOT EXISTS ix_activities_opportunity_id "
+    "ON activities (opportunity_id)"
+)
+# Recent-activity expiry sweep (see alembic 0018)
+_try_ddl(
+    "CREATE INDEX IF NOT EXISTS ix_company_features_last_activity_at"
+    " ON company_features (last_activity_at)"
+)
+# Webhook worker leases (see alembic 0013)
+_try_ddl("ALTER TABLE webhook_queue ADD COLUMN claimed_by VARCHAR")
+_try_ddl("ALTER TABLE webhook_queue ADD COLUMN lease_until DATETIME")
+# Webhook history and the due-row index (see alembic 0014, 0016)
+_try_ddl("ALTER TABLE webhook_history ADD COLUMN requeued_from INTEGER")
+_try_ddl(
+    "CREATE INDEX IF NOT EXISTS ix_webhook_history_requeued_from"
+    " ON webhook_history (requeued_from)"
+)
+_try_ddl(
+    "CREATE INDEX IF NOT EXISTS ix_webhook_queue_due"
+    " ON webhook_queue (next_attempt_at, id)"
+)
+# Full-text search index + sync triggers (see alembic 0008)
+try:
+    with engine.begin() as conn:
+        search.ensure_fts(conn)
+except Exception:
+    pass
+try:
+    _db = SessionLocal()
+    try:
+        crud.backfill_dedupe_keys(_db)
+        feature_store.backfill(_db)
+    finally:
+        _db.close()
+except Exception:
+    pass
+
 app = FastAPI(title="BlackBox CRM 2025 - Demo")
 
 # Register audit middleware for structured logging
@@ -186,47 +250,160 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with get_async_sessionmaker()() as session:
+        yield session
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
-@app.get("/companies")
-def get_companies(db=Depends(get_db)):
-    companies = crud.get_companies(db)
-    scored = ai_processor.apply_demo_scoring([c.__dict__ for c in companies])
-    return {"companies": scored}
+# /companies pages, keyed on crud.data_version() so any committed write
+# (including a rescoring pass) makes older entries unreachable; the TTL
+# bounds staleness for writes made by other processes.
+companies_cache = cache.TTLCache(
+    maxsize=int(os.getenv("BBH_COMPANIES_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("BBH_COMPANIES_CACHE_TTL", 30)),
+)
+
+
+def _cache_scored_companies(key, companies, next_cursor, features=None):
+    views, scoring = rescoring.company_views(companies, features)
+    response = {"companies": views, "next_cursor": next_cursor, "scoring": scoring}
+    companies_cache.set(key, response)
+    return response
+
+
+# --- Hot CRM endpoints ---
+# Each has a sync (threadpool) and an async (async engine) implementation;
+# BBH_ASYNC_DB picks which one is registered for this deployment.
+def get_companies(
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+    db=Depends(get_db),
+):
+    key = (crud.data_version(), sort, order, cursor, limit)
+    cached = companies_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        companies, next_cursor = crud.get_companies_page(
+            db, sort=sort, order=order, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    features = feature_store.load_features(db, rescoring.pending_ids(companies))
+    return _cache_scored_companies(key, companies, next_cursor, features)
+
+
+async def get_companies_async(
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+    db=Depends(get_async_db),
+):
+    key = (crud.data_version(), sort, order, cursor, limit)
+    cached = companies_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        companies, next_cursor = await async_crud.get_companies_page(
+            db, sort=sort, order=order, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    features = await db.run_sync(
+        feature_store.load_features, rescoring.pending_ids(companies)
+    )
+    # scoring may block on OpenGov lookups; keep it off the event loop
+    return await asyncio.to_thread(
+        _cache_scored_companies, key, companies, next_cursor, features
+    )
 
 
-@app.post("/leads")
 def add_lead(lead: dict, db=Depends(get_db)):
     created = crud.create_lead(db, lead)
     return {"status": "ok", "lead": {"id": created.id, "name": created.name}}
 
 
-@app.get("/gamification")
-def get_gamification(user_id: int = 1):
-    return gamification.get_demo_stats(user_id)
+async def add_lead_async(lead: dict, db=Depends(get_async_db)):
+    created = await async_crud.create_lead(db, lead)
+    return {"status": "ok", "lead": {"id": created.id, "name": created.name}}
+
+
+def _lead_response(created, scoring):
+    return {
+        "status": "ok",
+        "lead_id": created.id,
+        "lead_score": created.lead_score,
+        "scoring": scoring,
+    }
 
 
-@app.post("/mobile/leads")
 def mobile_add_lead(payload: dict, db=Depends(get_db)):
-    normalized = ai_processor.apply_demo_scoring([payload], deterministic=True)[0]
-    created = crud.create_or_update_lead(db, normalized)
-    return {"status": "ok", "lead_id": created.id, "lead_score": created.lead_score}
+    normalized, scoring = ai_processor.apply_scoring([payload], deterministic=True)
+    created = crud.create_or_update_lead(db, normalized[0])
+    return _lead_response(created, scoring)
+
+
+async def mobile_add_lead_async(payload: dict, db=Depends(get_async_db)):
+    normalized, scoring = await asyncio.to_thread(
+        ai_processor.apply_scoring, [payload], deterministic=True
+    )
+    created = await async_crud.create_or_update_lead(db, normalized[0])
+    return _lead_response(created, scoring)
 
 
-@app.post("/mobile/sync")
 def mobile_sync(payload: dict, db=Depends(get_db)):
     leads = payload.get("leads", [])
-    results = []
-    for lead in leads:
-        normalized = ai_processor.apply_demo_scoring([lead], deterministic=True)[0]
-        comp = crud.create_or_update_lead(db, normalized)
-        results.append(
-            {"lead_id": comp.id, "name": comp.name, "lead_score": comp.lead_score}
-        )
-    return {"status": "ok", "synced": len(results), "results": results}
+    normalized, scoring = ai_processor.apply_scoring(leads, deterministic=True)
+    results = crud.bulk_upsert_leads(db, normalized)
+    return {
+        "status": "ok",
+        "synced": len(results),
+        "results": results,
+        "scoring": scoring,
+    }
+
+
+async def mobile_sync_async(payload: dict, db=Depends(get_async_db)):
+    leads = payload.get("leads", [])
+    # scoring a large batch is CPU work; keep it off the event loop
+    normalized, scoring = await asyncio.to_thread(
+        ai_processor.apply_scoring, leads, deterministic=True
+    )
+    results = await async_crud.bulk_upsert_leads(db, normalized)
+    return {
+        "status": "ok",
+        "synced": len(results),
+        "results": results,
+        "scoring": scoring,
+    }
+
+
+CRM_ROUTES = [
+    ("/companies", "GET", get_companies, get_companies_async),
+    ("/leads", "POST", add_lead, add_lead_async),
+    ("/mobile/leads", "POST", mobile_add_lead, mobile_add_lead_async),
+    ("/mobile/sync", "POST", mobile_sync, mobile_sync_async),
+]
+
+for _path, _method, _sync_endpoint, _async_endpoint in CRM_ROUTES:
+    app.add_api_route(
+        _path,
+        _async_endpoint if USE_ASYNC_DB else _sync_endpoint,
+        methods=[_method],
+    )
+
+
+@app.get("/gamification")
+def get_gamification(user_id: int = 1):
+    return gamification.get_demo_stats(user_id)
 
 
 @app.get("/mobile/status")
@@ -255,14 +432,58 @@ def gamification_leaderboard(top: int = 10):
     return {"leaderboard": gamification.get_leaderboard(top)}
 
 
+@app.get("/search")
+def search_companies(q: str, cursor: str = None, limit: int = None, db=Depends(get_db)):
+    try:
+        results, next_cursor = search.search_companies(
+            db, q, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results, "next_cursor": next_cursor}
+
+
 @app.get("/reports/companies.csv")
 def export_companies_csv(db=Depends(get_db)):
     return reporting.companies_csv_response(db)
 
 
+@app.get("/reports/companies.ndjson")
+def export_companies_ndjson(db=Depends(get_db)):
+    return reporting.companies_ndjson_response(db)
+
+
+def _columnar_export(build, *args, **kwargs):
+    try:
+        return build(*args, **kwargs)
+    except columnar.ColumnarUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@app.get("/reports/companies.arrow")
+def export_companies_arrow(db=Depends(get_db)):
+    return _columnar_export(reporting.companies_columnar_response, db, "arrow")
+
+
+@app.get("/reports/companies.parquet")
+def export_companies_parquet(db=Depends(get_db)):
+    return _columnar_export(reporting.companies_columnar_response, db, "parquet")
+
+
 @app.get("/reports/companies.json")
-def export_companies_json(db=Depends(get_db)):
-    return reporting.companies_json_response(db)
+def export_companies_json(
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+    db=Depends(get_db),
+):
+    try:
+        return reporting.companies_json_response(
+            db, sort=sort, order=order, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.get("/reports/leads.csv")
@@ -270,10 +491,70 @@ def export_leads_csv(
     name: str = None,
     min_score: float = None,
     max_score: float = None,
+    name_prefix: str = None,
     db=Depends(get_db),
 ):
     return reporting.leads_csv_response(
-        db, name_contains=name, min_score=min_score, max_score=max_score
+        db,
+        name_contains=name,
+        min_score=min_score,
+        max_score=max_score,
+        name_prefix=name_prefix,
+    )
+
+
+@app.get("/reports/leads.ndjson")
+def export_leads_ndjson(
+    name: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+    db=Depends(get_db),
+):
+    return reporting.leads_ndjson_response(
+        db,
+        name_contains=name,
+        min_score=min_score,
+        max_score=max_score,
+        name_prefix=name_prefix,
+    )
+
+
+@app.get("/reports/leads.arrow")
+def export_leads_arrow(
+    name: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+    db=Depends(get_db),
+):
+    return _columnar_export(
+        reporting.leads_columnar_response,
+        db,
+        "arrow",
+        name_contains=name,
+        min_score=min_score,
+        max_score=max_score,
+        name_prefix=name_prefix,
+    )
+
+
+@app.get("/reports/leads.parquet")
+def export_leads_parquet(
+    name: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+    db=Depends(get_db),
+):
+    return _columnar_export(
+        reporting.leads_columnar_response,
+        db,
+        "parquet",
+        name_contains=name,
+        min_score=min_score,
+        max_score=max_score,
+        name_prefix=name_prefix,
     )
 
 
@@ -282,11 +563,27 @@ def export_leads_json(
     name: str = None,
     min_score: float = None,
     max_score: float = None,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+    name_prefix: str = None,
     db=Depends(get_db),
 ):
-    return reporting.leads_json_response(
-        db, name_contains=name, min_score=min_score, max_score=max_score
-    )
+    try:
+        return reporting.leads_json_response(
+            db,
+            name_contains=name,
+            min_score=min_score,
+            max_score=max_score,
+            sort=sort,
+            order=order,
+            cursor=cursor,
+            limit=limit,
+            name_prefix=name_prefix,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # --- Security / Admin / MFA demo endpoints ---
@@ -312,6 +609,38 @@ def admin_ping(user: schemas.User = Depends(security.get_current_user)):
     return {"status": "ok", "user": user.username, "role": user.role}
 
 
+@app.get("/admin/cache")
+def admin_cache_stats(user: schemas.User = Depends(security.get_current_user)):
+    security.require_role(user, ("admin",))
+    return {
+        "data_version": crud.data_version(),
+        "companies": companies_cache.stats(),
+        "enrichment": integrations.enrichment_cache_stats(),
+    }
+
+
+@app.get("/admin/rescore")
+def admin_rescore_status(
+    user: schemas.User = Depends(security.get_current_user), db=Depends(get_db)
+):
+    security.require_role(user, ("admin",))
+    return {
+        "running": rescoring.full_rescore_running(),
+        "job": rescoring.job_status(rescoring.latest_job(db)),
+    }
+
+
+@app.post("/admin/rescore")
+def admin_rescore_start(
+    resume: bool = True, user: schemas.User = Depends(security.get_current_user)
+):
+    """Start a full-book rescore in the background (resumes an unfinished
+    run for the current model unless `resume=false`)."""
+    security.require_role(user, ("admin",))
+    started = rescoring.start_full_rescore(resume=resume)
+    return {"status": "started" if started else "already running"}
+
+
 @app.post("/webhook/enqueue")
 def webhook_enqueue(payload: dict, db=Depends(get_db)):
     """
@@ -331,25 +660,45 @@ def webhook_enqueue(payload: dict, db=Depends(get_db)):
 async def lifespan(app: FastAPI):
     # Start background worker
     stop_worker = False
+    dispatcher = webhooks.Dispatcher()
 
     async def _worker():
+        # enqueues and requeues wake the worker; otherwise it sleeps until
+        # the next row is due (see app.webhooks)
+        webhooks.wakeup.bind()
         while not stop_worker:
+            delay = webhooks.POLL_SECONDS
             try:
-                await asyncio.to_thread(integrations.process_queue_once)
+                await webhooks.process_queue_once(dispatcher)
+                await asyncio.to_thread(webhooks.maybe_prune_history)
+                delay = await asyncio.to_thread(webhooks.idle_seconds)
             except Exception:
                 pass
-            await asyncio.sleep(5)
+            await webhooks.wakeup.wait(delay)
 
-    task = asyncio.create_task(_worker())
+    async def _rescorer():
+        while not stop_worker:
+            try:
+                await asyncio.to_thread(rescoring.rescore_pending_once)
+            except Exception:
+                pass
+            await asyncio.sleep(rescoring.RESCORE_INTERVAL)
+
+    tasks = [asyncio.create_task(_worker())]
+    if rescoring.RESCORE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_rescorer()))
     try:
         yield
     finally:
-        # signal worker to stop and wait for it
+        # signal workers to stop and wait for them
         stop_worker = True
-        try:
-            task.cancel()
-        except Exception:
-            pass
+        for task in tasks:
+            try:
+                task.cancel()
+            except Exception:
+                pass
+        await dispatcher.aclose()
+        await dispose_async_engine()
 
 
 app.router.lifespan_context = lifespan
@@ -388,10 +737,133 @@ def admin_list_webhooks(
                     r.next_attempt_at.isoformat() if r.next_attempt_at else None
                 ),
                 "dead": bool(r.dead),
+                "claimed_by": r.claimed_by,
+                "lease_until": r.lease_until.isoformat() if r.lease_until else None,
                 "created_at": r.created_at.isoformat() if r.created_at else None,
             }
         )
-    return {"webhooks": out}
+    # dead letters live in webhook_history and are addressed by its id (a
+    # queue id can be handed out again once its row has left the queue)
+    dead = [_history_view(h) for h in webhooks.dead_letters(db)]
+    return {"webhooks": out, "dead_letters": dead}
+
+
+def _history_view(h):
+    return {
+        "id": h.id,
+        "webhook_id": h.webhook_id,
+        "url": h.url,
+        "status": h.status,
+        "attempts": h.attempts,
+        "last_error": h.last_error,
+        "created_at": h.created_at.isoformat() if h.created_at else None,
+        "finished_at": h.finished_at.isoformat() if h.finished_at else None,
+        "requeued_from": h.requeued_from,
+    }
+
+
+@app.get("/admin/webhooks/history")
+def admin_webhook_history(
+    status: str = None,
+    url: str = None,
+    cursor: str = None,
+    limit: int = None,
+    user: schemas.User = Depends(security.get_current_user),
+    db=Depends(get_db),
+):
+    security.require_role(user, ("admin",))
+    try:
+        rows, next_cursor = webhooks.history_page(db, status, url, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"history": [_history_view(h) for h in rows], "next_cursor": next_cursor}
+
+
+def _destination_view(d):
+    return {
+        "url": d.url,
+        "batch_size": d.batch_size,
+        "gzip_min_bytes": d.gzip_min_bytes,
+        "updated_at": d.updated_at.isoformat() if d.updated_at else None,
+    }
+
+
+@app.get("/admin/webhooks/destinations")
+def admin_webhook_destinations(
+    user: schemas.User = Depends(security.get_current_user), db=Depends(get_db)
+):
+    security.require_role(user, ("admin",))
+    rows = db.query(models.WebhookDestination).order_by(models.WebhookDestination.url)
+    return {"destinations": [_destination_view(d) for d in rows]}
+
+
+@app.put("/admin/webhooks/destinations")
+def admin_set_webhook_destination(
+    payload: dict,
+    user: schemas.User = Depends(security.get_current_user),
+    db=Depends(get_db),
+):
+    """
+    Batching / compression settings for one receiver URL.
+
+    Expected JSON body: {"url": "https://...", "batch_size": 50,
+    "gzip_min_bytes": 1024}; batch_size 1 turns batching off, a null
+    gzip_min_bytes turns compression off.
+    """
+    security.require_role(user, ("admin",))
+    url = payload.get("url")
+    if not url:
+        return {"status": "error", "message": "missing url"}
+    try:
+        batch_size = int(payload.get("batch_size", 1))
+        gzip_min_bytes = payload.get("gzip_min_bytes")
+        if gzip_min_bytes is not None:
+            gzip_min_bytes = int(gzip_min_bytes)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="settings must be integers")
+    if not 1 <= batch_size <= webhooks.BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"batch_size must be between 1 and {webhooks.BATCH_SIZE}",
+        )
+    if gzip_min_bytes is not None and gzip_min_bytes < 0:
+        raise HTTPException(status_code=400, detail="gzip_min_bytes must be >= 0")
+    D = models.WebhookDestination
+    row = db.query(D).filter(D.url == url).first() or D(url=url)
+    row.batch_size = batch_size
+    row.gzip_min_bytes = gzip_min_bytes
+    db.add(row)
+    db.commit()
+    db.refresh(row)
+    return {"status": "ok", "destination": _destination_view(row)}
+
+
+@app.delete("/admin/webhooks/destinations")
+def admin_delete_webhook_destination(
+    url: str,
+    user: schemas.User = Depends(security.get_current_user),
+    db=Depends(get_db),
+):
+    security.require_role(user, ("admin",))
+    D = models.WebhookDestination
+    deleted = db.query(D).filter(D.url == url).delete()
+    db.commit()
+    if not deleted:
+        return {"status": "error", "message": "not found"}
+    return {"status": "ok"}
+
+
+@app.post("/admin/webhooks/history/{hid}/requeue")
+def admin_requeue_dead_letter(
+    hid: int,
+    user: schemas.User = Depends(security.get_current_user),
+    db=Depends(get_db),
+):
+    security.require_role(user, ("admin",))
+    requeued = webhooks.requeue_dead(db, hid)
+    if requeued is None:
+        return {"status": "error", "message": "not a dead letter, or already requeued"}
+    return {"status": "ok", "id": requeued.id}
 
 
 @app.post("/admin/webhooks/{wid}/requeue")
@@ -408,8 +880,11 @@ def admin_requeue_webhook(
     row.last_error = ""
     row.dead = 0
     row.next_attempt_at = datetime.datetime.utcnow()
+    row.claimed_by = None
+    row.lease_until = None
     db.add(row)
     db.commit()
+    webhooks.wakeup.notify()
     # Ensure any other in-process sessions (like test sessions) see this update
     try:
         if hasattr(SessionLocal, "expire_all"):
@@ -1,17 +1,91 @@
 import datetime
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+    literal_column,
+)
+from sqlalchemy.orm import declarative_base, relationship, validates
 
 Base = declarative_base()
 
 
+def normalize_name(value):
+    """Dedupe key for company names: whitespace-collapsed and case-folded."""
+    if not value:
+        return None
+    return " ".join(str(value).split()).casefold() or None
+
+
+def normalize_email(value):
+    """Dedupe key for emails: trimmed and lower-cased."""
+    if not value:
+        return None
+    return str(value).strip().lower() or None
+
+
 class Company(Base):
     __tablename__ = "companies"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    lead_score = Column(Float, default=0.0)
+    # normalized copy of `name`, kept in sync by the validator below
+    name_key = Column(String, index=True)
+    lead_score = Column(Float, default=0.0, index=True)
     description = Column(Text, default="")
+    # materialized scoring output (see app.rescoring); a NULL `scored_at`
+    # marks the row for the background rescorer
+    score = Column(Float)
+    recommended_action = Column(String)
+    official_registry_id = Column(String)
+    industry = Column(String)
+    enriched = Column(Integer, default=0)
+    scored_at = Column(DateTime, index=True)
+    score_input_hash = Column(String)
+    score_model_version = Column(String)
+
+    @validates("name")
+    def _sync_name_key(self, key, value):
+        self.name_key = normalize_name(value)
+        self.scored_at = None
+        return value
+
+    @validates("lead_score")
+    def _invalidate_score(self, key, value):
+        self.scored_at = None
+        return value
+
+
+# Sort keys of the company listing (see crud.COMPANY_SORTS), indexed so pages
+# are read in index order. The defaults are literals rather than bound
+# parameters so SQLite can match the query expressions to these indexes.
+COMPANY_NAME_SORT = func.coalesce(Company.name, literal_column("''"))
+COMPANY_SCORE_SORT = func.coalesce(Company.lead_score, literal_column("0.0"))
+Index("ix_companies_name_sort", COMPANY_NAME_SORT)
+Index("ix_companies_lead_score_sort", COMPANY_SCORE_SORT)
+
+
+class RescoreJob(Base):
+    """Progress and checkpoint of a full rescoring run (see app.rescoring)."""
+
+    __tablename__ = "rescore_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, default="running")  # running / done / failed
+    model_version = Column(String)
+    # checkpoint: every company with id <= last_id has been rescored
+    last_id = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    error = Column(Text, default="")
+    started_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime)
 
 
 class Contact(Base):
@@ -20,13 +94,20 @@ class Contact(Base):
     company_id = Column(Integer, ForeignKey("companies.id"))
     name = Column(String)
     email = Column(String, index=True)
+    # normalized copy of `email`, kept in sync by the validator below
+    email_key = Column(String, index=True)
     company = relationship("Company", backref="contacts")
 
+    @validates("email")
+    def _sync_email_key(self, key, value):
+        self.email_key = normalize_email(value)
+        return value
+
 
 class Opportunity(Base):
     __tablename__ = "opportunities"
     id = Column(Integer, primary_key=True, index=True)
-    company_id = Column(Integer, ForeignKey("companies.id"))
+    company_id = Column(Integer, ForeignKey("companies.id"), index=True)
     name = Column(String)
     value = Column(Float, default=0.0)
     status = Column(String, default="open")
@@ -36,12 +117,29 @@ class Opportunity(Base):
 class Activity(Base):
     __tablename__ = "activities"
     id = Column(Integer, primary_key=True, index=True)
-    opportunity_id = Column(Integer, ForeignKey("opportunities.id"))
+    opportunity_id = Column(Integer, ForeignKey("opportunities.id"), index=True)
     type = Column(String)
     note = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 
+class CompanyFeatures(Base):
+    """Running aggregates of a company's opportunities and activities,
+    maintained incrementally by app.feature_store."""
+
+    __tablename__ = "company_features"
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    opportunity_count = Column(Integer, default=0, nullable=False)
+    open_opportunity_count = Column(Integer, default=0, nullable=False)
+    open_value = Column(Float, default=0.0, nullable=False)
+    activity_count = Column(Integer, default=0, nullable=False)
+    # indexed for the recency sweep (see rescoring.expire_recent_activity)
+    last_activity_at = Column(DateTime, index=True)
+    # bumped on every change; guards concurrent rescoring
+    version = Column(Integer, default=1, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -62,6 +160,46 @@ class WebhookQueue(Base):
     next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow)
     dead = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # worker claim (see app.webhooks): exclusive until lease_until
+    claimed_by = Column(String)
+    lease_until = Column(DateTime)
+
+    # the workers' due-row scan: range on next_attempt_at, in claim order
+    __table_args__ = (Index("ix_webhook_queue_due", "next_attempt_at", "id"),)
+
+
+class WebhookDestination(Base):
+    """Per receiver URL delivery settings (see app.webhooks); URLs without a
+    row get one POST per payload, uncompressed."""
+
+    __tablename__ = "webhook_destinations"
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False, unique=True, index=True)
+    # up to this many due payloads go out as one JSON array POST (1 = off)
+    batch_size = Column(Integer, default=1)
+    # gzip request bodies of at least this many bytes (NULL = never)
+    gzip_min_bytes = Column(Integer)
+    updated_at = Column(
+        DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow
+    )
+
+
+class WebhookHistory(Base):
+    """Append-only record of finished webhooks (delivered or dead-lettered),
+    moved out of webhook_queue and pruned by age (see app.webhooks)."""
+
+    __tablename__ = "webhook_history"
+    id = Column(Integer, primary_key=True)
+    webhook_id = Column(Integer, index=True)  # the webhook_queue id it had
+    url = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False)  # delivered / dead
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, default="")
+    created_at = Column(DateTime)
+    finished_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    # on "requeued" entries: the dead entry that went back on the queue
+    requeued_from = Column(Integer, index=True)
 
 
 class AutomationFlow(Base):
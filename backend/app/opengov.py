@@ -0,0 +1,208 @@
+"""OpenGov registry client with request coalescing and batching.
+
+With BBH_OPENGOV_URL set, lookups go to the registry's batch endpoint
+(``POST {url}/lookup`` with ``{"names": [...]}``, answered with
+``{"results": {name: record}}``) over one pooled `httpx.AsyncClient`:
+
+- single flight: a name that is already being looked up is not requested
+  again; every caller awaits the same in-flight result;
+- batching: distinct names requested within BBH_OPENGOV_BATCH_WINDOW_MS go
+  upstream together, at most BBH_OPENGOV_MAX_BATCH per request.
+
+The client runs on its own event loop thread, so synchronous callers (worker
+threads, the scoring path) and async ones share the same in-flight map.
+Without BBH_OPENGOV_URL the deterministic local stand-in (`registry_record`)
+answers instantly and none of this is needed.
+"""
+
+import asyncio
+import os
+import threading
+import zlib
+from typing import Dict, Iterable
+
+import httpx
+
+UPSTREAM_URL = os.getenv("BBH_OPENGOV_URL", "")
+BATCH_WINDOW = float(os.getenv("BBH_OPENGOV_BATCH_WINDOW_MS", 10)) / 1000
+MAX_BATCH = int(os.getenv("BBH_OPENGOV_MAX_BATCH", 100))
+TIMEOUT = float(os.getenv("BBH_OPENGOV_TIMEOUT", 5))
+# concurrent upstream requests per process
+MAX_CONCURRENCY = int(os.getenv("BBH_OPENGOV_CONCURRENCY", 4))
+
+NOT_FOUND = {"enriched": False, "reason": "not_found"}
+
+
+def registry_record(key: str) -> Dict:
+    """Stand-in for the OpenGov registry: a deterministic record per name."""
+    seed = zlib.crc32(key.encode("utf-8")) % 100000
+    return {
+        "official_registry_id": f"OG-{seed}",
+        "industry": "Services" if seed % 2 == 0 else "Manufacturing",
+        "enriched": True,
+    }
+
+
+class Coalescer:
+    """Single-flight, batching front for an async ``fetch(keys) -> dict``.
+
+    Must be used from one event loop. Keys missing from a fetch result
+    resolve to `NOT_FOUND`; a failed fetch fails every waiter of its batch.
+    """
+
+    def __init__(self, fetch, window: float = BATCH_WINDOW, max_batch: int = MAX_BATCH):
+        self._fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self._inflight = {}  # key -> Future shared by all its callers
+        self._pending = []  # keys waiting for the next batch
+        self._timer = None
+        self.requests = 0  # upstream calls made
+        self.coalesced = 0  # lookups served by another caller's call
+
+    async def get_many(self, keys) -> dict:
+        """key -> record for the keys that could be looked up."""
+        futures = {key: self._future(key) for key in dict.fromkeys(keys)}
+        results = await asyncio.gather(
+            *(asyncio.shield(f) for f in futures.values()), return_exceptions=True
+        )
+        return {
+            key: result
+            for key, result in zip(futures, results)
+            if not isinstance(result, BaseException)
+        }
+
+    def _future(self, key):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._inflight[key] = loop.create_future()
+        self._pending.append(key)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch):
+        self.requests += 1
+        error = None
+        try:
+            results = await self._fetch(batch)
+        except Exception as e:
+            results, error = {}, e
+        for key in batch:
+            future = self._inflight.pop(key)
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results.get(key, NOT_FOUND))
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._inflight),
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+        }
+
+
+class OpenGovClient:
+    """Batched, coalesced lookups against the registry at `base_url`."""
+
+    def __init__(
+        self,
+        base_url: str,
+        window: float = BATCH_WINDOW,
+        max_batch: int = MAX_BATCH,
+        timeout: float = TIMEOUT,
+        max_concurrency: int = MAX_CONCURRENCY,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._http = None
+        self.coalescer = None
+
+    def _ensure_loop(self):
+        # one loop thread per process (a forked child starts its own)
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="opengov-client", daemon=True
+            ).start()
+            self._loop, self._pid = loop, os.getpid()
+            self._http = None
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self.coalescer = Coalescer(self._fetch, self.window, self.max_batch)
+            return loop
+
+    async def _fetch(self, keys) -> dict:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=10),
+            )
+        async with self._slots:
+            r = await self._http.post("/lookup", json={"names": list(keys)})
+        r.raise_for_status()
+        return r.json().get("results") or {}
+
+    async def _get_many(self, keys):
+        return await self.coalescer.get_many(keys)
+
+    def lookup_many(self, keys: Iterable[str]) -> dict:
+        """Blocking lookup (from any thread): key -> record."""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._get_many(list(keys)), loop)
+        return future.result(self.timeout * 2)
+
+    async def alookup_many(self, keys: Iterable[str]) -> dict:
+        """Awaitable lookup for callers on another event loop."""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._get_many(list(keys)), loop)
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        with self._lock:
+            loop, http = self._loop, self._http
+            self._pid = self._loop = self._http = None
+        if loop is None:
+            return
+        if http is not None:
+            asyncio.run_coroutine_threadsafe(http.aclose(), loop).result(self.timeout)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+client = OpenGovClient(UPSTREAM_URL) if UPSTREAM_URL else None
+
+
+def lookup_many(keys: Iterable[str]) -> dict:
+    """Registry records for normalized names, key -> record.
+
+    Keys whose lookup failed are left out (and so are not cached).
+    """
+    keys = list(keys)
+    if client is None:
+        return {key: registry_record(key) for key in keys}
+    return client.lookup_many(keys)
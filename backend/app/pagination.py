@@ -0,0 +1,115 @@
+"""Keyset (cursor) pagination helpers.
+
+Pages are ordered by ``(sort_key, id)`` and the cursor carries the last
+row's key, so fetching page N costs the same as fetching page 1 (an index
+range scan) instead of an ever-growing OFFSET scan. Cursors are opaque,
+URL-safe strings bound to the sort they were issued for.
+
+Configuration (environment):
+  BBH_DEFAULT_PAGE_SIZE   page size when the client passes no limit (100)
+  BBH_MAX_PAGE_SIZE       upper bound for client supplied limits (1000)
+"""
+
+import base64
+import json
+import os
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("BBH_DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("BBH_MAX_PAGE_SIZE", 1000))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def clamp_limit(limit=None) -> int:
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def encode_cursor(sort: str, key) -> str:
+    raw = json.dumps({"s": sort, "k": list(key)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str):
+    """Return the ``(sort_value, id)`` key stored in `cursor`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value, last_id = data["k"]
+        last_id = int(last_id)
+        issued_for = data["s"]
+    except Exception:
+        raise InvalidCursor("malformed cursor")
+    if issued_for != sort:
+        raise InvalidCursor("cursor was issued for a different sort")
+    return value, last_id
+
+
+def apply_keyset(
+    stmt,
+    sort_expr,
+    id_col,
+    sort: str,
+    cursor: str = None,
+    limit: int = None,
+    descending: bool = False,
+):
+    """Add the keyset WHERE / ORDER BY / LIMIT to a Query or Select.
+
+    One extra row is requested so `finish_page` can tell whether another
+    page exists.
+    """
+    limit = clamp_limit(limit)
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        after = (lambda col, v: col < v) if descending else (lambda col, v: col > v)
+        if sort_expr is id_col:
+            stmt = stmt.filter(after(id_col, last_id))
+        else:
+            stmt = stmt.filter(
+                or_(
+                    after(sort_expr, value),
+                    and_(sort_expr == value, after(id_col, last_id)),
+                )
+            )
+    if descending:
+        order = [sort_expr.desc()] + ([] if sort_expr is id_col else [id_col.desc()])
+    else:
+        order = [sort_expr] + ([] if sort_expr is id_col else [id_col])
+    return stmt.order_by(*order).limit(limit + 1)
+
+
+def finish_page(rows, key_fn, sort: str, limit: int = None):
+    """Trim the look-ahead row and build `next_cursor` from the last row."""
+    limit = clamp_limit(limit)
+    rows = list(rows)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, key_fn(rows[-1]))
+    return rows, next_cursor
+
+
+def keyset_page(
+    query,
+    sort_expr,
+    id_col,
+    key_fn,
+    sort: str,
+    cursor: str = None,
+    limit: int = None,
+    descending: bool = False,
+):
+    """Fetch one page of `query` ordered by ``(sort_expr, id_col)``.
+
+    `key_fn(row)` must return the row's ``(sort_value, id)`` exactly as
+    `sort_expr` evaluates it in SQL. Returns ``(rows, next_cursor)``;
+    `next_cursor` is None on the last page.
+    """
+    query = apply_keyset(query, sort_expr, id_col, sort, cursor, limit, descending)
+    return finish_page(query.all(), key_fn, sort, limit)
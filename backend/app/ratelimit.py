@@ -0,0 +1,182 @@
+"""Rate limiting (GCRA, the token bucket expressed as a single timestamp).
+
+Each key stores its "theoretical arrival time" (TAT): the time at which its
+bucket will be full again. A request of `cost` tokens advances the TAT by
+``cost / rate`` and is allowed when the TAT stays within ``burst / rate`` of
+now. This is exact token-bucket behaviour with fractional refill; nothing is
+lost to rounding, and a key whose TAT has passed holds a full bucket, so it
+can be dropped (`evict_idle`) without changing any decision.
+
+`try_acquire` never blocks. `acquire` (async) and `wait` (blocking) reserve
+the tokens up front and sleep until they are due, so waiting callers are
+served in arrival order without polling.
+
+State lives in the process by default. With `path` it is kept in a SQLite
+file instead (wall-clock time, one IMMEDIATE transaction per decision) and
+every process opening the file shares the same quota.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Optional
+
+# idle keys are swept every this many decisions
+EVICT_EVERY = 1000
+# slack for float rounding in the accumulated TAT
+_EPSILON = 1e-9
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1.0,
+        path: str = None,
+        table: str = "rate_limits",
+        clock=None,
+    ):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst >= 1")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.path = path
+        self.table = table
+        self._clock = clock or (time.time if path else time.monotonic)
+        self._tat = {}
+        self._decisions = 0
+        self._pid = None
+        self._open()
+
+    # state ---------------------------------------------------------------
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._lock = Lock()
+        self._conn = None
+        if self.path:
+            self._conn = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, tat REAL NOT NULL)"
+            )
+
+    def _update(self, key: str, decide):
+        """Run ``decide(tat, now) -> (new_tat or None, result)`` atomically."""
+        if self._pid != os.getpid():
+            self._open()  # don't share a connection or lock with a fork parent
+        with self._lock:
+            self._decisions += 1
+            sweep = self._decisions % EVICT_EVERY == 0
+            if self._conn is None:
+                now = self._clock()
+                new_tat, result = decide(self._tat.get(key), now)
+                if new_tat is not None:
+                    self._tat[key] = new_tat
+            else:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        f"SELECT tat FROM {self.table} WHERE key = ?", (key,)
+                    ).fetchone()
+                    now = self._clock()
+                    new_tat, result = decide(row[0] if row else None, now)
+                    if new_tat is not None:
+                        self._conn.execute(
+                            f"INSERT OR REPLACE INTO {self.table} (key, tat) "
+                            "VALUES (?, ?)",
+                            (key, new_tat),
+                        )
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        if sweep:
+            self.evict_idle()
+        return result
+
+    def evict_idle(self) -> int:
+        """Forget keys whose bucket has refilled completely."""
+        if self._pid != os.getpid():
+            self._open()
+        with self._lock:
+            now = self._clock()
+            if self._conn is None:
+                idle = [k for k, tat in self._tat.items() if tat <= now]
+                for key in idle:
+                    del self._tat[key]
+                return len(idle)
+            return self._conn.execute(
+                f"DELETE FROM {self.table} WHERE tat <= ?", (now,)
+            ).rowcount
+
+    def reset(self):
+        if self._pid != os.getpid():
+            self._open()
+        with self._lock:
+            self._tat.clear()
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            if self._conn is None:
+                return len(self._tat)
+            row = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        return row[0]
+
+    # decisions -----------------------------------------------------------
+
+    def _reserve(self, key: str, cost: float, max_wait: float) -> Optional[float]:
+        """Take `cost` tokens if they are available within `max_wait`
+        seconds; returns the wait (0 = now) or None without taking any."""
+        if cost > self.burst:
+            raise ValueError(f"cost {cost} exceeds burst {self.burst}")
+
+        def decide(tat, now):
+            new_tat = max(tat if tat is not None else now, now) + cost / self.rate
+            wait = max(0.0, new_tat - now - self.burst / self.rate)
+            if wait > max_wait + _EPSILON:
+                return None, None
+            return new_tat, wait
+
+        return self._update(key, decide)
+
+    def try_acquire(self, key: str, cost: float = 1.0) -> bool:
+        """Take `cost` tokens if available right now."""
+        return self._reserve(key, cost, 0.0) is not None
+
+    def available(self, key: str) -> float:
+        """Tokens `key` could take right now."""
+
+        def decide(tat, now):
+            if tat is None:
+                return None, self.burst
+            return None, min(self.burst, max(0.0, self.burst - (tat - now) * self.rate))
+
+        return self._update(key, decide)
+
+    async def acquire(self, key: str, cost: float = 1.0, timeout: float = None) -> bool:
+        """Wait (up to `timeout` seconds; None = as long as needed) for
+        `cost` tokens. Returns False, taking nothing, if they won't be
+        available in time."""
+        wait = self._reserve(key, cost, float("inf") if timeout is None else timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def wait(self, key: str, cost: float = 1.0, timeout: float = None) -> bool:
+        """Blocking `acquire` for synchronous callers."""
+        wait = self._reserve(key, cost, float("inf") if timeout is None else timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
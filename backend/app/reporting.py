@@ -1,62 +1,282 @@
 import csv
+import json
 from io import StringIO
 
-from app import crud
+from app import columnar, crud, models
 from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
 
+# rows fetched per round-trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+# rows encoded per chunk handed to the response
+EXPORT_CHUNK_ROWS = 500
 
-def _filter_companies(
-    db, name_contains: str = None, min_score: float = None, max_score: float = None
-):
-    comps = crud.get_companies(db, skip=0, limit=1000)
-    out = []
-    for c in comps:
-        if name_contains and name_contains.lower() not in (c.name or "").lower():
-            continue
-        score = float(getattr(c, "lead_score", 0.0) or 0.0)
-        if min_score is not None and score < float(min_score):
-            continue
-        if max_score is not None and score > float(max_score):
-            continue
-        out.append(c)
-    return out
-
-
-def get_leads_csv_buffer(
-    db, name_contains: str = None, min_score: float = None, max_score: float = None
+LEAD_COLUMNS = ["id", "name", "lead_score", "description"]
+COMPANY_COLUMNS = ["id", "name", "email", "website", "lead_score"]
+
+
+# Upper bound for prefix ranges: sorts after any character a key can hold.
+_MAX_CHAR = "\U0010ffff"
+
+
+def apply_company_filters(
+    stmt,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
 ):
-    companies = _filter_companies(db, name_contains, min_score, max_score)
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(["id", "name", "lead_score", "description"])
-    for c in companies:
-        writer.writerow(
-            [
-                getattr(c, "id", ""),
-                getattr(c, "name", ""),
-                getattr(c, "lead_score", ""),
-                getattr(c, "description", ""),
-            ]
+    """Compile the report filters into the WHERE clause of a Company query.
+
+    Name matching runs against the indexed, case-folded `name_key`, so it is
+    case-insensitive for non-ASCII (Czech) names too. `name_prefix` becomes
+    an index range scan; `name_contains` still has to scan (see /search for
+    indexed full-text matching). Score bounds use ix_companies_lead_score;
+    a NULL score counts as 0 like it did in the Python filter.
+    """
+    Company = models.Company
+    prefix = models.normalize_name(name_prefix)
+    if prefix:
+        stmt = stmt.filter(
+            Company.name_key >= prefix, Company.name_key < prefix + _MAX_CHAR
         )
-    si.seek(0)
-    return si
+    contains = models.normalize_name(name_contains)
+    if contains:
+        stmt = stmt.filter(Company.name_key.contains(contains, autoescape=True))
+    score = Company.lead_score
+    if min_score is not None:
+        cond = score >= float(min_score)
+        stmt = stmt.filter(or_(cond, score.is_(None)) if min_score <= 0 else cond)
+    if max_score is not None:
+        cond = score <= float(max_score)
+        stmt = stmt.filter(or_(cond, score.is_(None)) if max_score >= 0 else cond)
+    return stmt
 
 
-def leads_csv_response(
-    db, name_contains: str = None, min_score: float = None, max_score: float = None
+def companies_export_query(
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+):
+    """SELECT for the streaming exports.
+
+    Rows are ordered along the index that serves the most selective filter,
+    so SQLite can both filter and stream in index order without a temp sort.
+    """
+    Company = models.Company
+    stmt = apply_company_filters(
+        select(Company), name_contains, min_score, max_score, name_prefix
+    )
+    if models.normalize_name(name_prefix):
+        order = (Company.name_key, Company.id)
+    elif min_score is not None or max_score is not None:
+        order = (Company.lead_score, Company.id)
+    else:
+        order = (Company.id,)
+    return stmt.order_by(*order)
+
+
+def _filter_companies_page(
+    db,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+    name_prefix: str = None,
+):
+    """One keyset page of the filtered companies plus its `next_cursor`."""
+    query = apply_company_filters(
+        db.query(models.Company), name_contains, min_score, max_score, name_prefix
+    )
+    return crud.get_companies_page(
+        db, sort=sort, order=order, cursor=cursor, limit=limit, query=query
+    )
+
+
+def iter_companies(
+    db,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+):
+    """Stream every matching company from a server-side cursor.
+
+    Runs on its own session bound to the same engine as `db`: a streaming
+    response is consumed after the request's session has been closed.
+    """
+    session = Session(bind=db.get_bind())
+    try:
+        stmt = companies_export_query(
+            name_contains, min_score, max_score, name_prefix
+        ).execution_options(yield_per=batch_size)
+        yield from session.scalars(stmt)
+    finally:
+        session.close()
+
+
+def _lead_values(c):
+    return [
+        getattr(c, "id", ""),
+        getattr(c, "name", ""),
+        getattr(c, "lead_score", ""),
+        getattr(c, "description", ""),
+    ]
+
+
+def _company_values(c):
+    return [
+        getattr(c, "id", ""),
+        getattr(c, "name", ""),
+        getattr(c, "email", ""),
+        getattr(c, "website", ""),
+        getattr(c, "lead_score", ""),
+    ]
+
+
+def iter_csv(header, rows, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Encode `rows` (lists of values) as UTF-8 CSV, `chunk_rows` at a time."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+            pending = 0
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def iter_ndjson(header, rows, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Encode `rows` as newline-delimited JSON objects keyed by `header`."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(header, row)), ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_leads_csv(
+    db,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+):
+    companies = iter_companies(db, name_contains, min_score, max_score, name_prefix)
+    return iter_csv(LEAD_COLUMNS, map(_lead_values, companies))
+
+
+def iter_companies_csv(db):
+    return iter_csv(COMPANY_COLUMNS, map(_company_values, iter_companies(db)))
+
+
+def iter_leads_columnar(
+    db,
+    fmt: str,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
 ):
-    buf = get_leads_csv_buffer(db, name_contains, min_score, max_score)
+    """Encode the leads export as `fmt` ("arrow" or "parquet").
+
+    Same query and filters as the CSV export. Raises
+    `columnar.ColumnarUnavailable` when pyarrow is not installed.
+    """
+    encode, _media_type = columnar.ENCODERS[fmt]
+    schema = columnar.lead_schema()
+    companies = iter_companies(db, name_contains, min_score, max_score, name_prefix)
+    return encode(schema, map(_lead_values, companies))
+
+
+def iter_companies_columnar(db, fmt: str):
+    encode, _media_type = columnar.ENCODERS[fmt]
+    schema = columnar.company_schema()
+    return encode(schema, map(_company_values, iter_companies(db)))
+
+
+def _attachment(body, media_type: str, filename: str):
     return StreamingResponse(
-        buf,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=leads.csv"},
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
+def leads_csv_response(
+    db,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+):
+    body = iter_leads_csv(db, name_contains, min_score, max_score, name_prefix)
+    return _attachment(body, "text/csv", "leads.csv")
+
+
+def leads_ndjson_response(
+    db,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+):
+    companies = iter_companies(db, name_contains, min_score, max_score, name_prefix)
+    body = iter_ndjson(LEAD_COLUMNS, map(_lead_values, companies))
+    return _attachment(body, "application/x-ndjson", "leads.ndjson")
+
+
+def leads_columnar_response(
+    db,
+    fmt: str,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    name_prefix: str = None,
+):
+    body = iter_leads_columnar(
+        db, fmt, name_contains, min_score, max_score, name_prefix
+    )
+    return _attachment(body, columnar.ENCODERS[fmt][1], f"leads.{fmt}")
+
+
 def leads_json_response(
-    db, name_contains: str = None, min_score: float = None, max_score: float = None
+    db,
+    name_contains: str = None,
+    min_score: float = None,
+    max_score: float = None,
+    sort: str = "id",
+    order: str = "asc",
+    cursor: str = None,
+    limit: int = None,
+    name_prefix: str = None,
 ):
-    companies = _filter_companies(db, name_contains, min_score, max_score)
+    companies, next_cursor = _filter_companies_page(
+        db,
+        name_contains,
+        min_score,
+        max_score,
+        sort,
+        order,
+        cursor,
+        limit,
+        name_prefix,
+    )
     data = []
     for c in companies:
         data.append(
@@ -67,39 +287,29 @@ def leads_json_response(
                 "description": getattr(c, "description", None),
             }
         )
-    return JSONResponse({"leads": data})
+    return JSONResponse({"leads": data, "next_cursor": next_cursor})
 
 
-def get_companies_csv_buffer(db):
-    companies = crud.get_companies(db)
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(["id", "name", "email", "website", "lead_score"])
-    for c in companies:
-        writer.writerow(
-            [
-                getattr(c, "id", ""),
-                getattr(c, "name", ""),
-                getattr(c, "email", ""),
-                getattr(c, "website", ""),
-                getattr(c, "lead_score", ""),
-            ]
-        )
-    si.seek(0)
-    return si
+def companies_csv_response(db):
+    return _attachment(iter_companies_csv(db), "text/csv", "companies.csv")
 
 
-def companies_csv_response(db):
-    buf = get_companies_csv_buffer(db)
-    return StreamingResponse(
-        buf,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=companies.csv"},
-    )
+def companies_ndjson_response(db):
+    body = iter_ndjson(COMPANY_COLUMNS, map(_company_values, iter_companies(db)))
+    return _attachment(body, "application/x-ndjson", "companies.ndjson")
+
 
+def companies_columnar_response(db, fmt: str):
+    body = iter_companies_columnar(db, fmt)
+    return _attachment(body, columnar.ENCODERS[fmt][1], f"companies.{fmt}")
 
-def companies_json_response(db):
-    companies = crud.get_companies(db)
+
+def companies_json_response(
+    db, sort: str = "id", order: str = "asc", cursor: str = None, limit: int = None
+):
+    companies, next_cursor = crud.get_companies_page(
+        db, sort=sort, order=order, cursor=cursor, limit=limit
+    )
     data = []
     for c in companies:
         data.append(
@@ -111,4 +321,4 @@ def companies_json_response(db):
                 "lead_score": getattr(c, "lead_score", None),
             }
         )
-    return JSONResponse({"companies": data})
+    return JSONResponse({"companies": data, "next_cursor": next_cursor})
@@ -0,0 +1,518 @@
+"""Materialized lead scores.
+
+The score, recommended action and enrichment of each company are stored on
+its row, so reads are lookups. Writes that change a scoring input (`name`,
+`lead_score`) clear `scored_at` through the model validators (bulk paths
+clear it explicitly) and `rescore_pending` recomputes just those rows.
+`score_input_hash` records the inputs (and model version) the stored values
+came from: a row whose inputs were rewritten with the same values only gets
+`scored_at` back. When the active model changes (see
+`ai_processor.ModelRegistry`) rows scored by another version are marked
+stale and rescored by the next passes.
+
+Enrichment shares the upstream quota with the request paths. The rescorers
+wait for it (BBH_RESCORE_ENRICH_WAIT), and a row whose enrichment still got
+no quota or failed keeps `scored_at` NULL so a later pass retries it.
+
+The recent-activity bonus depends on the clock as well as the inputs, so
+`expire_recent_activity` re-queues rows whose last activity has aged out of
+the window since they were scored.
+
+`rescore_all` rescores the whole book (e.g. after a rules change) on a
+process pool, checkpointing into `rescore_jobs` so an interrupted run
+resumes where it stopped.
+
+Configuration (environment):
+  BBH_RESCORE_INTERVAL        seconds between background passes, 0 disables (2)
+  BBH_RESCORE_BATCH_SIZE      rows scored per transaction (500)
+  BBH_FULL_RESCORE_CHUNK      rows per worker task in a full rescore (2000)
+  BBH_FULL_RESCORE_WORKERS    worker processes for a full rescore (CPU count)
+  BBH_RESCORE_ENRICH_WAIT     seconds a batch may wait for enrichment quota (30)
+"""
+
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import bindparam, func, select, update
+
+from . import ai_processor, crud, feature_store, integrations, models
+from .db import SessionLocal
+
+RESCORE_INTERVAL = float(os.getenv("BBH_RESCORE_INTERVAL", 2))
+RESCORE_BATCH_SIZE = int(os.getenv("BBH_RESCORE_BATCH_SIZE", 500))
+FULL_RESCORE_CHUNK = int(os.getenv("BBH_FULL_RESCORE_CHUNK", 2000))
+FULL_RESCORE_WORKERS = int(os.getenv("BBH_FULL_RESCORE_WORKERS", 0)) or (
+    os.cpu_count() or 1
+)
+RESCORE_ENRICH_WAIT = float(os.getenv("BBH_RESCORE_ENRICH_WAIT", 30))
+
+SCORE_FIELDS = (
+    "score",
+    "recommended_action",
+    "official_registry_id",
+    "industry",
+    "enriched",
+    "score_model_version",
+)
+
+# database URL -> model version this process last marked stale rows for
+_marked_versions = {}
+# database URL -> activity time up to which aged-out rows have been re-queued
+_recency_swept = {}
+
+
+def score_inputs(company, features=None) -> dict:
+    """What the scorer reads: company fields plus its feature-store row."""
+    return dict(
+        feature_store.as_inputs(features),
+        name=company.name,
+        lead_score=company.lead_score,
+    )
+
+
+def _select_inputs():
+    Company, F = models.Company, models.CompanyFeatures
+    return select(
+        Company.id,
+        Company.name,
+        Company.lead_score,
+        Company.score_input_hash,
+        F.activity_count,
+        F.open_opportunity_count,
+        F.open_value,
+        F.last_activity_at,
+        F.version.label("features_version"),
+    ).outerjoin(F, F.company_id == Company.id)
+
+
+def _row_inputs(row):
+    """``(guard key, scoring inputs)`` of a `_select_inputs` row."""
+    features = row if row.features_version is not None else None
+    key = {
+        "_id": row.id,
+        "_name": row.name,
+        "_lead_score": row.lead_score,
+        "_features_version": row.features_version or 0,
+    }
+    return key, score_inputs(row, features)
+
+
+def input_hash(inputs: dict, model_version: str) -> str:
+    raw = json.dumps(
+        [model_version, inputs],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def compute_scores(inputs: list, scorer=None, enrich=True, enrich_wait=0.0):
+    """Score a batch of `score_inputs` dicts.
+
+    Returns one SCORE_FIELDS dict per input and the scoring info
+    (`model_version`, `latency_ms`). With `enrich`, `info["unenriched"]`
+    lists the inputs whose enrichment should be retried (see
+    `enrich_fields`); without it the enrichment fields are left out.
+    """
+    scored, info = ai_processor.apply_scoring(
+        inputs, deterministic=True, scorer=scorer, enrich=False
+    )
+    fields = [
+        {
+            "score": s["lead_score"],
+            "recommended_action": s["recommended_action"],
+            "score_model_version": info["model_version"],
+        }
+        for s in scored
+    ]
+    if enrich:
+        names = [ai_processor._lead_name(i) for i in inputs]
+        info["unenriched"] = enrich_fields(fields, names, enrich_wait)
+    return fields, info
+
+
+def enrich_fields(fields: list, names: list, wait: float = 0.0) -> list:
+    """Add the enrichment SCORE_FIELDS of `names` to `fields` in place.
+
+    Waits up to `wait` seconds for upstream quota (see
+    `integrations.enrich_many`). Returns the indexes whose lookup got no
+    quota or failed.
+    """
+    records = integrations.enrich_many(names, wait=wait)
+    retry = []
+    for i, (f, name) in enumerate(zip(fields, names)):
+        record = records.get(name, {})
+        if integrations.is_transient(record):
+            retry.append(i)
+        f.update(
+            official_registry_id=record.get("official_registry_id"),
+            industry=record.get("industry"),
+            enriched=1 if record.get("enriched") else 0,
+        )
+    return retry
+
+
+def pending_ids(companies) -> list:
+    """Ids of loaded companies without current stored scores."""
+    return [c.id for c in companies if c.scored_at is None]
+
+
+def company_views(companies, features=None):
+    """API representation of loaded companies, read from the stored scores.
+
+    Rows the rescorer has not reached yet are scored on the fly (without
+    writing), so a read right after a write is already consistent;
+    `features` maps their ids to feature-store rows (see `pending_ids`).
+    Returns ``(views, info)``; `info` reports the active model and the time
+    spent scoring on the fly.
+    """
+    features = features or {}
+    pending = [c for c in companies if c.scored_at is None]
+    scores, info = compute_scores(
+        [score_inputs(c, features.get(c.id)) for c in pending]
+    )
+    fresh = dict(zip((c.id for c in pending), scores))
+    views = []
+    for c in companies:
+        scores = fresh.get(c.id) or {f: getattr(c, f) for f in SCORE_FIELDS}
+        views.append(
+            {
+                "id": c.id,
+                "name": c.name,
+                "description": c.description,
+                "lead_score": scores["score"],
+                "recommended_action": scores["recommended_action"],
+                "official_registry_id": scores["official_registry_id"],
+                "industry": scores["industry"],
+                "enriched": bool(scores["enriched"]),
+                "model_version": scores["score_model_version"],
+            }
+        )
+    return views, info
+
+
+def _guarded_update(table, pending_only: bool = True):
+    # only applies if the inputs are still the ones that were scored
+    F = models.CompanyFeatures
+    features_version = (
+        select(F.version).where(F.company_id == table.c.id).scalar_subquery()
+    )
+    stmt = update(table).where(
+        table.c.id == bindparam("_id"),
+        table.c.name.is_not_distinct_from(bindparam("_name")),
+        table.c.lead_score.is_not_distinct_from(bindparam("_lead_score")),
+        func.coalesce(features_version, 0) == bindparam("_features_version"),
+    )
+    if pending_only:
+        stmt = stmt.where(table.c.scored_at.is_(None))
+    return stmt
+
+
+def rescore_pending(
+    db, batch_size: int = RESCORE_BATCH_SIZE, enrich_wait: float = RESCORE_ENRICH_WAIT
+) -> int:
+    """Rescore every company whose inputs changed since it was last scored.
+
+    Works in id order, one transaction per batch. A row written again while
+    its batch was being scored, or whose enrichment got no quota within
+    `enrich_wait` seconds, keeps `scored_at` NULL and is picked up by the
+    next pass. Returns the number of rows whose scores were rewritten.
+    """
+    Company = models.Company
+    table = Company.__table__
+    scorer = ai_processor.current_scorer()
+    mark_stale_for_model(db, scorer.version)
+    expire_recent_activity(db)
+    guarded = _guarded_update(table)
+    rescored = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            _select_inputs()
+            .where(Company.scored_at.is_(None), Company.id > last_id)
+            .order_by(Company.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        now = datetime.datetime.utcnow()
+        changed, unchanged = [], []
+        for row in rows:
+            key, inputs = _row_inputs(row)
+            digest = input_hash(inputs, scorer.version)
+            if digest == row.score_input_hash:
+                unchanged.append(dict(key, scored_at=now))
+            else:
+                changed.append((key, inputs, digest))
+        if changed:
+            scores, info = compute_scores(
+                [inputs for _, inputs, _ in changed], scorer, enrich_wait=enrich_wait
+            )
+            retry = set(info["unenriched"])
+            params = [
+                dict(key, score_input_hash=digest, scored_at=now, **fields)
+                for i, ((key, _, digest), fields) in enumerate(zip(changed, scores))
+                if i not in retry
+            ]
+            if params:
+                rescored += db.execute(guarded, params).rowcount
+        if unchanged:
+            db.execute(guarded, unchanged)
+        db.commit()
+    if rescored:
+        crud.bump_data_version()
+    return rescored
+
+
+def mark_stale_for_model(db, model_version: str) -> int:
+    """Queue rows scored by another model version for rescoring.
+
+    Runs once per process, database and model version; returns the rows
+    marked.
+    """
+    url = str(db.get_bind().url)
+    if _marked_versions.get(url) == model_version:
+        return 0
+    table = models.Company.__table__
+    marked = db.execute(
+        update(table)
+        .where(
+            table.c.scored_at.is_not(None),
+            table.c.score_model_version.is_distinct_from(model_version),
+        )
+        .values(scored_at=None)
+    ).rowcount
+    db.commit()
+    _marked_versions[url] = model_version
+    return marked
+
+
+def expire_recent_activity(db, now=None) -> int:
+    """Queue rows scored while their last activity was still recent.
+
+    Each call covers the activity times that left the
+    ai_processor.RECENT_ACTIVITY_DAYS window since the previous call in
+    this process (all of them on the first). The input hash is cleared too,
+    since the inputs themselves did not change. Returns the rows marked.
+    """
+    window = datetime.timedelta(days=ai_processor.RECENT_ACTIVITY_DAYS)
+    edge = (now or datetime.datetime.utcnow()) - window
+    url = str(db.get_bind().url)
+    since = _recency_swept.get(url)
+    if since is not None and since >= edge:
+        return 0
+    Company, F = models.Company, models.CompanyFeatures
+    stmt = (
+        select(Company.id, Company.scored_at, F.last_activity_at)
+        .join(F, F.company_id == Company.id)
+        .where(Company.scored_at.is_not(None), F.last_activity_at <= edge)
+    )
+    if since is not None:
+        stmt = stmt.where(F.last_activity_at > since)
+    ids = [r.id for r in db.execute(stmt) if r.scored_at <= r.last_activity_at + window]
+    table = Company.__table__
+    for start in range(0, len(ids), 500):
+        db.execute(
+            update(table)
+            .where(table.c.id.in_(ids[start : start + 500]))
+            .values(scored_at=None, score_input_hash=None)
+        )
+    db.commit()
+    _recency_swept[url] = edge
+    return len(ids)
+
+
+def rescore_pending_once() -> int:
+    """One background pass on a fresh session."""
+    db = SessionLocal()
+    try:
+        return rescore_pending(db)
+    finally:
+        db.close()
+
+
+def _score_chunk(scorer, rows):
+    """Worker task: UPDATE parameters for one chunk of `_row_inputs` pairs,
+    without the enrichment (the caller adds it under its own rate limit)."""
+    fields, _info = compute_scores([inputs for _, inputs in rows], scorer, enrich=False)
+    return [
+        dict(key, score_input_hash=input_hash(inputs, scorer.version), **f)
+        for (key, inputs), f in zip(rows, fields)
+    ]
+
+
+def _iter_chunks(db, after_id: int, chunk_size: int):
+    Company = models.Company
+    while True:
+        rows = db.execute(
+            _select_inputs()
+            .where(Company.id > after_id)
+            .order_by(Company.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        after_id = rows[-1].id
+        yield [_row_inputs(r) for r in rows]
+
+
+def _ordered_results(pool, scorer, chunks, max_inflight: int):
+    # bounded read-ahead; results come back in submission (id) order so the
+    # checkpoint only ever moves forward over fully written chunks
+    pending = deque()
+    for rows in chunks:
+        pending.append(pool.submit(_score_chunk, scorer, rows))
+        if len(pending) >= max_inflight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _pool(workers: int):
+    # not fork: the pool is started from a thread of a multi-threaded app,
+    # and a forked child can inherit a lock held by another thread. The
+    # forkserver is a fresh, single-threaded interpreter that imports the app
+    # (and runs its startup DDL) once; workers are forked from it already
+    # loaded. Where there is no forkserver, workers are spawned.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def latest_job(db):
+    return db.scalars(
+        select(models.RescoreJob).order_by(models.RescoreJob.id.desc()).limit(1)
+    ).first()
+
+
+def job_status(job) -> dict:
+    if job is None:
+        return None
+    return {
+        "id": job.id,
+        "status": job.status,
+        "model_version": job.model_version,
+        "processed": job.processed,
+        "total": job.total,
+        "last_id": job.last_id,
+        "error": job.error,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def rescore_all(
+    db,
+    workers: int = None,
+    chunk_size: int = FULL_RESCORE_CHUNK,
+    resume: bool = True,
+    progress=None,
+    enrich_wait: float = RESCORE_ENRICH_WAIT,
+):
+    """Rescore every company with the current model on a process pool.
+
+    Company ids are streamed in chunks from the main process, chunks are
+    scored by `workers` processes (inline when workers <= 1), enriched by
+    the main process, so all of them share its upstream quota, and written
+    back with one executemany UPDATE per chunk, committed together with the
+    job checkpoint. Rows whose enrichment got no quota within `enrich_wait`
+    seconds are written with `scored_at` NULL, for `rescore_pending` to
+    retry. With `resume`, an unfinished job for the same model continues
+    after its checkpoint. `progress(job)` is called after each chunk.
+    Returns the finished RescoreJob.
+    """
+    workers = FULL_RESCORE_WORKERS if workers is None else workers
+    scorer = ai_processor.current_scorer()
+    Job = models.RescoreJob
+    job = None
+    if resume:
+        job = db.scalars(
+            select(Job)
+            .where(Job.status != "done", Job.model_version == scorer.version)
+            .order_by(Job.id.desc())
+            .limit(1)
+        ).first()
+    if job is None:
+        total = db.scalar(select(func.count(models.Company.id)))
+        job = Job(model_version=scorer.version, total=total, last_id=0, processed=0)
+        db.add(job)
+    job.status = "running"
+    job.error = ""
+    db.commit()
+
+    stmt = _guarded_update(models.Company.__table__, pending_only=False)
+    chunks = _iter_chunks(db, job.last_id or 0, chunk_size)
+    pool = _pool(workers) if workers > 1 else None
+    try:
+        if pool is None:
+            results = (_score_chunk(scorer, rows) for rows in chunks)
+        else:
+            results = _ordered_results(pool, scorer, chunks, workers * 2)
+        for params in results:
+            names = [p["_name"] for p in params]
+            retry = set(enrich_fields(params, names, enrich_wait))
+            now = datetime.datetime.utcnow()
+            for i, p in enumerate(params):
+                if i in retry:
+                    p.update(scored_at=None, score_input_hash=None)
+                else:
+                    p["scored_at"] = now
+            db.execute(stmt, params)
+            job.last_id = params[-1]["_id"]
+            job.processed += len(params)
+            job.updated_at = now
+            db.commit()
+            crud.bump_data_version()
+            if progress is not None:
+                progress(job)
+        job.status = "done"
+        job.finished_at = datetime.datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        job.status = "failed"
+        job.error = str(e)
+        db.commit()
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return job
+
+
+_full_rescore_lock = threading.Lock()
+
+
+def start_full_rescore(**kwargs) -> bool:
+    """Run `rescore_all` in a background thread; False if one is running."""
+    if not _full_rescore_lock.acquire(blocking=False):
+        return False
+
+    def run():
+        db = SessionLocal()
+        try:
+            rescore_all(db, **kwargs)
+        except Exception:
+            pass  # recorded on the job row
+        finally:
+            db.close()
+            _full_rescore_lock.release()
+
+    threading.Thread(target=run, name="full-rescore", daemon=True).start()
+    return True
+
+
+def full_rescore_running() -> bool:
+    return _full_rescore_lock.locked()
@@ -0,0 +1,143 @@
+"""Full-text company search.
+
+On SQLite the search runs against ``companies_fts``, an FTS5 index over
+``companies.name`` and ``companies.description`` stored as an external
+content table (no second copy of the text). Triggers keep it in sync with
+inserts, deletes and updates of those two columns, so writes through the ORM,
+bulk paths or raw SQL are all covered. The ``unicode61 remove_diacritics 2``
+tokenizer folds case and accents, so "cistirna" finds "Čistírna".
+
+Other databases fall back to an unindexed substring match.
+"""
+
+import re
+
+from sqlalchemy import event, or_, select, text
+
+from . import models, pagination
+
+FTS_TABLE = "companies_fts"
+# bm25 column weights: a hit in the name outranks one in the description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, content='companies', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON companies BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON companies BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    # only text changes touch the index; score updates stay cheap
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au "
+    "AFTER UPDATE OF name, description ON companies BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+)
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_fts(conn) -> bool:
+    """Create the FTS index and triggers on a SQLite connection if missing.
+
+    A newly created index is rebuilt from the existing rows. Returns True
+    when the index is available.
+    """
+    if conn.dialect.name != "sqlite":
+        return False
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+        {"n": FTS_TABLE},
+    ).first()
+    for statement in FTS_DDL:
+        conn.execute(text(statement))
+    if not exists:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+@event.listens_for(models.Base.metadata, "after_create")
+def _create_fts(target, connection, **kw):
+    ensure_fts(connection)
+
+
+def fts_query(q: str) -> str:
+    """Turn free text into an FTS5 query: every word, as a prefix, must match.
+
+    Words are quoted so user input can never be read as FTS5 syntax.
+    """
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(q or ""))
+
+
+def _hit(row, rank=None):
+    return {
+        "id": row.id,
+        "name": row.name,
+        "description": row.description,
+        "lead_score": row.lead_score,
+        "rank": rank,
+    }
+
+
+def search_companies(db, q: str, cursor: str = None, limit: int = None):
+    """Ranked page of companies matching `q` plus its `next_cursor`.
+
+    Hits are ordered by bm25 (best first, ties by id). The cursor carries the
+    last hit's ``(rank, id)`` and is only valid for the same query.
+    """
+    match = fts_query(q)
+    if not match:
+        raise ValueError("empty search query")
+    sort = f"search:{match}"
+    if db.get_bind().dialect.name != "sqlite":
+        return _search_fallback(db, q, sort, cursor, limit)
+
+    n = pagination.clamp_limit(limit)
+    rank = f"bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT})"
+    params = {"match": match, "n": n + 1}
+    after = ""
+    if cursor:
+        params["rank"], params["last_id"] = pagination.decode_cursor(cursor, sort)
+        after = (
+            f"AND ({rank} > :rank OR ({rank} = :rank AND {FTS_TABLE}.rowid > :last_id))"
+        )
+    rows = db.execute(
+        text(
+            f"SELECT c.id, c.name, c.description, c.lead_score, {rank} AS score "
+            f"FROM {FTS_TABLE} JOIN companies AS c ON c.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :match {after} "
+            "ORDER BY score, c.id LIMIT :n"
+        ),
+        params,
+    ).all()
+    page, next_cursor = pagination.finish_page(
+        rows, lambda r: (r.score, r.id), sort, limit
+    )
+    return [_hit(r, r.score) for r in page], next_cursor
+
+
+def _search_fallback(db, q, sort, cursor, limit):
+    Company = models.Company
+    stmt = select(Company)
+    for token in _TOKEN.findall(q):
+        key = models.normalize_name(token)
+        stmt = stmt.filter(
+            or_(
+                Company.name_key.contains(key, autoescape=True),
+                Company.description.ilike(f"%{token}%"),
+            )
+        )
+    stmt = pagination.apply_keyset(
+        stmt, Company.id, Company.id, sort, cursor=cursor, limit=limit
+    )
+    rows = db.scalars(stmt).all()
+    page, next_cursor = pagination.finish_page(
+        rows, lambda c: (c.id, c.id), sort, limit
+    )
+    return [_hit(c) for c in page], next_cursor
@@ -0,0 +1,851 @@
+"""Webhook queue delivery.
+
+Due `WebhookQueue` rows are delivered concurrently by a `Dispatcher`: one
+shared `httpx.AsyncClient` (keep-alive connection pool) with a global limit
+on requests in flight and a smaller per-host one, so a slow receiver only
+ties up its own slots instead of the whole queue. A failed delivery is
+rescheduled through `next_attempt_at` with full-jitter exponential backoff
+(a random delay up to ``2**attempts`` seconds, so retries after an outage
+spread out), or after the receiver's ``Retry-After`` on a 429/503; nothing
+sleeps inside the worker. Each host also has a `CircuitBreaker`: after
+BBH_WEBHOOK_BREAKER_FAILURES consecutive failures (or a 429) the host's
+rows are rescheduled without a request until the cooldown has passed, then
+a single probe decides whether it closes again. Skipped rows don't count as
+attempts. Finished rows (delivered, or dead after `max_attempts`) leave the
+queue for the append-only `webhook_history`, which is pruned after
+BBH_WEBHOOK_HISTORY_DAYS, so the hot table only holds pending work.
+
+Several workers (uvicorn processes, hosts) can drain one queue: each pass
+claims a bounded batch of due rows by stamping them with its `claimed_by`
+token and a `lease_until` deadline, in one statement (SQLite serializes it;
+on PostgreSQL the candidate rows are picked with ``FOR UPDATE SKIP
+LOCKED``, so concurrent workers never wait on each other). Claimed rows are
+invisible to other workers until the lease runs out, which is how rows of a
+crashed worker are picked up again; a live worker renews the lease while it
+is still delivering, however long the pass takes. Results are written only
+for rows the pass still owns.
+
+A destination (receiver URL) can opt into batching and compression with a
+`WebhookDestination` row: its due payloads are then sent as one POST of up
+to `batch_size` items, a JSON array of ``{"id": <queue id>, "payload": ...}``
+with an ``X-Webhook-Batch`` count header, and request bodies of at least
+`gzip_min_bytes` go out gzip-encoded (``Content-Encoding: gzip``). A
+non-2xx response fails every item of the batch; a 2xx response may reject
+single items with ``{"failed": [<id> | {"id": <id>, "error": "..."}]}``,
+and only those are retried.
+
+`process_queue_once` is the async entry point used by the app's background
+worker (which keeps one Dispatcher for its lifetime); `run_once` wraps it
+for synchronous callers. The worker does not poll on a fixed interval:
+`enqueue_webhook` and admin requeues `wakeup.notify()` it, and when idle it
+sleeps until the earliest row becomes claimable (`idle_seconds`), or at most
+BBH_WEBHOOK_POLL seconds, which picks up rows written by other processes.
+"""
+
+import asyncio
+import datetime
+import email.utils
+import gzip
+import os
+import random
+import socket
+import time
+import uuid
+from collections import namedtuple
+from typing import List, Optional, Union
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import (
+    DateTime,
+    bindparam,
+    case,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.orm import aliased, sessionmaker
+
+from . import models, pagination
+from .db import SessionLocal
+
+# requests in flight per process, and per receiver host
+CONCURRENCY = int(os.getenv("BBH_WEBHOOK_CONCURRENCY", 32))
+PER_HOST = int(os.getenv("BBH_WEBHOOK_PER_HOST", 4))
+TIMEOUT = float(os.getenv("BBH_WEBHOOK_TIMEOUT", 5))
+MAX_ATTEMPTS = 5
+BACKOFF_MAX = float(os.getenv("BBH_WEBHOOK_BACKOFF_MAX", 3600))
+# consecutive failures that open a host's circuit, and for how long
+BREAKER_FAILURES = int(os.getenv("BBH_WEBHOOK_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.getenv("BBH_WEBHOOK_BREAKER_COOLDOWN", 30))
+# upper bound for a receiver's Retry-After
+RETRY_AFTER_MAX = 24 * 3600
+# rows claimed per pass, and how long a claim is exclusive
+BATCH_SIZE = int(os.getenv("BBH_WEBHOOK_BATCH", 100))
+LEASE_SECONDS = float(os.getenv("BBH_WEBHOOK_LEASE", 60))
+# webhook_history retention, and how often the worker prunes it
+HISTORY_RETENTION_DAYS = float(os.getenv("BBH_WEBHOOK_HISTORY_DAYS", 30))
+PRUNE_INTERVAL = 3600
+# longest idle sleep of the worker (rows enqueued by other processes)
+POLL_SECONDS = float(os.getenv("BBH_WEBHOOK_POLL", 30))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+Delivery = namedtuple("Delivery", "id url payload attempts")
+# a failed delivery whose retry time isn't plain backoff: `retry_after`
+# seconds (None = backoff), `attempted` False if no request was made
+Failure = namedtuple("Failure", "error retry_after attempted")
+_jitter = random.uniform
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures; open ->
+    half-open once `cooldown` has passed, letting one probe request through;
+    the probe closes the circuit or opens it again."""
+
+    def __init__(
+        self,
+        threshold: int = BREAKER_FAILURES,
+        cooldown: float = BREAKER_COOLDOWN,
+        clock=time.monotonic,
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.open_until = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if self.clock() < self.open_until:
+                return False
+            self.state, self._probing = "half-open", False
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def retry_in(self) -> float:
+        """Seconds until a skipped request is worth retrying."""
+        return max(1.0, self.open_until - self.clock())
+
+    def success(self):
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.threshold:
+            self.trip(self.cooldown)
+
+    def trip(self, seconds: float):
+        self.state, self._probing = "open", False
+        self.open_until = max(self.open_until, self.clock() + seconds)
+
+    def abandon(self):
+        """A request ended without an outcome (e.g. it was cancelled); if it
+        was the half-open probe, the next request probes instead."""
+        self._probing = False
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """The response's ``Retry-After`` (seconds or HTTP date), if any."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone.utc)
+        seconds = (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+
+
+# per receiver URL settings (models.WebhookDestination)
+Destination = namedtuple("Destination", "batch_size gzip_min_bytes")
+UNBATCHED = Destination(1, None)
+
+
+def load_destinations(db, urls) -> dict:
+    """url -> Destination for the URLs that have settings."""
+    D = models.WebhookDestination
+    rows = db.query(D).filter(D.url.in_(set(urls))).all()
+    return {
+        r.url: Destination(max(1, r.batch_size or 1), r.gzip_min_bytes) for r in rows
+    }
+
+
+def batch_body(deliveries) -> bytes:
+    """``[{"id": ..., "payload": ...}, ...]`` built from the stored JSON text,
+    without re-parsing it."""
+    items = ",".join(f'{{"id":{d.id},"payload":{d.payload}}}' for d in deliveries)
+    return f"[{items}]".encode("utf-8")
+
+
+def rejected_items(response) -> dict:
+    """id -> error for the items a receiver rejected in a batch response:
+    ``{"failed": [id, ...]}`` or ``{"failed": [{"id": id, "error": "..."}]}``.
+    """
+    try:
+        failed = response.json().get("failed") or []
+        rejected = {}
+        for item in failed:
+            if isinstance(item, dict):
+                rejected[int(item["id"])] = str(item.get("error") or "rejected")
+            else:
+                rejected[int(item)] = "rejected"
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return {}
+    return {wid: f"rejected: {error}" for wid, error in rejected.items()}
+
+
+def _error_text(e: BaseException) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        concurrency: int = CONCURRENCY,
+        per_host: int = PER_HOST,
+        timeout: float = TIMEOUT,
+        breaker_failures: int = BREAKER_FAILURES,
+        breaker_cooldown: float = BREAKER_COOLDOWN,
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self._http = None
+        self._slots = None
+        self._host_slots = {}
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._breakers = {}
+        self.delivered = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+
+    def _client(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+            )
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._http
+
+    def _host(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(self.per_host)
+        return slots
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(
+                self.breaker_failures, self.breaker_cooldown
+            )
+        return breaker
+
+    async def _post(self, url: str, body: bytes, headers: dict, gzip_min_bytes=None):
+        """POST `body`; returns ``(error, response)``, error None on 2xx.
+
+        Any exception, including one for a malformed URL, is returned as the
+        error, so it counts as an attempt like any other failure.
+        """
+        client = self._client()
+        headers = {"Content-Type": "application/json", **headers}
+        if gzip_min_bytes is not None and len(body) >= gzip_min_bytes:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        try:
+            breaker, host_slots = self.breaker(url), self._host(url)
+        except Exception as e:
+            return _error_text(e), None
+        async with host_slots:
+            # checked once a host slot is free: requests queued behind a
+            # failing host are skipped as soon as its circuit opens
+            if not breaker.allow():
+                return Failure("circuit open", breaker.retry_in(), False), None
+            async with self._slots:
+                try:
+                    r = await client.post(url, content=body, headers=headers)
+                except Exception as e:
+                    breaker.failure()
+                    return _error_text(e), None
+                except BaseException:
+                    breaker.abandon()
+                    raise
+        if r.status_code == 429 or r.status_code >= 500:
+            error = f"HTTP {r.status_code}"
+            retry_after = retry_after_seconds(r)
+            if r.status_code == 429:
+                # the host is up but wants every request to wait
+                breaker.trip(breaker.cooldown if retry_after is None else retry_after)
+            else:
+                breaker.failure()
+            if retry_after is not None:
+                return Failure(error, retry_after, True), r
+            return error, r
+        breaker.success()
+        if 200 <= r.status_code < 300:
+            return None, r
+        return f"HTTP {r.status_code}", r
+
+    def _count(self, errors):
+        for error in errors:
+            if error is None:
+                self.delivered += 1
+            elif isinstance(error, Failure) and not error.attempted:
+                self.skipped += 1
+            else:
+                self.failed += 1
+
+    async def deliver(
+        self, delivery: Delivery, destination: Destination = UNBATCHED
+    ) -> Union[None, str, Failure]:
+        """POST one payload; returns None on success, else the error (a
+        string, or a `Failure` carrying its retry time)."""
+        error, _ = await self._post(
+            delivery.url,
+            delivery.payload.encode("utf-8"),
+            {},
+            destination.gzip_min_bytes,
+        )
+        self._count([error])
+        return error
+
+    async def deliver_batch(
+        self, url: str, deliveries: List[Delivery], destination: Destination
+    ) -> List[Union[None, str, Failure]]:
+        """POST several payloads for `url` as one JSON array; the receiver
+        may reject single items (see `rejected_items`)."""
+        error, response = await self._post(
+            url,
+            batch_body(deliveries),
+            {"X-Webhook-Batch": str(len(deliveries))},
+            destination.gzip_min_bytes,
+        )
+        if error is None:
+            rejected = rejected_items(response)
+            errors = [rejected.get(d.id) for d in deliveries]
+        else:
+            errors = [error] * len(deliveries)
+        self.batches += 1
+        self._count(errors)
+        return errors
+
+    async def deliver_all(
+        self, deliveries: List[Delivery], destinations: dict = None
+    ) -> List[Union[None, str, Failure]]:
+        """Deliver concurrently; payloads for a destination with batching
+        enabled are grouped into batches of up to its batch_size. Returns
+        one error (or None) per delivery, in order."""
+        destinations = destinations or {}
+        by_url = {}
+        for d in deliveries:
+            by_url.setdefault(d.url, []).append(d)
+        groups, sends = [], []
+        for url, items in by_url.items():
+            destination = destinations.get(url, UNBATCHED)
+            if destination.batch_size > 1:
+                for i in range(0, len(items), destination.batch_size):
+                    chunk = items[i : i + destination.batch_size]
+                    groups.append(chunk)
+                    sends.append(self.deliver_batch(url, chunk, destination))
+            else:
+                for d in items:
+                    groups.append([d])
+                    sends.append(self._deliver_one(d, destination))
+        errors = {}
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for group, group_errors in zip(groups, results):
+            if isinstance(group_errors, BaseException):
+                # never lose a group's outcome: its rows would stay leased
+                group_errors = [_error_text(group_errors)] * len(group)
+            errors.update((d.id, error) for d, error in zip(group, group_errors))
+        return [errors[d.id] for d in deliveries]
+
+    async def _deliver_one(self, delivery, destination):
+        return [await self.deliver(delivery, destination)]
+
+    def stats(self) -> dict:
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "hosts": len(self._host_slots),
+            "open_circuits": sorted(
+                host for host, b in self._breakers.items() if b.state != "closed"
+            ),
+        }
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class Wakeup:
+    """Wakes the worker's event loop from any thread."""
+
+    def __init__(self):
+        self._loop = None
+        self._event = None
+
+    def bind(self):
+        """Attach to the running loop (called by the worker)."""
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def notify(self):
+        loop, event = self._loop, self._event
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            event.set()
+        else:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, timeout: float) -> bool:
+        """Sleep up to `timeout` seconds; True if woken by `notify`."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+wakeup = Wakeup()
+
+
+def _claimable(W, now):
+    return (
+        W.next_attempt_at <= now,
+        or_(W.lease_until.is_(None), W.lease_until <= now),
+    )
+
+
+def _candidates(now, limit: int, dialect: str):
+    W = models.WebhookQueue
+    stmt = (
+        select(W.id)
+        .where(*_claimable(W, now))
+        .order_by(W.next_attempt_at, W.id)
+        .limit(limit)
+    )
+    if dialect == "postgresql":
+        # rows another worker is claiming right now are skipped, not waited on
+        stmt = stmt.with_for_update(skip_locked=True)
+    return stmt
+
+
+def claim_due(db, limit: int = BATCH_SIZE, lease: float = LEASE_SECONDS, now=None):
+    """Claim up to `limit` due rows for this pass.
+
+    Returns ``(claim, deliveries)``; `claim` is the token stamped into
+    `claimed_by` and must be passed to `record_results`.
+    """
+    W = models.WebhookQueue
+    now = now or datetime.datetime.utcnow()
+    claim = f"{WORKER_ID}:{uuid.uuid4().hex[:12]}"
+    dialect = db.get_bind().dialect.name
+    candidates = _candidates(now, limit, dialect)
+    if dialect == "postgresql":
+        ids = db.scalars(candidates).all()
+        target = W.id.in_(ids)
+    else:
+        ids = None
+        target = W.id.in_(candidates.scalar_subquery())
+    if ids == []:
+        db.commit()
+        return claim, []
+    db.execute(
+        update(W)
+        # re-checked, so a row claimed meanwhile by another worker is skipped
+        .where(target, *_claimable(W, now))
+        .values(claimed_by=claim, lease_until=now + datetime.timedelta(seconds=lease))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    rows = db.execute(
+        select(W.id, W.url, W.payload, W.attempts)
+        .where(W.claimed_by == claim)
+        .order_by(W.next_attempt_at, W.id)
+    ).all()
+    return claim, [Delivery(r.id, r.url, r.payload, r.attempts or 0) for r in rows]
+
+
+def renew_lease(db, claim: str, lease: float = LEASE_SECONDS) -> int:
+    """Push the lease of the rows `claim` still owns `lease` seconds out."""
+    W = models.WebhookQueue
+    until = datetime.datetime.utcnow() + datetime.timedelta(seconds=lease)
+    renewed = db.execute(
+        update(W)
+        .where(W.claimed_by == claim)
+        .values(lease_until=until)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return renewed
+
+
+def next_due(db):
+    """When the next queued row becomes claimable (None if the queue is empty)."""
+    W = models.WebhookQueue
+    ready_at = case(
+        (W.lease_until > W.next_attempt_at, W.lease_until), else_=W.next_attempt_at
+    )
+    return db.scalar(select(func.min(ready_at)))
+
+
+def idle_seconds(session_factory=SessionLocal, now=None) -> float:
+    """How long the worker may sleep before the next row is due."""
+    db = session_factory()
+    try:
+        due = next_due(db)
+    finally:
+        db.close()
+    if due is None:
+        return POLL_SECONDS
+    now = now or datetime.datetime.utcnow()
+    # never 0: a row that is due but not claimable must not spin the loop
+    return min(POLL_SECONDS, max(0.01, (due - now).total_seconds()))
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Full jitter: uniform in [0, min(BACKOFF_MAX, 2**attempts)]."""
+    return _jitter(0, min(BACKOFF_MAX, 2.0**attempts))
+
+
+def _archive(db, claim: str, ids, status: str, now, attempted: int = 0) -> int:
+    """Move claimed rows into webhook_history; returns the number moved."""
+    if not ids:
+        return 0
+    W, H = models.WebhookQueue, models.WebhookHistory
+    owned = (W.id.in_(ids), W.claimed_by == claim)
+    db.execute(
+        insert(H).from_select(
+            [
+                H.webhook_id,
+                H.url,
+                H.payload,
+                H.status,
+                H.attempts,
+                H.last_error,
+                H.created_at,
+                H.finished_at,
+            ],
+            select(
+                W.id,
+                W.url,
+                W.payload,
+                literal(status),
+                func.coalesce(W.attempts, 0) + attempted,
+                W.last_error,
+                W.created_at,
+                literal(now, DateTime),
+            ).where(*owned),
+        )
+    )
+    return db.execute(
+        delete(W).where(*owned).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def record_results(
+    db, claim: str, deliveries, errors, max_attempts: int = MAX_ATTEMPTS
+) -> int:
+    """Archive delivered rows and reschedule (or dead-letter) failed ones in
+    one transaction, releasing the claim. `errors` holds None, an error
+    string or a `Failure` per delivery. Rows whose lease was lost to
+    another worker are left alone. Returns the number delivered."""
+    W = models.WebhookQueue
+    now = datetime.datetime.utcnow()
+    done = [d.id for d, error in zip(deliveries, errors) if error is None]
+    delivered = _archive(db, claim, done, "delivered", now, attempted=1)
+    failed, dead = [], []
+    for d, error in zip(deliveries, errors):
+        if error is None:
+            continue
+        if not isinstance(error, Failure):
+            error = Failure(error, None, True)
+        attempts = d.attempts + error.attempted
+        values = {"_id": d.id, "attempts": attempts, "last_error": error.error}
+        if error.attempted and attempts >= max_attempts:
+            # dead-letter: archived below, kept for admin review and requeue
+            values.update(last_error=f"{error.error};max_attempts", next=None)
+            dead.append(d.id)
+        else:
+            delay = error.retry_after
+            if delay is None:
+                delay = backoff_seconds(attempts)
+            values["next"] = now + datetime.timedelta(seconds=delay)
+        failed.append(values)
+    if failed:
+        table = W.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("_id"), table.c.claimed_by == claim)
+            .values(
+                attempts=bindparam("attempts"),
+                last_error=bindparam("last_error"),
+                next_attempt_at=bindparam("next"),
+                # dead rows keep the claim until they are archived
+                claimed_by=case((bindparam("next").is_(None), claim), else_=None),
+                lease_until=None,
+            ),
+            failed,
+        )
+        _archive(db, claim, dead, "dead", now)
+    db.commit()
+    return delivered
+
+
+def prune_history(db, retention_days: float = None, chunk: int = 5000) -> int:
+    """Delete history older than the retention period, `chunk` rows per
+    transaction. Returns the number deleted."""
+    H = models.WebhookHistory
+    days = HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    removed = 0
+    while True:
+        ids = select(H.id).where(H.finished_at < cutoff).limit(chunk)
+        n = db.execute(
+            delete(H)
+            .where(H.id.in_(ids.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        removed += n
+        if n < chunk:
+            return removed
+
+
+_last_prune = [0.0]
+
+
+def maybe_prune_history(session_factory=SessionLocal) -> int:
+    """`prune_history` at most once per PRUNE_INTERVAL (for the worker loop)."""
+    now = time.monotonic()
+    if _last_prune[0] and now - _last_prune[0] < PRUNE_INTERVAL:
+        return 0
+    _last_prune[0] = now
+    db = session_factory()
+    try:
+        return prune_history(db)
+    finally:
+        db.close()
+
+
+def _claim(session_factory, limit, lease):
+    db = session_factory()
+    try:
+        claim, deliveries = claim_due(db, limit=limit, lease=lease)
+        destinations = load_destinations(db, [d.url for d in deliveries])
+        return claim, deliveries, destinations
+    finally:
+        db.close()
+
+
+def _record(session_factory, claim, deliveries, errors, max_attempts):
+    db = session_factory()
+    try:
+        return record_results(db, claim, deliveries, errors, max_attempts)
+    finally:
+        db.close()
+
+
+def _renew(session_factory, claim, lease):
+    db = session_factory()
+    try:
+        return renew_lease(db, claim, lease)
+    finally:
+        db.close()
+
+
+async def _deliver_leased(
+    dispatcher, deliveries, destinations, claim, session_factory, lease
+):
+    """`deliver_all`, renewing the claim's lease every third of it, so a
+    pass that outlasts the lease (slow hosts, timeouts) isn't reclaimed and
+    delivered again by another worker."""
+
+    async def keep_leased():
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                await asyncio.to_thread(_renew, session_factory, claim, lease)
+            except Exception:
+                pass  # retried on the next tick
+
+    renewer = asyncio.create_task(keep_leased())
+    try:
+        return await dispatcher.deliver_all(deliveries, destinations)
+    finally:
+        renewer.cancel()
+
+
+async def process_queue_once(
+    dispatcher: Dispatcher,
+    max_attempts: int = MAX_ATTEMPTS,
+    session_factory=SessionLocal,
+    batch_size: int = BATCH_SIZE,
+    lease: float = LEASE_SECONDS,
+) -> int:
+    """Claim batches of due webhooks and deliver each concurrently, until a
+    claim comes back short. Returns the number delivered."""
+    delivered = 0
+    while True:
+        claim, deliveries, destinations = await asyncio.to_thread(
+            _claim, session_factory, batch_size, lease
+        )
+        if not deliveries:
+            return delivered
+        errors = await _deliver_leased(
+            dispatcher, deliveries, destinations, claim, session_factory, lease
+        )
+        delivered += await asyncio.to_thread(
+            _record, session_factory, claim, deliveries, errors, max_attempts
+        )
+        if len(deliveries) < batch_size:
+            return delivered
+
+
+def run_once(db=None, max_attempts: int = MAX_ATTEMPTS) -> int:
+    """Blocking `process_queue_once` (on `db` when given), with a
+    short-lived Dispatcher."""
+    local_db = db is None
+    db = db or SessionLocal()
+    try:
+        claim, deliveries = claim_due(db)
+        if not deliveries:
+            return 0
+        destinations = load_destinations(db, [d.url for d in deliveries])
+
+        renewals = sessionmaker(bind=db.get_bind())
+
+        async def deliver():
+            dispatcher = Dispatcher()
+            try:
+                return await _deliver_leased(
+                    dispatcher, deliveries, destinations, claim, renewals, LEASE_SECONDS
+                )
+            finally:
+                await dispatcher.aclose()
+
+        errors = asyncio.run(deliver())
+        return record_results(db, claim, deliveries, errors, max_attempts)
+    finally:
+        if local_db:
+            db.close()
+
+
+def history_page(db, status=None, url=None, cursor=None, limit=None):
+    """Newest-first page of webhook_history; returns ``(rows, next_cursor)``."""
+    H = models.WebhookHistory
+    query = db.query(H)
+    if status:
+        query = query.filter(H.status == status)
+    if url:
+        query = query.filter(H.url == url)
+    return pagination.keyset_page(
+        query,
+        H.id,
+        H.id,
+        lambda h: (h.id, h.id),
+        sort="history",
+        cursor=cursor,
+        limit=limit,
+        descending=True,
+    )
+
+
+def _not_requeued(H):
+    later = aliased(H)
+    return ~exists().where(later.requeued_from == H.id)
+
+
+def dead_letters(db, limit: int = 500):
+    """Dead-lettered history entries not requeued yet, newest first."""
+    H = models.WebhookHistory
+    return (
+        db.query(H)
+        .filter(H.status == "dead", _not_requeued(H))
+        .order_by(H.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def requeue_dead(db, history_id: int):
+    """Put dead-lettered history entry `history_id` back on the queue.
+
+    History stays append-only: the requeue is recorded as a new "requeued"
+    entry pointing at the dead one (`requeued_from`) and at the new queue
+    row. Returns that queue row, or None if `history_id` is not a dead
+    letter or was requeued already.
+    """
+    H = models.WebhookHistory
+    entry = (
+        db.query(H)
+        .filter(H.id == history_id, H.status == "dead", _not_requeued(H))
+        .first()
+    )
+    if entry is None:
+        return None
+    now = datetime.datetime.utcnow()
+    row = models.WebhookQueue(
+        url=entry.url,
+        payload=entry.payload,
+        attempts=0,
+        last_error="",
+        next_attempt_at=now,
+        created_at=entry.created_at,
+    )
+    db.add(row)
+    db.flush()
+    db.add(
+        H(
+            webhook_id=row.id,
+            url=entry.url,
+            payload=entry.payload,
+            status="requeued",
+            attempts=entry.attempts,
+            last_error=entry.last_error,
+            created_at=entry.created_at,
+            finished_at=now,
+            requeued_from=entry.id,
+        )
+    )
+    db.commit()
+    db.refresh(row)
+    wakeup.notify()
+    return row
@@ -0,0 +1,134 @@
+"""Compare the threadpool (sync) and async database paths under concurrency.
+
+Starts the API twice with uvicorn -- once with BBH_ASYNC_DB=0, once with
+BBH_ASYNC_DB=1 -- against the same seeded SQLite file and fires concurrent
+requests at the hot endpoints.
+
+Usage:
+  python scripts/bench_async_db.py --requests 2000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _seed(db_url, companies):
+    sys.path.insert(0, BACKEND_DIR)
+    from app import db, models
+
+    eng = db.make_engine(db_url)
+    models.Base.metadata.create_all(bind=eng)
+    with eng.begin() as conn:
+        conn.execute(
+            models.Company.__table__.insert(),
+            [
+                {
+                    "name": f"Bench Company {i}",
+                    "name_key": f"bench company {i}",
+                    "lead_score": (i % 100) / 100,
+                }
+                for i in range(companies)
+            ],
+        )
+    eng.dispose()
+
+
+async def _hammer(base_url, total, concurrency):
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as c:
+
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    if i % 4 == 0:
+                        r = await c.post("/mobile/leads", json={"name": f"Lead {i}"})
+                    else:
+                        r = await c.get("/companies", params={"limit": 50})
+                    r.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+    ok = len(latencies)
+    latencies = sorted(latencies) or [float("nan")]
+    return {
+        "errors": errors,
+        "req_per_s": ok / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def _run(mode, db_url, args):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=db_url, BBH_ASYNC_DB=mode)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base_url}/health", timeout=1)
+                break
+            except Exception:
+                time.sleep(0.2)
+        asyncio.run(_hammer(base_url, 50, 10))  # warm up pools
+        return asyncio.run(_hammer(base_url, args.requests, args.concurrency))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--concurrency", type=int, default=200)
+    p.add_argument("--companies", type=int, default=10000)
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        _seed(db_url, args.companies)
+        for mode, label in (("0", "threadpool"), ("1", "async")):
+            res = _run(mode, db_url, args)
+            print(
+                f"{label:>10}: {res['req_per_s']:8.1f} req/s  "
+                f"p50 {res['p50_ms']:7.1f} ms  p95 {res['p95_ms']:7.1f} ms  "
+                f"errors {res['errors']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
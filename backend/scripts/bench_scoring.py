@@ -0,0 +1,80 @@
+"""Benchmark per-lead scoring against the vectorized batch scorer.
+
+"per-lead" is the previous implementation: one `random.seed()` on the
+process-global RNG and one Python scoring pass per lead. "batch" is
+`ai_processor.score_batch` with the same per-lead seeds.
+
+Usage:
+  python scripts/bench_scoring.py --leads 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import ai_processor  # noqa: E402
+
+
+def _legacy_score(lead, seed):
+    random.seed(seed)
+    base, has_email, name_len = ai_processor._features(lead)[:3]
+    if has_email:
+        base += 0.15
+    if name_len > 10:
+        base += 0.05
+    noise = (random.random() - 0.5) * 0.08
+    return round(max(0.0, min(1.0, base + noise)), 4)
+
+
+def _leads(n):
+    rnd = random.Random(7)
+    return [
+        {
+            "name": f"Firma {'x' * rnd.randint(0, 12)} {i}",
+            "email": f"info{i}@example.cz" if rnd.random() < 0.6 else None,
+            "lead_score": round(rnd.random(), 3),
+        }
+        for i in range(n)
+    ]
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--leads", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    leads = _leads(args.leads)
+    seeds = [ai_processor.stable_seed(lead) for lead in leads]
+
+    def per_lead():
+        scores = [_legacy_score(lead, s) for lead, s in zip(leads, seeds)]
+        return [ai_processor.recommend_next_action(s) for s in scores]
+
+    def batch():
+        return ai_processor.score_batch(leads, seeds)
+
+    t_legacy = _best_of(per_lead, args.repeat)
+    t_batch = _best_of(batch, args.repeat)
+    engine = "numpy" if ai_processor.np is not None else "pure python"
+    print(f"{args.leads} leads")
+    print(f"  per-lead : {t_legacy * 1000:8.1f} ms")
+    print(f"  batch    : {t_batch * 1000:8.1f} ms  ({engine})")
+    print(f"  speedup  : {t_legacy / t_batch:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Webhook deliveries per second: the old sequential loop vs app.webhooks.
+
+A stand-in receiver (a bare asyncio HTTP/1.1 server with keep-alive, in a
+subprocess) listens on `--hosts` ports, each one a separate "host" for the
+per-host limit, and answers every POST after `--delay-ms`. The queue is
+seeded with `--webhooks` rows spread over those hosts and drained:
+
+- "sequential" is the previous `process_queue_once`: one blocking
+  `httpx.post` (new connection) and one commit per row;
+- "dispatcher" is `webhooks.process_queue_once` with a pooled
+  `httpx.AsyncClient` and global / per-host concurrency limits;
+- "batched" (with `--batch-size` > 1) is the same with every host opted
+  into batched delivery (a WebhookDestination row per URL).
+
+Usage:
+  python scripts/bench_webhooks.py --webhooks 2000 --hosts 8 --delay-ms 20
+  python scripts/bench_webhooks.py --batch-size 50 --gzip-min-bytes 1024
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from app import db, models, webhooks  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+_RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+
+
+async def _serve_connection(reader, writer, delay):
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            await asyncio.sleep(delay)
+            writer.write(_RESPONSE)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve(ports, delay):
+    servers = [
+        await asyncio.start_server(
+            lambda r, w: _serve_connection(r, w, delay), "127.0.0.1", port
+        )
+        for port in ports
+    ]
+    await asyncio.gather(*(s.serve_forever() for s in servers))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _seed(Session, urls, n):
+    now = datetime.datetime.utcnow()
+    with Session() as session:
+        session.execute(models.WebhookQueue.__table__.delete())
+        session.execute(
+            models.WebhookQueue.__table__.insert(),
+            [
+                {
+                    "url": urls[i % len(urls)],
+                    "payload": json.dumps({"event": "bench", "n": i}),
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "dead": 0,
+                }
+                for i in range(n)
+            ],
+        )
+        session.commit()
+
+
+def _set_destinations(Session, urls, batch_size, gzip_min_bytes):
+    with Session() as session:
+        session.execute(models.WebhookDestination.__table__.delete())
+        for url in urls:
+            session.add(
+                models.WebhookDestination(
+                    url=url, batch_size=batch_size, gzip_min_bytes=gzip_min_bytes
+                )
+            )
+        session.commit()
+
+
+def _sequential(Session):
+    # the previous process_queue_once, minus its failure branches
+    W = models.WebhookQueue
+    with Session() as session:
+        rows = session.query(W).filter(W.next_attempt_at <= datetime.datetime.utcnow())
+        delivered = 0
+        for row in rows.all():
+            r = httpx.post(row.url, json=json.loads(row.payload), timeout=5.0)
+            if 200 <= r.status_code < 300:
+                session.delete(row)
+                session.commit()
+                delivered += 1
+        return delivered
+
+
+async def _dispatcher(Session, args):
+    dispatcher = webhooks.Dispatcher(
+        concurrency=args.concurrency, per_host=args.per_host
+    )
+    try:
+        return await webhooks.process_queue_once(dispatcher, session_factory=Session)
+    finally:
+        await dispatcher.aclose()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--webhooks", type=int, default=2000)
+    p.add_argument("--hosts", type=int, default=8)
+    p.add_argument("--delay-ms", type=float, default=20)
+    p.add_argument("--concurrency", type=int, default=webhooks.CONCURRENCY)
+    p.add_argument("--per-host", type=int, default=webhooks.PER_HOST)
+    p.add_argument("--batch-size", type=int, default=1)
+    p.add_argument("--gzip-min-bytes", type=int, default=None)
+    p.add_argument("--serve", nargs="*", type=int, help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.serve:
+        asyncio.run(_serve(args.serve, args.delay_ms / 1000))
+        return
+
+    ports = [_free_port() for _ in range(args.hosts)]
+    receiver = subprocess.Popen(
+        [sys.executable, __file__, "--delay-ms", str(args.delay_ms), "--serve"]
+        + [str(port) for port in ports]
+    )
+    urls = [f"http://127.0.0.1:{port}/hook" for port in ports]
+    try:
+        for _ in range(100):
+            try:
+                httpx.post(urls[0], json={}, timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        with tempfile.TemporaryDirectory() as tmp:
+            eng = db.make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            models.Base.metadata.create_all(bind=eng)
+            Session = sessionmaker(bind=eng)
+            runs = [
+                ("sequential", lambda: _sequential(Session)),
+                ("dispatcher", lambda: asyncio.run(_dispatcher(Session, args))),
+            ]
+            if args.batch_size > 1:
+                runs.append(
+                    ("batched", lambda: asyncio.run(_dispatcher(Session, args)))
+                )
+            for label, run in runs:
+                if label == "batched":
+                    _set_destinations(
+                        Session, urls, args.batch_size, args.gzip_min_bytes
+                    )
+                _seed(Session, urls, args.webhooks)
+                t0 = time.perf_counter()
+                delivered = run()
+                elapsed = time.perf_counter() - t0
+                print(
+                    f"{label:>10}: {delivered} delivered in {elapsed:6.2f} s "
+                    f"= {delivered / elapsed:8.1f} deliveries/s"
+                )
+            eng.dispose()
+    finally:
+        receiver.terminate()
+        receiver.wait()
+
+
+if __name__ == "__main__":
+    main()
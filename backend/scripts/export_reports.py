@@ -0,0 +1,70 @@
+"""Export leads or companies to Arrow IPC / Parquet from the command line.
+
+Uses the same query, filters and record-batch encoder as
+/reports/leads.{arrow,parquet}. The format follows the output extension
+unless --format is given. Requires pyarrow.
+
+Usage:
+  python scripts/export_reports.py leads.parquet --min-score 5
+  python scripts/export_reports.py companies.arrow --kind companies
+"""
+
+import argparse
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("output", help="file to write (.arrow or .parquet)")
+    p.add_argument("--kind", choices=("leads", "companies"), default="leads")
+    p.add_argument("--format", choices=("arrow", "parquet"), default=None)
+    p.add_argument("--db", default=None, help="database URL (default: DATABASE_URL)")
+    p.add_argument("--name", default=None, help="name contains")
+    p.add_argument("--name-prefix", default=None)
+    p.add_argument("--min-score", type=float, default=None)
+    p.add_argument("--max-score", type=float, default=None)
+    args = p.parse_args(argv)
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if fmt not in ("arrow", "parquet"):
+        p.error("cannot infer the format from the extension; pass --format")
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import columnar, db, reporting
+    from sqlalchemy.orm import Session
+
+    if not columnar.available():
+        print("pyarrow is not installed", file=sys.stderr)
+        return 1
+
+    eng = db.make_engine(args.db)
+    session = Session(bind=eng)
+    try:
+        if args.kind == "leads":
+            chunks = reporting.iter_leads_columnar(
+                session,
+                fmt,
+                name_contains=args.name,
+                min_score=args.min_score,
+                max_score=args.max_score,
+                name_prefix=args.name_prefix,
+            )
+        else:
+            chunks = reporting.iter_companies_columnar(session, fmt)
+        written = 0
+        with open(args.output, "wb") as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+                written += len(chunk)
+    finally:
+        session.close()
+        eng.dispose()
+    print(f"wrote {written} bytes to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
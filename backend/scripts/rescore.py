@@ -0,0 +1,62 @@
+"""Rescore every company with the current scoring model.
+
+Scores chunks of companies on a process pool and writes them back with bulk
+UPDATEs. Progress is checkpointed in `rescore_jobs`; rerunning after an
+interruption resumes from the checkpoint (pass --restart to start over).
+
+Usage:
+  python scripts/rescore.py --workers 8 --chunk-size 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--workers", type=int, default=None, help="default: CPU count")
+    p.add_argument("--chunk-size", type=int, default=None)
+    p.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    p.add_argument("--db", default=None, help="database URL (default: DATABASE_URL)")
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, BACKEND_DIR)
+    from app import db, models, rescoring
+    from sqlalchemy.orm import Session
+
+    eng = db.make_engine(args.db)
+    models.Base.metadata.create_all(bind=eng)
+    session = Session(bind=eng)
+    t0 = time.perf_counter()
+
+    def progress(job):
+        pct = 100.0 * job.processed / job.total if job.total else 100.0
+        print(
+            f"job {job.id}: {job.processed}/{job.total} ({pct:5.1f}%) "
+            f"last id {job.last_id}, {time.perf_counter() - t0:.1f}s",
+            flush=True,
+        )
+
+    kwargs = {"resume": not args.restart, "progress": progress}
+    if args.workers is not None:
+        kwargs["workers"] = args.workers
+    if args.chunk_size is not None:
+        kwargs["chunk_size"] = args.chunk_size
+    try:
+        job = rescoring.rescore_all(session, **kwargs)
+        print(f"job {job.id} {job.status}: {job.processed} companies")
+    except KeyboardInterrupt:
+        print("interrupted; rerun to resume from the checkpoint", file=sys.stderr)
+        return 130
+    finally:
+        session.close()
+        eng.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
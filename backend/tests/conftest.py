@@ -1,7 +1,35 @@
 import os
 import sys
 
+import pytest
+
 # Ensure the backend package root is on sys.path for test imports
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def make_tmp_session(tmp_path):
+    """Factory for sessions on throwaway SQLite databases with the schema created."""
+    from app import db, models
+    from sqlalchemy.orm import sessionmaker
+
+    opened = []
+
+    def make(name="test.db"):
+        eng = db.make_engine(f"sqlite:///{tmp_path / name}")
+        models.Base.metadata.create_all(bind=eng)
+        session = sessionmaker(bind=eng)()
+        opened.append((eng, session))
+        return session
+
+    yield make
+    for eng, session in opened:
+        session.close()
+        eng.dispose()
+
+
+@pytest.fixture
+def tmp_session(make_tmp_session):
+    return make_tmp_session()
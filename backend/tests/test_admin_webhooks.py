@@ -49,3 +49,98 @@ def test_admin_webhook_dlq_and_requeue():
     db.query(models.WebhookQueue).delete()
     db.commit()
     db.close()
+
+
+def test_admin_webhook_history_and_requeue_from_history():
+    from app import security, webhooks
+    from app.main import SessionLocal
+
+    db = SessionLocal()
+    db.query(models.WebhookQueue).delete()
+    db.query(models.WebhookHistory).delete()
+    db.commit()
+    headers = {
+        "Authorization": "Bearer "
+        + security.create_access_token({"sub": "adminuser", "uid": 1, "role": "admin"})
+    }
+
+    integrations.enqueue_webhook(db, "http://example.invalid", {"x": 2})
+    claim, deliveries = webhooks.claim_due(db)
+    webhooks.record_results(db, claim, deliveries, ["HTTP 500"], max_attempts=1)
+    # the dead letter's queue id is free again (SQLite reuses it)
+    live = integrations.enqueue_webhook(db, "http://example.invalid", {"x": 3})
+    live_id = live.id
+
+    listed = client.get("/admin/webhooks", headers=headers).json()
+    assert [d["id"] for d in listed["webhooks"]] == [live_id]
+    (dead,) = listed["dead_letters"]
+    assert dead["status"] == "dead" and dead["attempts"] == 1
+
+    page = client.get(
+        "/admin/webhooks/history",
+        params={"status": "dead", "limit": 1},
+        headers=headers,
+    ).json()
+    assert [h["id"] for h in page["history"]] == [dead["id"]]
+    assert page["next_cursor"] is None
+
+    r = client.post(
+        f"/admin/webhooks/history/{dead['id']}/requeue", headers=headers
+    ).json()
+    assert r["status"] == "ok" and r["id"] != live_id
+    db.expire_all()
+    row = db.get(models.WebhookQueue, r["id"])
+    assert row.payload == '{"x": 2}' and row.attempts == 0
+    assert db.get(models.WebhookQueue, live_id).payload == '{"x": 3}'
+    # history is append-only: the dead entry is kept, the requeue appended
+    history = db.query(models.WebhookHistory).order_by(models.WebhookHistory.id)
+    assert [(h.status, h.requeued_from, h.webhook_id) for h in history] == [
+        ("dead", None, dead["webhook_id"]),
+        ("requeued", dead["id"], r["id"]),
+    ]
+    again = client.post(
+        f"/admin/webhooks/history/{dead['id']}/requeue", headers=headers
+    ).json()
+    assert again["status"] == "error"
+    listed = client.get("/admin/webhooks", headers=headers).json()
+    assert listed["dead_letters"] == []
+
+    db.query(models.WebhookQueue).delete()
+    db.query(models.WebhookHistory).delete()
+    db.commit()
+    db.close()
+
+
+def test_admin_webhook_destination_settings():
+    from app import security
+    from app.main import SessionLocal
+
+    headers = {
+        "Authorization": "Bearer "
+        + security.create_access_token({"sub": "adminuser", "uid": 1, "role": "admin"})
+    }
+    url = "http://example.invalid/batched"
+    r = client.put(
+        "/admin/webhooks/destinations",
+        json={"url": url, "batch_size": 50, "gzip_min_bytes": 1024},
+        headers=headers,
+    )
+    assert r.json()["destination"]["batch_size"] == 50
+    listed = client.get("/admin/webhooks/destinations", headers=headers).json()
+    assert [(d["url"], d["gzip_min_bytes"]) for d in listed["destinations"]] == [
+        (url, 1024)
+    ]
+    bad = client.put(
+        "/admin/webhooks/destinations",
+        json={"url": url, "batch_size": 0},
+        headers=headers,
+    )
+    assert bad.status_code == 400
+
+    r = client.delete(
+        "/admin/webhooks/destinations", params={"url": url}, headers=headers
+    )
+    assert r.json()["status"] == "ok"
+    db = SessionLocal()
+    assert db.query(models.WebhookDestination).count() == 0
+    db.close()
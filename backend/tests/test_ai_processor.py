@@ -1,4 +1,4 @@
-from app import ai_processor
+from app import ai_processor, integrations
 
 
 def test_score_lead_range_and_determinism():
@@ -21,6 +21,7 @@ def test_recommend_actions():
 
 
 def test_enrich_with_opengov():
+    integrations._limiter.reset()
     lead = {"name": "Unique Demo Ltd"}
     enriched = ai_processor.enrich_with_opengov(lead)
     assert enriched.get("enriched") is True
@@ -35,3 +36,42 @@ def test_apply_demo_scoring_deterministic():
     for s in scored1:
         assert "lead_score" in s
         assert "recommended_action" in s
+
+
+def _leads():
+    return [
+        {"name": f"Firma {'x' * (i % 13)}", "email": "a@b.cz" if i % 3 else None}
+        | ({"lead_score": (i % 11) / 10} if i % 4 else {})
+        for i in range(500)
+    ] + [{"company": "Bad Score s.r.o.", "lead_score": "n/a"}, {}]
+
+
+def test_score_batch_matches_score_lead():
+    leads = _leads()
+    seeds = [ai_processor.stable_seed(lead) for lead in leads] + [-5]
+    leads.append({"name": "Negative seed"})
+    scores, actions = ai_processor.score_batch(leads, seeds)
+    assert scores == [ai_processor.score_lead(x, s) for x, s in zip(leads, seeds)]
+    assert actions == [ai_processor.recommend_next_action(s) for s in scores]
+    assert all(0.0 <= s <= 1.0 for s in scores)
+
+    unseeded, _ = ai_processor.score_batch(leads)
+    assert len(unseeded) == len(leads)
+
+
+def test_score_batch_without_numpy(monkeypatch):
+    leads = _leads()
+    seeds = [ai_processor.stable_seed(lead) for lead in leads]
+    expected = ai_processor.score_batch(leads, seeds)
+    monkeypatch.setattr(ai_processor, "np", None)
+    assert ai_processor.score_batch(leads, seeds) == expected
+
+
+def test_seeded_noise_does_not_touch_global_rng():
+    import random
+
+    random.seed(1234)
+    before = random.random()
+    random.seed(1234)
+    ai_processor.apply_demo_scoring([{"name": "Thread Safe"}], deterministic=True)
+    assert random.random() == before
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from app import async_crud, db, main
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def async_maker(tmp_session):
+    url = str(tmp_session.get_bind().url)
+    eng = db.make_async_engine(db.to_async_url(url))
+    yield async_sessionmaker(eng, expire_on_commit=False)
+    asyncio.run(eng.dispose())
+
+
+def test_async_crud_roundtrip(async_maker):
+    async def scenario():
+        async with async_maker() as session:
+            await async_crud.create_lead(session, {"name": "Async One"})
+            comp = await async_crud.create_or_update_lead(
+                session, {"name": "Async Three", "email": "x@y.cz", "lead_score": 3}
+            )
+            results = await async_crud.bulk_upsert_leads(
+                session, [{"name": "Async Two"}, {"email": "X@y.cz"}]
+            )
+            page, cursor = await async_crud.get_companies_page(session, limit=1)
+            return comp, results, page, cursor
+
+    comp, results, page, cursor = asyncio.run(scenario())
+    assert comp.lead_score == 3
+    assert results[1]["lead_id"] == comp.id
+    assert len(page) == 1 and cursor is not None
+
+
+def test_async_endpoints(async_maker):
+    app = FastAPI()
+    for path, method, _sync, async_endpoint in main.CRM_ROUTES:
+        app.add_api_route(path, async_endpoint, methods=[method])
+
+    async def override():
+        async with async_maker() as session:
+            yield session
+
+    app.dependency_overrides[main.get_async_db] = override
+    client = TestClient(app)
+    r = client.post("/mobile/sync", json={"leads": [{"name": "A"}, {"name": "a"}]})
+    assert r.status_code == 200
+    assert r.json()["synced"] == 2
+    r = client.get("/companies", params={"limit": 5})
+    assert r.status_code == 200
+    assert len(r.json()["companies"]) == 1
+
+
+def test_async_endpoints_score_off_the_event_loop(async_maker, monkeypatch):
+    # scoring can block on OpenGov lookups, so it must not run on the loop
+    on_loop = []
+
+    def recording(fn):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(fn.__name__)
+            except RuntimeError:
+                pass
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(
+        main.ai_processor,
+        "apply_scoring",
+        recording(main.ai_processor.apply_scoring),
+    )
+    monkeypatch.setattr(
+        main.rescoring, "company_views", recording(main.rescoring.company_views)
+    )
+    app = FastAPI()
+    for path, method, _sync, async_endpoint in main.CRM_ROUTES:
+        app.add_api_route(path, async_endpoint, methods=[method])
+
+    async def override():
+        async with async_maker() as session:
+            yield session
+
+    app.dependency_overrides[main.get_async_db] = override
+    client = TestClient(app)
+    assert client.post("/mobile/leads", json={"name": "Loop"}).status_code == 200
+    r = client.get("/companies", params={"limit": 5, "sort": "name"})
+    assert r.status_code == 200 and r.json()["companies"]
+    assert on_loop == []
@@ -0,0 +1,54 @@
+import pytest
+from app import crud, models
+from app.main import app
+from fastapi.testclient import TestClient
+
+LEADS = [
+    {"name": "Alpha", "email": "a@alpha.cz", "lead_score": 0.2},
+    {"name": "Beta", "lead_score": 0.5},
+    {"name": " ALPHA ", "lead_score": 0.9},
+    {"name": "Alpha renamed", "email": "A@alpha.cz", "lead_score": 0.1},
+    {"name": "Gamma", "email": "g@gamma.cz", "lead_score": 0.3},
+    {"name": "beta", "lead_score": 0.7},
+    {"company": "Delta", "contact_name": "Dana", "email": "d@delta.cz"},
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 500])
+def test_bulk_matches_sequential(make_tmp_session, chunk_size):
+    seq = make_tmp_session("seq.db")
+    crud.create_company(seq, "Beta", lead_score=0.6)
+    expected = []
+    for lead in LEADS:
+        comp = crud.create_or_update_lead(seq, lead)
+        expected.append(
+            {"lead_id": comp.id, "name": comp.name, "lead_score": comp.lead_score}
+        )
+
+    bulk = make_tmp_session("bulk.db")
+    crud.create_company(bulk, "Beta", lead_score=0.6)
+    assert crud.bulk_upsert_leads(bulk, LEADS, chunk_size=chunk_size) == expected
+
+    def snapshot(s):
+        companies = s.query(models.Company).order_by(models.Company.id).all()
+        contacts = s.query(models.Contact).order_by(models.Contact.id).all()
+        return (
+            [(c.id, c.name, c.name_key, c.lead_score) for c in companies],
+            [(c.company_id, c.name, c.email, c.email_key) for c in contacts],
+        )
+
+    assert snapshot(bulk) == snapshot(seq)
+
+
+def test_mobile_sync_endpoint():
+    client = TestClient(app)
+    r = client.post(
+        "/mobile/sync",
+        json={"leads": [{"name": "Sync Test Co"}, {"name": "sync test co"}]},
+    )
+    assert r.status_code == 200
+    data = r.json()
+    assert data["synced"] == 2
+    first, second = data["results"]
+    assert first["lead_id"] == second["lead_id"]
+    assert set(first) == {"lead_id", "name", "lead_score"}
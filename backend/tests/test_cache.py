@@ -0,0 +1,103 @@
+from app import ai_processor, cache, main
+from fastapi.testclient import TestClient
+
+
+def test_ttl_cache_lru_and_ttl():
+    now = [0.0]
+    c = cache.TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "a" becomes most recently used
+    c.set("c", 3)  # evicts "b"
+    assert c.get("b") is None
+    now[0] = 11
+    assert c.get("a") is None  # expired
+    assert c.stats() == {
+        "size": 1,
+        "maxsize": 2,
+        "ttl": 10,
+        "hits": 1,
+        "misses": 2,
+        "evictions": 1,
+    }
+
+
+def test_deterministic_scoring_is_per_lead_not_per_position():
+    lead = {"name": "Stable Scoring s.r.o.", "email": "x@y.cz"}
+    alone = ai_processor.apply_demo_scoring([lead], deterministic=True)[0]
+    batch = ai_processor.apply_demo_scoring(
+        [{"name": "Other"}, lead], deterministic=True
+    )[1]
+    assert alone == batch
+
+
+def test_companies_cache_invalidated_by_writes():
+    client = TestClient(main.app)
+    main.companies_cache.clear()
+    before = main.companies_cache.hits
+    first = client.get("/companies", params={"order": "desc", "limit": 5}).json()
+    second = client.get("/companies", params={"order": "desc", "limit": 5}).json()
+    assert first == second
+    assert main.companies_cache.hits == before + 1
+
+    client.post("/leads", json={"name": "Cache Bust Ltd"})
+    third = client.get("/companies", params={"order": "desc", "limit": 5}).json()
+    assert any(c["name"] == "Cache Bust Ltd" for c in third["companies"])
+
+
+def test_sqlite_tier_is_shared_and_pruned(tmp_path):
+    now = [1000.0]
+    path = str(tmp_path / "shared.db")
+    worker_a = cache.SQLiteCache(path, ttl=10, maxsize=2, clock=lambda: now[0])
+    worker_b = cache.SQLiteCache(path, ttl=10, maxsize=2, clock=lambda: now[0])
+    worker_a.set("a", {"id": 1})
+    assert worker_b.get("a") == {"id": 1}
+    now[0] += 1
+    worker_b.set_many({"b": [2], "c": 3})
+    assert worker_a.prune() == 1  # "a" is the oldest beyond maxsize
+    assert worker_a.get("a") is None
+    now[0] += 10
+    assert worker_b.get("c") is None  # expired
+    assert worker_a.prune() == 2 and len(worker_a) == 0
+    worker_a.close()
+    worker_b.close()
+
+
+def test_tiered_cache_promotes_shared_hits(tmp_path):
+    now = [1000.0]
+    shared = cache.SQLiteCache(str(tmp_path / "t.db"), ttl=10, clock=lambda: now[0])
+    writer = cache.TieredCache(
+        cache.TTLCache(ttl=10, clock=lambda: now[0]), shared, clock=lambda: now[0]
+    )
+    reader = cache.TieredCache(
+        cache.TTLCache(ttl=10, clock=lambda: now[0]), shared, clock=lambda: now[0]
+    )
+    writer.set("k", "v")
+    now[0] += 6
+    assert reader.get_many(["k", "missing"]) == {"k": "v"}
+    assert reader.local.get("k") == "v"  # served locally from now on
+    now[0] += 5
+    # the promoted copy keeps the original expiry, not a fresh TTL
+    assert reader.get("k") is None
+    stats = reader.stats()
+    assert stats["local"]["hits"] == 1 and stats["shared"]["hits"] == 1
+    shared.close()
+
+
+def test_scoring_enrichment_goes_through_the_cache(monkeypatch):
+    from app import integrations, opengov
+
+    integrations._cache.clear()
+    calls = []
+    real = opengov.registry_record
+    monkeypatch.setattr(
+        opengov, "registry_record", lambda key: calls.append(key) or real(key)
+    )
+    leads = [{"name": "Firma A"}, {"name": "firma  a"}, {"name": "Firma B"}]
+    scored = ai_processor.apply_demo_scoring(leads, deterministic=True)
+    assert sorted(calls) == ["firma a", "firma b"]
+    assert scored[0]["official_registry_id"] == scored[1]["official_registry_id"]
+    ai_processor.apply_demo_scoring(leads, deterministic=True)
+    assert len(calls) == 2
+    assert integrations.opengov_enrich("Firma B") == real("firma b")
+    assert len(calls) == 2
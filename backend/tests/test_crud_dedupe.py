@@ -0,0 +1,43 @@
+import pytest
+from app import crud, models
+
+
+@pytest.fixture
+def session(tmp_session):
+    return tmp_session
+
+
+def test_name_match_is_case_and_whitespace_folded(session):
+    first = crud.create_or_update_lead(session, {"name": "Acme  Ltd", "lead_score": 1})
+    again = crud.create_or_update_lead(session, {"name": " ACME ltd ", "lead_score": 2})
+    assert again.id == first.id
+    assert again.lead_score == 2
+    assert session.query(models.Company).count() == 1
+
+
+def test_email_alone_resolves_existing_company(session):
+    comp = crud.create_or_update_lead(
+        session, {"name": "Původní s.r.o.", "email": "Info@Example.cz"}
+    )
+    other = crud.create_or_update_lead(
+        session, {"name": "Renamed Company", "email": "info@example.cz "}
+    )
+    assert other.id == comp.id
+
+
+def test_name_and_email_match_preferred(session):
+    crud.create_company(session, "Twin")
+    second = crud.create_or_update_lead(session, {"name": "Other", "email": "a@b.cz"})
+    second.name = "Twin"
+    session.commit()
+    found = crud.find_company_by_name_or_email(session, name="twin", email="A@B.cz")
+    assert found.id == second.id
+
+
+def test_backfill_dedupe_keys(session):
+    comp = crud.create_company(session, "Legacy  Name")
+    session.query(models.Company).update({models.Company.name_key: None})
+    session.commit()
+    assert crud.backfill_dedupe_keys(session) == 1
+    session.refresh(comp)
+    assert comp.name_key == "legacy name"
@@ -0,0 +1,31 @@
+from app import db, integrations, main
+from sqlalchemy import text
+
+
+def test_app_and_worker_share_engine():
+    assert integrations.engine is main.engine is db.engine
+    assert integrations.SessionLocal is main.SessionLocal
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    eng = db.make_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    with eng.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        busy = conn.execute(text("PRAGMA busy_timeout")).scalar()
+        assert busy == db.SQLITE_BUSY_TIMEOUT_MS
+        # NORMAL == 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        cache = conn.execute(text("PRAGMA cache_size")).scalar()
+        assert cache == db.SQLITE_CACHE_SIZE
+    eng.dispose()
+
+
+def test_pool_settings_applied(tmp_path):
+    eng = db.make_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=3)
+    assert eng.pool.size() == 3
+    eng.dispose()
+
+
+def test_to_async_url():
+    assert db.to_async_url("sqlite:///./x.db").startswith("sqlite+aiosqlite://")
+    assert db.to_async_url("postgresql://u:p@h/d").startswith("postgresql+asyncpg://")
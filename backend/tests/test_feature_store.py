@@ -0,0 +1,190 @@
+import datetime
+
+from app import ai_processor, crud, feature_store, models, rescoring
+from sqlalchemy import select
+
+
+def _snapshot(session):
+    rows = session.execute(
+        select(
+            models.CompanyFeatures.company_id,
+            models.CompanyFeatures.opportunity_count,
+            models.CompanyFeatures.open_opportunity_count,
+            models.CompanyFeatures.open_value,
+            models.CompanyFeatures.activity_count,
+            models.CompanyFeatures.last_activity_at,
+        ).order_by(models.CompanyFeatures.company_id)
+    ).all()
+    return [tuple(r) for r in rows if r[1] or r[4]]
+
+
+def test_features_follow_inserts_updates_and_deletes(tmp_session):
+    a = crud.create_company(tmp_session, name="Firma A", lead_score=0.2)
+    b = crud.create_company(tmp_session, name="Firma B", lead_score=0.2)
+    day1 = datetime.datetime(2026, 1, 1)
+    day2 = datetime.datetime(2026, 2, 1)
+
+    won = models.Opportunity(company_id=a.id, name="won", value=50, status="won")
+    deal = models.Opportunity(company_id=a.id, name="deal", value=100)
+    tmp_session.add_all([won, deal])
+    tmp_session.flush()
+    tmp_session.add_all(
+        [
+            models.Activity(opportunity_id=deal.id, type="call", created_at=day1),
+            models.Activity(opportunity_id=deal.id, type="mail", created_at=day2),
+        ]
+    )
+    tmp_session.commit()
+    features = tmp_session.get(models.CompanyFeatures, a.id)
+    assert features.opportunity_count == 2
+    assert features.open_opportunity_count == 1 and features.open_value == 100
+    assert features.activity_count == 2 and features.last_activity_at == day2
+
+    deal.value = 300
+    tmp_session.commit()
+    tmp_session.refresh(features)
+    assert features.open_value == 300
+
+    latest = tmp_session.scalars(
+        select(models.Activity).where(models.Activity.created_at == day2)
+    ).one()
+    tmp_session.delete(latest)
+    tmp_session.commit()
+    tmp_session.refresh(features)
+    assert features.activity_count == 1 and features.last_activity_at == day1
+
+    # moving an opportunity moves its pipeline and activities with it
+    deal.company_id = b.id
+    tmp_session.commit()
+    tmp_session.refresh(features)
+    assert features.open_opportunity_count == 0 and features.activity_count == 0
+    assert features.last_activity_at is None
+    moved = tmp_session.get(models.CompanyFeatures, b.id)
+    assert moved.open_value == 300 and moved.activity_count == 1
+
+    incremental = _snapshot(tmp_session)
+    assert feature_store.rebuild(tmp_session) > 0
+    assert _snapshot(tmp_session) == incremental
+
+
+def test_activity_bumps_version_and_rescores(tmp_session):
+    company = crud.create_company(tmp_session, name="Firma A", lead_score=0.3)
+    assert rescoring.rescore_pending(tmp_session) == 1
+    before = company.score
+
+    deal = models.Opportunity(company_id=company.id, name="deal", value=0)
+    tmp_session.add(deal)
+    tmp_session.commit()
+    tmp_session.refresh(company)
+    assert company.scored_at is None  # a feature change invalidates the score
+    version = tmp_session.get(models.CompanyFeatures, company.id).version
+
+    tmp_session.add(models.Activity(opportunity_id=deal.id, type="call"))
+    tmp_session.commit()
+    assert tmp_session.get(models.CompanyFeatures, company.id).version == version + 1
+    assert rescoring.rescore_pending(tmp_session) == 1
+    tmp_session.refresh(company)
+    assert company.score == round(before + ai_processor.RECENT_ACTIVITY_BONUS, 4)
+
+    # moving the activity in time changes last_activity_at, a scoring input
+    activity = tmp_session.scalars(select(models.Activity)).one()
+    activity.created_at = datetime.datetime(2020, 1, 1)
+    tmp_session.commit()
+    tmp_session.refresh(company)
+    assert company.scored_at is None
+    features = tmp_session.get(models.CompanyFeatures, company.id)
+    assert features.version == version + 2
+    assert features.last_activity_at == datetime.datetime(2020, 1, 1)
+    assert rescoring.rescore_pending(tmp_session) == 1
+    tmp_session.refresh(company)
+    assert company.score == before
+
+
+def test_aged_out_activity_is_rescored(tmp_session):
+    now = datetime.datetime.utcnow()
+    days = datetime.timedelta(days=1)
+    window = ai_processor.RECENT_ACTIVITY_DAYS * days
+    ids = []
+    for name, age in (("Nedávná", window - days), ("Stará", window + 30 * days)):
+        company = crud.create_company(tmp_session, name=name, lead_score=0.3)
+        deal = models.Opportunity(company_id=company.id, name="deal", value=0)
+        tmp_session.add(deal)
+        tmp_session.flush()
+        tmp_session.add(
+            models.Activity(opportunity_id=deal.id, type="call", created_at=now - age)
+        )
+        tmp_session.commit()
+        ids.append(company.id)
+    assert rescoring.rescore_pending(tmp_session) == 2
+    assert rescoring.expire_recent_activity(tmp_session) == 0
+
+    # two days later the recent activity has left the window; the old one
+    # was already outside it when scored
+    later = now + 2 * days
+    assert rescoring.expire_recent_activity(tmp_session, now=later) == 1
+    recent, old = (tmp_session.get(models.Company, i) for i in ids)
+    tmp_session.refresh(recent)
+    assert recent.scored_at is None and recent.score_input_hash is None
+    assert old.scored_at is not None
+    assert rescoring.expire_recent_activity(tmp_session, now=later) == 0
+
+    rescoring._recency_swept.clear()  # a restarted process sweeps everything
+    assert rescoring.expire_recent_activity(tmp_session, now=later) == 0
+    assert rescoring.rescore_pending(tmp_session) == 1
+
+
+def test_stale_features_do_not_overwrite_scores(tmp_session):
+    company = crud.create_company(tmp_session, name="Firma A", lead_score=0.3)
+    deal = models.Opportunity(company_id=company.id, name="deal", value=10)
+    tmp_session.add(deal)
+    tmp_session.commit()
+    row = tmp_session.execute(
+        rescoring._select_inputs().where(models.Company.id == company.id)
+    ).one()
+    key, inputs = rescoring._row_inputs(row)
+
+    # features change while the row is being scored
+    tmp_session.add(models.Activity(opportunity_id=deal.id, type="call"))
+    tmp_session.commit()
+    params = rescoring._score_chunk(ai_processor.HeuristicScorer(), [(key, inputs)])
+    table = models.Company.__table__
+    stale = tmp_session.execute(rescoring._guarded_update(table), params)
+    assert stale.rowcount == 0
+    tmp_session.commit()
+
+
+def test_opportunity_delete_matches_rebuild(tmp_session):
+    company = crud.create_company(tmp_session, name="Firma D", lead_score=0.2)
+    old = models.Opportunity(company_id=company.id, name="old", value=10)
+    recent = models.Opportunity(company_id=company.id, name="recent", value=20)
+    tmp_session.add_all([old, recent])
+    tmp_session.flush()
+    tmp_session.add_all(
+        [
+            models.Activity(
+                opportunity_id=old.id,
+                type="call",
+                created_at=datetime.datetime(2026, 1, 1),
+            ),
+            models.Activity(
+                opportunity_id=recent.id,
+                type="call",
+                created_at=datetime.datetime(2026, 3, 1),
+            ),
+        ]
+    )
+    tmp_session.commit()
+
+    tmp_session.delete(recent)
+    tmp_session.commit()
+    incremental = _snapshot(tmp_session)
+    assert incremental == [(company.id, 1, 1, 10.0, 1, datetime.datetime(2026, 1, 1))]
+    feature_store.rebuild(tmp_session)
+    assert _snapshot(tmp_session) == incremental
+
+    tmp_session.delete(old)
+    tmp_session.commit()
+    assert _snapshot(tmp_session) == []  # no recent-activity bonus left behind
+    assert tmp_session.get(models.CompanyFeatures, company.id).last_activity_at is None
+    feature_store.rebuild(tmp_session)
+    assert _snapshot(tmp_session) == []
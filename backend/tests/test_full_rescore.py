@@ -0,0 +1,121 @@
+import time
+
+import pytest
+from app import ai_processor, integrations, models, ratelimit, rescoring, security
+from app.main import app
+from fastapi.testclient import TestClient
+
+
+class _Stop(BaseException):
+    """Simulates the process being killed mid-run."""
+
+
+def _seed(session, n):
+    session.execute(
+        models.Company.__table__.insert(),
+        [{"name": f"Firma {i}", "lead_score": (i % 10) / 10} for i in range(n)],
+    )
+    session.commit()
+
+
+def _expected(company):
+    lead = {"name": company.name, "lead_score": company.lead_score}
+    return ai_processor.apply_demo_scoring([lead], deterministic=True)[0]
+
+
+def test_parallel_rescore_matches_inline(tmp_session):
+    _seed(tmp_session, 1200)
+    job = rescoring.rescore_all(tmp_session, workers=2, chunk_size=250)
+    assert job.status == "done" and job.processed == job.total == 1200
+    rows = tmp_session.query(models.Company).all()
+    assert all(c.scored_at is not None for c in rows)
+    for c in rows[::97]:
+        expected = _expected(c)
+        assert c.score == expected["lead_score"]
+        assert c.recommended_action == expected["recommended_action"]
+        assert c.score_model_version == ai_processor.current_scorer().version
+    # nothing left for the incremental rescorer
+    assert rescoring.rescore_pending(tmp_session) == 0
+
+
+def test_rate_limited_rows_are_left_for_the_rescorer(tmp_session, monkeypatch):
+    _seed(tmp_session, 50)
+    integrations._cache.clear()
+    limiter = ratelimit.RateLimiter(0.001, burst=1)
+    monkeypatch.setattr(integrations, "_limiter", limiter)
+    host = integrations._rate_key(integrations._cache_key("Firma 0"))
+    while limiter.try_acquire(host):
+        pass
+
+    job = rescoring.rescore_all(tmp_session, workers=1, enrich_wait=0)
+    assert job.status == "done" and job.processed == 50
+    rows = tmp_session.query(models.Company).all()
+    limited = {
+        c.id
+        for c in rows
+        if integrations._rate_key(integrations._cache_key(c.name)) == host
+    }
+    assert limited and {c.id for c in rows if c.scored_at is None} == limited
+    assert all(c.enriched == 1 for c in rows if c.id not in limited)
+
+    limiter.reset()
+    assert rescoring.rescore_pending(tmp_session, enrich_wait=0) == len(limited)
+    tmp_session.expire_all()
+    assert all(
+        c.enriched == 1 and c.scored_at for c in tmp_session.query(models.Company)
+    )
+
+
+def test_pool_does_not_fork_the_app():
+    pool = rescoring._pool(1)
+    try:
+        # forking a multi-threaded process can deadlock the child
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        pool.shutdown()
+
+
+def test_interrupted_rescore_resumes_from_checkpoint(tmp_session):
+    _seed(tmp_session, 1000)
+    seen = []
+
+    def stop_after_two(job):
+        seen.append(job.last_id)
+        if len(seen) == 2:
+            raise _Stop()
+
+    with pytest.raises(_Stop):
+        rescoring.rescore_all(
+            tmp_session, workers=1, chunk_size=300, progress=stop_after_two
+        )
+    job = rescoring.latest_job(tmp_session)
+    assert job.status == "running" and job.processed == 600
+
+    resumed = []
+    job = rescoring.rescore_all(
+        tmp_session, workers=1, chunk_size=300, progress=lambda j: resumed.append(j.id)
+    )
+    assert job.status == "done" and job.processed == 1000
+    assert len(resumed) == 2  # only the remaining 400 rows were scored
+    assert tmp_session.query(models.RescoreJob).count() == 1
+
+    job = rescoring.rescore_all(tmp_session, workers=1, resume=False)
+    assert job.id != resumed[0] and job.processed == 1000
+
+
+def test_admin_rescore_endpoints():
+    client = TestClient(app)
+    token = security.create_access_token(
+        {"sub": "adminuser", "uid": 1, "role": "admin"}
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/admin/rescore").status_code == 401
+    r = client.post("/admin/rescore", headers=headers)
+    assert r.json()["status"] in ("started", "already running")
+    r = client.get("/admin/rescore", headers=headers)
+    assert r.status_code == 200 and "running" in r.json()
+    deadline = time.monotonic() + 60
+    while rescoring.full_rescore_running() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    job = client.get("/admin/rescore", headers=headers).json()["job"]
+    assert job["status"] == "done"
@@ -2,6 +2,7 @@ from app import integrations
 
 
 def test_opengov_enrich():
+    integrations._limiter.reset()
     enriched = integrations.opengov_enrich("ACME Ltd")
     assert enriched.get("enriched") is True
     assert "official_registry_id" in enriched
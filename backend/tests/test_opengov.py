@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app import integrations, opengov
+
+
+class _Registry(ThreadingHTTPServer):
+    """Local stand-in for the OpenGov batch endpoint."""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.05, fail=False):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        names = json.loads(self.rfile.read(int(self.headers["Content-Length"])))[
+            "names"
+        ]
+        self.server.batches.append(sorted(names))
+        time.sleep(self.server.delay)
+        if self.server.fail:
+            body, status = b"{}", 503
+        else:
+            results = {n: opengov.registry_record(n) for n in names if n != "unknown"}
+            body, status = json.dumps({"results": results}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def registry():
+    server = _Registry()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(registry, monkeypatch):
+    c = opengov.OpenGovClient(registry.url, window=0.05, max_batch=3)
+    monkeypatch.setattr(opengov, "client", c)
+    integrations._cache.clear()
+    integrations._limiter.reset()
+    yield c
+    c.close()
+
+
+def _concurrently(fn, args):
+    with ThreadPoolExecutor(len(args)) as pool:
+        return list(pool.map(fn, args))
+
+
+def test_concurrent_lookups_of_one_name_share_a_request(registry, client):
+    results = _concurrently(lambda _: client.lookup_many(["firma a"]), range(10))
+    assert registry.batches == [["firma a"]]
+    assert all(r == {"firma a": opengov.registry_record("firma a")} for r in results)
+    assert client.coalescer.stats()["coalesced"] == 9
+
+
+def test_distinct_names_are_batched(registry, client):
+    names = [f"firma {i}" for i in range(7)]
+    results = _concurrently(lambda n: client.lookup_many([n]), names)
+    assert sorted(n for batch in registry.batches for n in batch) == names
+    assert max(len(b) for b in registry.batches) == 3  # max_batch
+    assert len(registry.batches) < len(names)
+    assert [r[n] for r, n in zip(results, names)] == [
+        opengov.registry_record(n) for n in names
+    ]
+
+
+def test_unknown_names_and_upstream_errors(registry, client):
+    assert client.lookup_many(["unknown"]) == {"unknown": opengov.NOT_FOUND}
+    registry.fail = True
+    assert client.lookup_many(["firma z"]) == {}
+    assert integrations.opengov_enrich("Firma Z")["reason"] == "upstream_error"
+    assert integrations._cache.get("firma z") is None  # errors are not cached
+    registry.fail = False
+    assert integrations.opengov_enrich("Firma Z") == opengov.registry_record("firma z")
+
+
+def test_scoring_batch_enrichment_goes_upstream_once(registry, client):
+    names = ["Firma A", "firma a", "Firma B", "Firma C"]
+    enriched = integrations.enrich_many(names)
+    assert registry.batches == [["firma a", "firma b", "firma c"]]
+    assert enriched["Firma A"] == enriched["firma a"]
+    integrations.enrich_many(names)
+    assert len(registry.batches) == 1  # served from the cache
+
+
+def test_async_callers_share_the_client(registry, client):
+    async def main():
+        return await asyncio.gather(
+            client.alookup_many(["firma q"]), client.alookup_many(["firma q"])
+        )
+
+    first, second = asyncio.run(main())
+    assert first == second and registry.batches == [["firma q"]]
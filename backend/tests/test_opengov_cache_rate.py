@@ -1,13 +1,14 @@
+import threading
 import time
 
-from app import integrations
+from app import integrations, opengov, ratelimit
 
 
 def test_opengov_cache_and_rate(monkeypatch):
     name = "Test Company"
     # clear caches
     integrations._cache.clear()
-    integrations._buckets.clear()
+    integrations._limiter.reset()
 
     # first call should populate cache and succeed
     r1 = integrations.opengov_enrich(name)
@@ -21,20 +22,137 @@ def test_opengov_cache_and_rate(monkeypatch):
     assert (t1 - t0) < 0.05
 
     # exhaust tokens for the host
-    host = f"opengov:{abs(hash(name)) % 10}"
+    host = integrations._rate_key(integrations._cache_key(name))
     # consume remaining tokens
     while integrations._consume_token(host):
         pass
 
     # next call for a different name on same host should be rate_limited
     # find a different name that maps to the same host mod 10
-    target_host = abs(hash(name)) % 10
     other = None
     for i in range(1000):
         cand = f"{name} {i}"
-        if abs(hash(cand)) % 10 == target_host and cand != name:
+        if integrations._rate_key(integrations._cache_key(cand)) == host:
             other = cand
             break
     assert other is not None
     r3 = integrations.opengov_enrich(other)
     assert r3.get("enriched") is False or r3.get("reason") == "rate_limited"
+
+
+def _drain_refreshes(timeout=5.0):
+    deadline = time.time() + timeout
+    while integrations._refresh["keys"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert not integrations._refresh["keys"]
+
+
+def test_stale_entries_are_served_and_refreshed_once(monkeypatch):
+    from app import opengov
+
+    integrations._cache.clear()
+    integrations._limiter.reset()
+    now = [1_000_000.0]
+    monkeypatch.setattr(integrations, "_now", lambda: now[0])
+    monkeypatch.setattr(integrations, "_SOFT_TTL", 10)
+    monkeypatch.setattr(integrations, "_HARD_TTL", 100)
+    calls = []
+    release = threading.Event()
+
+    def slow_lookup(keys):
+        calls.append(list(keys))
+        release.wait(5)
+        return {k: dict(opengov.registry_record(k), refreshed=len(calls)) for k in keys}
+
+    first = integrations.opengov_enrich("Stale Corp")
+    monkeypatch.setattr(opengov, "lookup_many", slow_lookup)
+
+    now[0] += 50  # between the soft and the hard TTL
+    for _ in range(5):
+        # served at once, while a single refresh is in flight
+        assert integrations.opengov_enrich("Stale Corp") == first
+    release.set()
+    _drain_refreshes()
+    assert len(calls) == 1
+    assert integrations.opengov_enrich("Stale Corp")["refreshed"] == 1
+
+    now[0] += 200  # past the hard TTL: a plain miss
+    assert integrations.opengov_enrich("Stale Corp")["refreshed"] == 2
+    _drain_refreshes()
+
+
+def test_stale_value_beats_rate_limiting(monkeypatch):
+    integrations._cache.clear()
+    integrations._limiter.reset()
+    now = [1_000_000.0]
+    monkeypatch.setattr(integrations, "_now", lambda: now[0])
+    monkeypatch.setattr(integrations, "_SOFT_TTL", 10)
+    monkeypatch.setattr(integrations, "_REFRESH_WAIT", 0)
+    first = integrations.opengov_enrich("Quota Corp")
+    host = integrations._rate_key(integrations._cache_key("Quota Corp"))
+    while integrations._consume_token(host):
+        pass
+    now[0] += 50
+    assert integrations.opengov_enrich("Quota Corp") == first
+    _drain_refreshes()  # the refresh found no quota and gave up
+    assert integrations.opengov_enrich("Quota Corp") == first
+    _drain_refreshes()
+
+
+def test_batch_enrichment_spends_a_token_per_request(monkeypatch):
+    integrations._cache.clear()
+    limiter = ratelimit.RateLimiter(0.001, burst=50)
+    monkeypatch.setattr(integrations, "_limiter", limiter)
+    calls = []
+
+    def lookup(keys):
+        calls.append(sorted(keys))
+        return {k: opengov.registry_record(k) for k in keys}
+
+    monkeypatch.setattr(opengov, "lookup_many", lookup)
+    names = [f"Batch Corp {i}" for i in range(40)]
+    hosts = {n: integrations._rate_key(integrations._cache_key(n)) for n in names}
+    host = hosts[names[0]]
+    same_host = [n for n in names if hosts[n] == host]
+    while integrations._consume_token(host):
+        pass
+
+    enriched = integrations.enrich_many(names)
+    # one upstream request for the whole batch, one token per other host
+    assert len(calls) == 1
+    for other in set(hosts.values()) - {host}:
+        assert round(limiter.available(other)) == 49
+    # the exhausted host's names are rate limited: not sent, not cached
+    assert {n for n, r in enriched.items() if r.get("enriched")} == set(names) - set(
+        same_host
+    )
+    assert all(enriched[n] == integrations.RATE_LIMITED for n in same_host)
+    assert all(integrations.is_transient(enriched[n]) for n in same_host)
+    assert not set(calls[0]) & {integrations._cache_key(n) for n in same_host}
+    assert integrations._cache.get(integrations._cache_key(same_host[0])) is None
+
+
+def test_batch_enrichment_can_wait_for_quota(monkeypatch):
+    integrations._cache.clear()
+    limiter = ratelimit.RateLimiter(20, burst=1)
+    monkeypatch.setattr(integrations, "_limiter", limiter)
+    host = integrations._rate_key(integrations._cache_key("Wait Corp"))
+    while integrations._consume_token(host):
+        pass
+    assert integrations.enrich_many(["Wait Corp"]) == {
+        "Wait Corp": integrations.RATE_LIMITED
+    }
+    assert integrations.enrich_many(["Wait Corp"], wait=1)["Wait Corp"]["enriched"]
+
+
+def test_failed_batch_lookup_is_transient(monkeypatch):
+    integrations._cache.clear()
+    integrations._limiter.reset()
+
+    def fail(keys):
+        raise RuntimeError("registry down")
+
+    monkeypatch.setattr(opengov, "lookup_many", fail)
+    record = integrations.enrich_many(["Down Corp"])["Down Corp"]
+    assert record == integrations.UPSTREAM_ERROR and integrations.is_transient(record)
+    assert not integrations.is_transient(opengov.NOT_FOUND)
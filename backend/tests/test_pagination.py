@@ -0,0 +1,95 @@
+import pytest
+from app import crud, models, pagination
+from app.main import app
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+
+@pytest.fixture
+def session(tmp_session):
+    for i, score in enumerate([0.5, 0.1, 0.5, None, 0.9, 0.5, 0.1]):
+        tmp_session.add(models.Company(name=f"Company {i % 3}", lead_score=score))
+    tmp_session.commit()
+    return tmp_session
+
+
+def _walk(session, **kwargs):
+    seen, cursor = [], None
+    while True:
+        rows, cursor = crud.get_companies_page(
+            session, cursor=cursor, limit=3, **kwargs
+        )
+        seen.extend(rows)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize(
+    "sort,order",
+    [
+        ("id", "asc"),
+        ("id", "desc"),
+        ("name", "asc"),
+        ("name", "desc"),
+        ("lead_score", "asc"),
+        ("lead_score", "desc"),
+    ],
+)
+def test_keyset_walk_is_complete_and_ordered(session, sort, order):
+    session.add(models.Company(name=None, lead_score=0.0))
+    session.commit()
+    rows = _walk(session, sort=sort, order=order)
+    _, key = crud.COMPANY_SORTS[sort]
+    keys = [(key(c), c.id) for c in rows]
+    assert len(keys) == 8 and len(set(keys)) == 8
+    assert keys == sorted(keys, reverse=order == "desc")
+
+
+def _plan(session, stmt):
+    sql = stmt.compile(
+        dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+    return " | ".join(r[-1] for r in rows)
+
+
+@pytest.mark.parametrize("sort", ["name", "lead_score"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_sorted_pages_read_in_index_order(session, sort, order):
+    sort_expr, _, sort_id = crud.company_sort(sort, order)
+    _, cursor = crud.get_companies_page(session, sort=sort, order=order, limit=2)
+    for c in (None, cursor):
+        stmt = pagination.apply_keyset(
+            select(models.Company),
+            sort_expr,
+            models.Company.id,
+            sort_id,
+            cursor=c,
+            limit=2,
+            descending=order == "desc",
+        )
+        plan = _plan(session, stmt)
+        assert f"USING INDEX ix_companies_{sort}_sort" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_cursor_bound_to_sort(session):
+    _, cursor = crud.get_companies_page(session, sort="name", limit=2)
+    with pytest.raises(pagination.InvalidCursor):
+        crud.get_companies_page(session, sort="id", cursor=cursor)
+
+
+def test_limit_is_clamped():
+    assert pagination.clamp_limit(10**9) == pagination.MAX_PAGE_SIZE
+    assert pagination.clamp_limit(None) == pagination.DEFAULT_PAGE_SIZE
+
+
+def test_companies_endpoint_pagination_params():
+    client = TestClient(app)
+    r = client.get("/companies", params={"sort": "lead_score", "limit": 1})
+    assert r.status_code == 200
+    assert "next_cursor" in r.json()
+    assert client.get("/companies", params={"cursor": "garbage"}).status_code == 400
+    bad_id = pagination.encode_cursor("id:asc", [1, [2]])
+    assert client.get("/companies", params={"cursor": bad_id}).status_code == 400
+    assert client.get("/companies", params={"sort": "nope"}).status_code == 400
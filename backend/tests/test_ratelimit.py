@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+from app import ratelimit
+
+
+def test_fractional_refill_keeps_configured_throughput():
+    now = [0.0]
+    limiter = ratelimit.RateLimiter(rate=2.5, burst=1, clock=lambda: now[0])
+    granted = 0
+    for _ in range(1000):  # 10 s in 10 ms steps
+        granted += limiter.try_acquire("h")
+        now[0] += 0.01
+    # the old int(delta * rate) refill lost the fractions (and reset `last`)
+    assert granted in (25, 26)
+
+
+def test_burst_then_denied_until_refill():
+    now = [100.0]
+    limiter = ratelimit.RateLimiter(rate=1, burst=5, clock=lambda: now[0])
+    assert [limiter.try_acquire("h") for _ in range(6)] == [True] * 5 + [False]
+    now[0] += 0.5
+    assert not limiter.try_acquire("h")
+    assert limiter.available("h") == pytest.approx(0.5)
+    now[0] += 0.5
+    assert limiter.try_acquire("h")
+    assert limiter.try_acquire("other")  # keys are independent
+    with pytest.raises(ValueError):
+        limiter.try_acquire("h", cost=6)
+
+
+def test_idle_keys_are_evicted():
+    now = [0.0]
+    limiter = ratelimit.RateLimiter(rate=1, burst=2, clock=lambda: now[0])
+    for i in range(10):
+        limiter.try_acquire(f"k{i}")
+    limiter.try_acquire("busy", cost=2)
+    now[0] = 1.5
+    assert limiter.evict_idle() == 10
+    assert len(limiter) == 1
+    assert not limiter.try_acquire("busy", cost=2)
+
+
+def test_acquire_waits_in_order_and_honours_timeout():
+    limiter = ratelimit.RateLimiter(rate=20, burst=1)
+
+    async def main():
+        assert await limiter.acquire("h")
+        t0 = time.monotonic()
+        first, second = await asyncio.gather(
+            limiter.acquire("h", timeout=1), limiter.acquire("h", timeout=1)
+        )
+        elapsed = time.monotonic() - t0
+        # nothing available within 10 ms, and nothing is reserved
+        too_soon = await limiter.acquire("h", timeout=0.01)
+        return first, second, elapsed, too_soon
+
+    first, second, elapsed, too_soon = asyncio.run(main())
+    assert first and second
+    assert 0.09 <= elapsed < 0.5  # two tokens at 20/s
+    assert not too_soon
+
+
+def test_sqlite_mode_shares_the_quota(tmp_path):
+    path = str(tmp_path / "limits.db")
+    now = [1000.0]
+    worker_a = ratelimit.RateLimiter(1, burst=3, path=path, clock=lambda: now[0])
+    worker_b = ratelimit.RateLimiter(1, burst=3, path=path, clock=lambda: now[0])
+    assert worker_a.try_acquire("opengov", cost=2)
+    assert worker_b.try_acquire("opengov")
+    assert not worker_a.try_acquire("opengov")
+    now[0] += 1
+    assert worker_a.wait("opengov", timeout=0)
+    assert not worker_b.try_acquire("opengov")
+    now[0] += 10
+    assert worker_b.evict_idle() == 1 and len(worker_a) == 0
@@ -0,0 +1,69 @@
+import pytest
+from app import columnar, models, reporting
+from app.main import app
+from fastapi.testclient import TestClient
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def _seed(session, n=2500):
+    session.add_all(
+        models.Company(name=f"Firma {i}", lead_score=i / 7) for i in range(n)
+    )
+    session.commit()
+    session.execute(
+        models.Company.__table__.insert().values(name="Bez skóre", lead_score=None)
+    )
+    session.commit()
+
+
+def test_arrow_stream_is_typed_and_batched(tmp_session):
+    _seed(tmp_session)
+    chunks = list(
+        columnar.iter_arrow(
+            columnar.lead_schema(),
+            map(reporting._lead_values, reporting.iter_companies(tmp_session)),
+            batch_rows=1000,
+        )
+    )
+    assert len(chunks) > 1
+    table = pa.ipc.open_stream(b"".join(chunks)).read_all()
+    assert table.num_rows == 2501
+    assert table.schema.field("id").type == pa.int64()
+    assert table.schema.field("lead_score").type == pa.float64()
+    scores = table.column("lead_score").to_pylist()
+    assert scores[3] == 3 / 7  # full float precision, no text round-trip
+    assert scores[-1] is None
+
+
+def test_parquet_export_applies_filters(tmp_session):
+    _seed(tmp_session)
+    body = b"".join(
+        reporting.iter_leads_columnar(tmp_session, "parquet", min_score=300)
+    )
+    table = pq.read_table(pa.BufferReader(body))
+    assert table.num_rows == 2500 - 2100
+    assert min(table.column("lead_score").to_pylist()) >= 300
+
+
+def test_columnar_endpoints():
+    client = TestClient(app)
+    client.post("/leads", json={"name": "Arrow Příklad", "lead_score": 4.25})
+    r = client.get("/reports/leads.arrow", params={"name": "arrow příklad"})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == columnar.ARROW_MEDIA_TYPE
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.num_rows >= 1
+    assert table.column("lead_score").to_pylist()[0] == 4.25
+
+    r = client.get("/reports/companies.parquet")
+    assert r.status_code == 200
+    table = pq.read_table(pa.BufferReader(r.content))
+    assert table.column_names == reporting.COMPANY_COLUMNS
+
+
+def test_columnar_unavailable(monkeypatch):
+    monkeypatch.setattr(columnar, "pa", None)
+    r = TestClient(app).get("/reports/leads.parquet")
+    assert r.status_code == 501
@@ -0,0 +1,64 @@
+from app import models, reporting
+
+
+def _seed(session):
+    session.add_all(
+        [
+            models.Company(name="Alfa Stavby", lead_score=9),
+            models.Company(name="ALFA Řemesla", lead_score=3),
+            models.Company(name="Beta 100%_sleva", lead_score=5),
+            models.Company(name="Čistírna Gama", lead_score=None),
+        ]
+    )
+    session.commit()
+
+
+def _plan(session, stmt):
+    sql = stmt.compile(
+        dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True}
+    )
+    rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+    return " | ".join(r[-1] for r in rows)
+
+
+def test_filters_run_in_sql(tmp_session):
+    _seed(tmp_session)
+
+    def names(**kw):
+        return sorted(c.name for c in reporting.iter_companies(tmp_session, **kw))
+
+    assert names(name_prefix="alfa") == ["ALFA Řemesla", "Alfa Stavby"]
+    assert names(name_prefix="čIST") == ["Čistírna Gama"]
+    assert names(name_contains="řemesla") == ["ALFA Řemesla"]
+    # LIKE wildcards in the search term are matched literally
+    assert names(name_contains="100%_") == ["Beta 100%_sleva"]
+    assert names(name_contains="%") == ["Beta 100%_sleva"]
+    assert names(min_score=5) == ["Alfa Stavby", "Beta 100%_sleva"]
+    # a missing score counts as 0
+    assert names(max_score=3) == ["ALFA Řemesla", "Čistírna Gama"]
+    assert names(min_score=1, max_score=6) == ["ALFA Řemesla", "Beta 100%_sleva"]
+    assert names(name_prefix="alfa", min_score=5) == ["Alfa Stavby"]
+
+    page, cursor = reporting._filter_companies_page(tmp_session, min_score=3, limit=2)
+    assert len(page) == 2 and cursor  # the page is filled by SQL, not trimmed
+    rest, cursor = reporting._filter_companies_page(
+        tmp_session, min_score=3, cursor=cursor, limit=2
+    )
+    assert [c.name for c in rest] == ["Beta 100%_sleva"] and cursor is None
+
+
+def test_filters_use_indexes(tmp_session):
+    _seed(tmp_session)
+
+    plan = _plan(tmp_session, reporting.companies_export_query(min_score=5))
+    assert "USING INDEX ix_companies_lead_score" in plan
+    assert "TEMP B-TREE" not in plan
+
+    plan = _plan(
+        tmp_session, reporting.companies_export_query(min_score=1, max_score=6)
+    )
+    assert "USING INDEX ix_companies_lead_score" in plan
+
+    plan = _plan(tmp_session, reporting.companies_export_query(name_prefix="Alfa"))
+    assert "USING INDEX ix_companies_name_key" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,35 @@
+import json
+
+from app import models, reporting
+from app.main import app
+from fastapi.testclient import TestClient
+
+
+def test_exports_stream_without_row_cap(tmp_session):
+    tmp_session.add_all(
+        models.Company(name=f"Firma {i}", lead_score=i % 10) for i in range(2500)
+    )
+    tmp_session.commit()
+
+    chunks = list(reporting.iter_leads_csv(tmp_session))
+    assert len(chunks) > 1  # encoded incrementally, not as one buffer
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert lines[0] == "id,name,lead_score,description"
+    assert len(lines) == 2501
+
+    filtered = list(reporting.iter_companies(tmp_session, min_score=9))
+    assert len(filtered) == 250
+
+
+def test_ndjson_endpoints():
+    client = TestClient(app)
+    client.post("/leads", json={"name": "Ndjson Příklad", "lead_score": 4})
+    r = client.get("/reports/leads.ndjson", params={"name": "ndjson"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert rows and all("ndjson" in row["name"].lower() for row in rows)
+    assert set(rows[0]) == {"id", "name", "lead_score", "description"}
+
+    r = client.get("/reports/companies.ndjson")
+    assert r.status_code == 200
@@ -0,0 +1,98 @@
+from app import ai_processor, crud, integrations, models, ratelimit, rescoring
+from sqlalchemy import text
+
+
+def _expected(name, lead_score):
+    lead = {"name": name, "lead_score": lead_score}
+    return ai_processor.apply_demo_scoring([lead], deterministic=True)[0]
+
+
+def test_rescores_only_changed_rows(tmp_session):
+    for i in range(5):
+        crud.create_company(tmp_session, name=f"Firma {i}", lead_score=i / 10)
+    assert rescoring.rescore_pending(tmp_session, batch_size=2) == 5
+    assert rescoring.rescore_pending(tmp_session) == 0  # nothing changed
+
+    company = tmp_session.query(models.Company).filter_by(name="Firma 3").one()
+    stored = tmp_session.query(models.Company).filter_by(name="Firma 1").one()
+    assert stored.score == _expected("Firma 1", 0.1)["lead_score"]
+    assert stored.recommended_action == _expected("Firma 1", 0.1)["recommended_action"]
+    assert stored.enriched == 1 and stored.official_registry_id.startswith("OG-")
+
+    # a description edit is not a scoring input
+    company.description = "jen popis"
+    tmp_session.commit()
+    assert company.scored_at is not None
+    # an input rewritten with the same value is re-stamped, not rescored
+    company.lead_score = 0.3
+    tmp_session.commit()
+    assert company.scored_at is None
+    assert rescoring.rescore_pending(tmp_session) == 0
+    tmp_session.refresh(company)
+    assert company.scored_at is not None
+
+    company.lead_score = 0.9
+    tmp_session.commit()
+    assert rescoring.rescore_pending(tmp_session) == 1
+    tmp_session.refresh(company)
+    assert company.score == _expected("Firma 3", 0.9)["lead_score"]
+
+
+def test_bulk_upsert_marks_rows_for_rescoring(tmp_session):
+    crud.bulk_upsert_leads(tmp_session, [{"name": "Bulk a.s.", "lead_score": 0.2}])
+    assert rescoring.rescore_pending(tmp_session) == 1
+    crud.bulk_upsert_leads(tmp_session, [{"name": "Bulk a.s.", "lead_score": 0.7}])
+    assert rescoring.rescore_pending(tmp_session) == 1
+    company = tmp_session.query(models.Company).one()
+    assert company.score == _expected("Bulk a.s.", 0.7)["lead_score"]
+
+
+def test_concurrent_input_change_is_not_overwritten(tmp_session, monkeypatch):
+    crud.create_company(tmp_session, name="Race s.r.o.", lead_score=0.1)
+    real = rescoring.compute_scores
+
+    def write_while_scoring(inputs, scorer=None, **kwargs):
+        with tmp_session.get_bind().begin() as conn:
+            conn.execute(text("UPDATE companies SET lead_score = 0.8"))
+        return real(inputs, scorer, **kwargs)
+
+    monkeypatch.setattr(rescoring, "compute_scores", write_while_scoring)
+    assert rescoring.rescore_pending(tmp_session) == 0  # guarded update skipped
+    monkeypatch.setattr(rescoring, "compute_scores", real)
+    assert rescoring.rescore_pending(tmp_session) == 1
+    company = tmp_session.query(models.Company).one()
+    assert company.score == _expected("Race s.r.o.", 0.8)["lead_score"]
+
+
+def test_views_read_stored_scores(tmp_session):
+    crud.create_company(tmp_session, name="Pohled s.r.o.", lead_score=0.5)
+    company = tmp_session.query(models.Company).one()
+    on_the_fly, info = rescoring.company_views([company])
+    assert info["model_version"] == on_the_fly[0]["model_version"]
+    rescoring.rescore_pending(tmp_session)
+    tmp_session.refresh(company)
+    assert rescoring.company_views([company])[0] == on_the_fly
+    assert on_the_fly[0]["lead_score"] == _expected("Pohled s.r.o.", 0.5)["lead_score"]
+
+
+def _drain(limiter, name):
+    host = integrations._rate_key(integrations._cache_key(name))
+    while limiter.try_acquire(host):
+        pass
+
+
+def test_rate_limited_enrichment_is_retried(tmp_session, monkeypatch):
+    integrations._cache.clear()
+    limiter = ratelimit.RateLimiter(0.001, burst=1)
+    monkeypatch.setattr(integrations, "_limiter", limiter)
+    crud.create_company(tmp_session, name="Kvóta s.r.o.", lead_score=0.4)
+    _drain(limiter, "Kvóta s.r.o.")
+
+    assert rescoring.rescore_pending(tmp_session, enrich_wait=0) == 0
+    company = tmp_session.query(models.Company).one()
+    assert company.scored_at is None and company.enriched in (None, 0)
+
+    limiter.reset()
+    assert rescoring.rescore_pending(tmp_session, enrich_wait=0) == 1
+    tmp_session.refresh(company)
+    assert company.scored_at is not None and company.enriched == 1
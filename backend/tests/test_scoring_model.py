@@ -0,0 +1,123 @@
+import json
+import os
+
+import pytest
+from app import ai_processor, crud, models, rescoring
+from app.main import app
+from fastapi.testclient import TestClient
+
+LEADS = [
+    {"name": "Model Test s.r.o.", "email": "a@b.cz", "lead_score": 0.4},
+    {"name": "Krátký", "lead_score": 0.9},
+    {"company": "Bez skóre a.s."},
+]
+
+
+def _write_model(path, version, coef, intercept=-1.0, link="logistic"):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(
+            {"version": version, "link": link, "intercept": intercept, "coef": coef},
+            fh,
+        )
+    os.replace(tmp, path)  # atomic swap, as a deploy would do
+
+
+def test_linear_model_vectorized_matches_scalar(monkeypatch):
+    scorer = ai_processor.LinearModelScorer(
+        {"lead_score": 3.0, "has_email": 1.0, "long_name": 0.5, "name_len": -0.01},
+        intercept=-1.5,
+        version="lr-test",
+    )
+    features = [ai_processor._features(lead) for lead in LEADS]
+    vectorized = scorer.predict(features)
+    assert vectorized == [scorer._predict_one(*f) for f in features]
+    assert all(0.0 <= s <= 1.0 for s in vectorized)
+    monkeypatch.setattr(ai_processor, "np", None)
+    assert scorer.predict(features) == vectorized
+
+    with pytest.raises(ValueError):
+        ai_processor.LinearModelScorer({"revenue": 1.0})
+
+
+def test_scorer_requires_predict():
+    class Incomplete(ai_processor.Scorer):
+        version = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_npz_model(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = str(tmp_path / "model.npz")
+    np.savez(
+        path,
+        features=np.array(["lead_score", "has_email"]),
+        coef=np.array([2.0, 1.0]),
+        intercept=np.array(-1.0),
+        version=np.array("npz-1"),
+    )
+    scorer = ai_processor.load_model(path)
+    assert scorer.version == "npz-1"
+    json_scorer = ai_processor.LinearModelScorer(
+        {"lead_score": 2.0, "has_email": 1.0}, intercept=-1.0
+    )
+    features = [ai_processor._features(lead) for lead in LEADS]
+    assert scorer.predict(features) == json_scorer.predict(features)
+
+
+def test_registry_hot_swaps_and_survives_bad_files(tmp_path):
+    path = str(tmp_path / "model.json")
+    now = [0.0]
+    registry = ai_processor.ModelRegistry(path, check_interval=5, clock=lambda: now[0])
+    # no file yet: the built-in heuristic
+    assert registry.current().version == ai_processor.HeuristicScorer.version
+
+    _write_model(path, "lr-1", {"lead_score": 2.0})
+    now[0] = 5
+    first = registry.current()
+    assert first.version == "lr-1"
+
+    _write_model(path, "lr-2", {"lead_score": 4.0})
+    os.utime(path, ns=(1, 10**18))  # make sure the mtime changes
+    assert registry.current() is first  # not re-checked before the interval
+    now[0] = 10
+    assert registry.current().version == "lr-2"
+
+    with open(path, "w") as fh:
+        fh.write("{not json")
+    os.utime(path, ns=(1, 2 * 10**18))
+    now[0] = 15
+    assert registry.current().version == "lr-2"  # kept the last good model
+
+
+def test_model_change_triggers_rescoring(tmp_session, monkeypatch):
+    crud.create_company(tmp_session, name="Firma A", lead_score=0.2)
+    crud.create_company(tmp_session, name="Firma B", lead_score=0.7)
+    assert rescoring.rescore_pending(tmp_session) == 2
+    assert rescoring.rescore_pending(tmp_session) == 0
+
+    scorer = ai_processor.LinearModelScorer({"lead_score": 5.0}, -2.0, version="lr-9")
+    monkeypatch.setattr(ai_processor.registry, "_scorer", scorer)
+    assert rescoring.rescore_pending(tmp_session) == 2
+    stored = tmp_session.query(models.Company).order_by(models.Company.id).all()
+    assert {c.score_model_version for c in stored} == {"lr-9"}
+    assert [c.score for c in stored] == scorer.predict(
+        [ai_processor._features(rescoring.score_inputs(c)) for c in stored]
+    )
+
+
+def test_responses_report_model_and_latency():
+    client = TestClient(app)
+    r = client.post("/mobile/leads", json={"name": "Latence s.r.o."})
+    scoring = r.json()["scoring"]
+    assert scoring["model_version"] == ai_processor.current_scorer().version
+    assert scoring["latency_ms"] >= 0
+
+    r = client.post("/mobile/sync", json={"leads": LEADS})
+    assert r.json()["scoring"]["model_version"]
+
+    body = client.get("/companies", params={"limit": 3}).json()
+    assert body["scoring"]["model_version"] == ai_processor.current_scorer().version
+    assert all("model_version" in c for c in body["companies"])
@@ -0,0 +1,61 @@
+from app import models, search
+from app.main import app
+from fastapi.testclient import TestClient
+
+
+def test_fts_ranks_and_folds_diacritics(tmp_session):
+    tmp_session.add_all(
+        [
+            models.Company(name="Čistírna Oděvů Brno", description="praní"),
+            models.Company(name="Pekárna Novák", description="čistírna koberců"),
+            models.Company(name="Stavby Dvořák", description="zednické práce"),
+        ]
+    )
+    tmp_session.commit()
+
+    hits, _ = search.search_companies(tmp_session, "cistirna")
+    # name hits outrank description hits
+    assert [h["name"] for h in hits] == ["Čistírna Oděvů Brno", "Pekárna Novák"]
+    hits, _ = search.search_companies(tmp_session, "DVOŘ")  # prefix, any case
+    assert [h["name"] for h in hits] == ["Stavby Dvořák"]
+    hits, _ = search.search_companies(tmp_session, 'prace "OR* -(')  # no FTS syntax
+    assert hits == []
+
+    # triggers keep the index in sync with updates and deletes
+    company = tmp_session.query(models.Company).filter_by(name="Stavby Dvořák").one()
+    company.name = "Stavby Horák"
+    tmp_session.commit()
+    assert search.search_companies(tmp_session, "dvorak")[0] == []
+    assert len(search.search_companies(tmp_session, "horak")[0]) == 1
+    tmp_session.delete(company)
+    tmp_session.commit()
+    assert search.search_companies(tmp_session, "horak")[0] == []
+
+
+def test_search_pages_with_cursor(tmp_session):
+    tmp_session.add_all(
+        models.Company(name=f"Firma Žlutá {i}", description="ovoce " * (i % 3))
+        for i in range(25)
+    )
+    tmp_session.commit()
+
+    seen, cursor = [], None
+    while True:
+        hits, cursor = search.search_companies(
+            tmp_session, "zluta", cursor=cursor, limit=10
+        )
+        seen.extend(h["id"] for h in hits)
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 25
+
+
+def test_search_endpoint():
+    client = TestClient(app)
+    client.post("/leads", json={"name": "Vyhledávací Šťastná s.r.o."})
+    r = client.get("/search", params={"q": "stastna"})
+    assert r.status_code == 200
+    body = r.json()
+    assert any(h["name"] == "Vyhledávací Šťastná s.r.o." for h in body["results"])
+    assert "next_cursor" in body
+    assert client.get("/search", params={"q": "  "}).status_code == 400
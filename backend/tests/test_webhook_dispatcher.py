@@ -1,51 +1,513 @@
-from app import integrations, models
+import asyncio
+import datetime
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+from app import integrations, models, webhooks
 from app.integrations import SessionLocal
+from sqlalchemy import text
 
 
-def test_enqueue_and_process(monkeypatch):
-    # create a local db session
-    db = SessionLocal()
+class _Receiver(ThreadingHTTPServer):
+    """Local stand-in webhook receiver."""
 
-    # ensure clean queue
-    db.query(models.WebhookQueue).delete()
-    db.commit()
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, statuses=(), reply=None, retry_after=None):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay = delay
+        self.statuses = list(statuses)  # served first, then 200s
+        self.reply = reply  # parsed body -> response body (dict)
+        self.retry_after = retry_after  # Retry-After sent with errors
+        self.requests = 0
+        self.bodies = []
+        self.headers = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        reply = json.dumps(server.reply(json.loads(body))) if server.reply else ""
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            status = server.statuses.pop(0) if server.statuses else 200
+            server.requests += 1
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+            if status == 200:
+                server.bodies.append(json.loads(body))
+                server.headers.append(self.headers)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(reply)))
+        if status != 200 and server.retry_after is not None:
+            self.send_header("Retry-After", str(server.retry_after))
+        self.end_headers()
+        self.wfile.write(reply.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receivers():
+    started = []
+
+    def start(**kwargs):
+        server = _Receiver(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        started.append(server)
+        return server
 
-    # monkeypatch httpx.post to fail once then succeed
-    calls = {"count": 0}
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
 
-    def fake_post(url, json=None, timeout=None):
-        class R:
-            def __init__(self, status):
-                self.status_code = status
 
-        calls["count"] += 1
-        if calls["count"] == 1:
-            raise Exception("network error")
-        return R(200)
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    session.query(models.WebhookQueue).delete()
+    session.query(models.WebhookHistory).delete()
+    session.query(models.WebhookDestination).delete()
+    session.commit()
+    yield session
+    session.query(models.WebhookQueue).delete()
+    session.query(models.WebhookHistory).delete()
+    session.query(models.WebhookDestination).delete()
+    session.commit()
+    session.close()
 
-    monkeypatch.setattr("httpx.post", fake_post)
 
-    # enqueue a webhook
-    w = integrations.enqueue_webhook(db, "http://example.invalid/webhook", {"x": 1})
-    assert w.id is not None
+def test_enqueue_and_process(db, receivers, monkeypatch):
+    monkeypatch.setattr(webhooks, "_jitter", lambda low, high: high)
+    receiver = receivers(statuses=[500])
+    w = integrations.enqueue_webhook(db, receiver.url, {"x": 1})
+    wid = w.id
+    assert wid is not None
 
-    # first process - fake_post will raise and we should increase attempts
+    # first pass: the receiver fails, the row is rescheduled with backoff
     processed = integrations.process_queue_once(db=db, max_attempts=3)
     assert processed == 0
-    row = db.query(models.WebhookQueue).filter(models.WebhookQueue.id == w.id).first()
-    assert row.attempts == 1
+    db.expire_all()
+    row = db.get(models.WebhookQueue, wid)
+    assert row.attempts == 1 and row.last_error == "HTTP 500"
+    assert row.next_attempt_at > datetime.datetime.utcnow()
 
-    # make row due immediately (fast-forward backoff) and process again - should succeed
-    import datetime
-
-    row = db.query(models.WebhookQueue).filter(models.WebhookQueue.id == w.id).first()
+    # make row due immediately (fast-forward backoff) and process again
     row.next_attempt_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
-    db.add(row)
     db.commit()
     processed = integrations.process_queue_once(db=db, max_attempts=3)
     assert processed == 1
+    assert receiver.bodies == [{"x": 1}]
+    assert db.query(models.WebhookQueue).count() == 0
+    (entry,) = db.query(models.WebhookHistory).all()
+    assert (entry.webhook_id, entry.status, entry.attempts) == (wid, "delivered", 2)
+    assert entry.payload == '{"x": 1}' and entry.finished_at is not None
+
+
+def test_dead_letter_after_max_attempts(db, receivers):
+    receiver = receivers(statuses=[503, 503])
+    wid = integrations.enqueue_webhook(db, receiver.url, {"x": 2}).id
+    for _ in range(2):
+        db.query(models.WebhookQueue).update(
+            {"next_attempt_at": datetime.datetime.utcnow()}
+        )
+        db.commit()
+        integrations.process_queue_once(db=db, max_attempts=2)
+    # dead letters leave the queue for webhook_history
+    assert db.query(models.WebhookQueue).count() == 0
+    (entry,) = db.query(models.WebhookHistory).all()
+    assert (entry.webhook_id, entry.status, entry.attempts) == (wid, "dead", 2)
+    assert entry.last_error == "HTTP 503;max_attempts"
+
+
+def test_slow_host_does_not_stall_the_queue(db, receivers):
+    slow = receivers(delay=0.3)
+    fast = receivers()
+    for i in range(4):
+        integrations.enqueue_webhook(db, slow.url, {"slow": i})
+    for i in range(40):
+        integrations.enqueue_webhook(db, fast.url, {"fast": i})
+
+    async def main():
+        dispatcher = webhooks.Dispatcher(concurrency=8, per_host=2)
+        try:
+            t0 = time.monotonic()
+            delivered = await webhooks.process_queue_once(dispatcher)
+            return delivered, time.monotonic() - t0
+        finally:
+            await dispatcher.aclose()
+
+    delivered, elapsed = asyncio.run(main())
+    assert delivered == 44
+    assert len(fast.bodies) == 40 and len(slow.bodies) == 4
+    assert slow.peak <= 2 and fast.peak <= 2  # per-host limit
+    # the slow host's 4 deliveries run 2 at a time; the fast ones alongside
+    assert elapsed < 0.6 + 0.5
+
+
+def _enqueue_many(db, url, n):
+    for i in range(n):
+        integrations.enqueue_webhook(db, url, {"n": i})
+
+
+def test_concurrent_workers_claim_disjoint_batches(db):
+    _enqueue_many(db, "http://receiver.invalid/hook", 30)
+    claims = []
 
-    # cleanup
-    db.query(models.WebhookQueue).delete()
+    def worker():
+        session = SessionLocal()
+        try:
+            claims.append(webhooks.claim_due(session, limit=10)[1])
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ids = [d.id for batch in claims for d in batch]
+    assert len(ids) == len(set(ids)) == 30  # every row once, none twice
+    assert sorted(len(batch) for batch in claims) == [0, 10, 10, 10]
+
+
+def test_expired_leases_are_reclaimed(db, receivers):
+    receiver = receivers()
+    _enqueue_many(db, receiver.url, 3)
+    crashed, claimed = webhooks.claim_due(db, lease=30)
+    assert len(claimed) == 3
+    # the crashed worker's rows are invisible until the lease runs out
+    assert webhooks.claim_due(db)[1] == []
+    later = datetime.datetime.utcnow() + datetime.timedelta(seconds=31)
+    claim, reclaimed = webhooks.claim_due(db, now=later)
+    assert [d.id for d in reclaimed] == [d.id for d in claimed]
+    # the late worker finishing can't clobber the new owner's results
+    assert webhooks.record_results(db, crashed, claimed, [None] * 3) == 0
+    assert webhooks.record_results(db, claim, reclaimed, ["HTTP 500"] * 3) == 0
+    db.expire_all()
+    rows = db.query(models.WebhookQueue).all()
+    assert {(r.attempts, r.claimed_by, r.lease_until) for r in rows} == {
+        (1, None, None)
+    }
+
+
+def test_postgres_claims_skip_locked_rows():
+    from sqlalchemy.dialects import postgresql
+
+    stmt = webhooks._candidates(datetime.datetime.utcnow(), 10, "postgresql")
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in sql and "LIMIT" in sql
+
+
+def test_worker_pass_drains_in_bounded_batches(db, receivers):
+    receiver = receivers()
+    _enqueue_many(db, receiver.url, 25)
+
+    async def main():
+        dispatcher = webhooks.Dispatcher()
+        try:
+            return await webhooks.process_queue_once(dispatcher, batch_size=10)
+        finally:
+            await dispatcher.aclose()
+
+    assert asyncio.run(main()) == 25
+    assert len(receiver.bodies) == 25
+
+
+def test_history_is_pruned_by_age_in_chunks(db):
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=40)
+    db.execute(
+        models.WebhookHistory.__table__.insert(),
+        [
+            {
+                "webhook_id": i,
+                "url": "http://receiver.invalid/hook",
+                "payload": "{}",
+                "status": "delivered",
+                "finished_at": old if i < 7 else datetime.datetime.utcnow(),
+            }
+            for i in range(10)
+        ],
+    )
+    db.commit()
+    assert webhooks.prune_history(db, retention_days=30, chunk=3) == 7
+    assert sorted(h.webhook_id for h in db.query(models.WebhookHistory)) == [7, 8, 9]
+
+
+def test_due_scan_uses_the_queue_index(db):
+    stmt = webhooks._candidates(datetime.datetime.utcnow(), 10, "sqlite")
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    plan = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_webhook_queue_due" in details
+    assert "TEMP B-TREE" not in details  # no sort: the index gives claim order
+
+
+def test_idle_worker_sleeps_until_the_next_row_is_due(db):
+    now = datetime.datetime.utcnow()
+    assert webhooks.idle_seconds(now=now) == webhooks.POLL_SECONDS  # empty queue
+    w = integrations.enqueue_webhook(db, "http://receiver.invalid/hook", {})
+    w.next_attempt_at = now + datetime.timedelta(seconds=3)
+    db.commit()
+    assert webhooks.idle_seconds(now=now) == pytest.approx(3)
+    # a leased row is not claimable before its lease runs out
+    w.lease_until = now + datetime.timedelta(seconds=7)
     db.commit()
-    db.close()
+    assert webhooks.idle_seconds(now=now) == pytest.approx(7)
+
+
+def test_enqueue_wakes_the_worker(db, receivers):
+    from app.main import app
+    from fastapi.testclient import TestClient
+
+    receiver = receivers()
+    with TestClient(app) as client:
+        time.sleep(0.2)  # let the worker finish its first pass and go idle
+        t0 = time.monotonic()
+        r = client.post("/webhook/enqueue", json={"url": receiver.url, "payload": {}})
+        assert r.json()["status"] == "ok"
+        while not receiver.bodies and time.monotonic() - t0 < 5:
+            time.sleep(0.005)
+        latency = time.monotonic() - t0
+    assert receiver.bodies == [{}]
+    assert latency < 0.5  # not the next poll (BBH_WEBHOOK_POLL)
+
+
+def _drain(**dispatcher_kwargs):
+    async def main():
+        dispatcher = webhooks.Dispatcher(**dispatcher_kwargs)
+        try:
+            return await webhooks.process_queue_once(dispatcher), dispatcher.stats()
+        finally:
+            await dispatcher.aclose()
+
+    return asyncio.run(main())
+
+
+def test_batched_destination_gets_one_post_per_batch(db, receivers):
+    receiver = receivers()
+    other = receivers()
+    db.add(
+        models.WebhookDestination(url=receiver.url, batch_size=10, gzip_min_bytes=100)
+    )
+    db.commit()
+    _enqueue_many(db, receiver.url, 25)
+    _enqueue_many(db, other.url, 2)
+
+    delivered, stats = _drain()
+    assert delivered == 27 and stats["batches"] == 3
+    # the POSTs run concurrently, so they may arrive in any order; each
+    # batch keeps its items in claim order
+    batches = sorted(receiver.bodies, key=lambda batch: batch[0]["payload"]["n"])
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    items = [item for batch in batches for item in batch]
+    assert [item["payload"] for item in items] == [{"n": i} for i in range(25)]
+    assert {h["Content-Encoding"] for h in receiver.headers} == {"gzip"}
+    assert sorted(h["X-Webhook-Batch"] for h in receiver.headers) == ["10", "10", "5"]
+    # destinations without settings are unchanged: one plain POST per payload
+    assert sorted(other.bodies, key=lambda body: body["n"]) == [{"n": 0}, {"n": 1}]
+    assert not any("Content-Encoding" in h for h in other.headers)
+    history = db.query(models.WebhookHistory).all()
+    assert {h.webhook_id for h in history} >= {item["id"] for item in items}
+
+
+def test_batch_items_fail_individually(db, receivers):
+    def reply(batch):
+        return {
+            "failed": [
+                {"id": item["id"], "error": "bad n"}
+                for item in batch
+                if item["payload"]["n"] == 1
+            ]
+        }
+
+    receiver = receivers(statuses=[200, 500], reply=reply)
+    db.add(models.WebhookDestination(url=receiver.url, batch_size=3))
+    db.commit()
+    _enqueue_many(db, receiver.url, 3)
+    assert _drain()[0] == 2
+    (row,) = db.query(models.WebhookQueue).all()
+    assert json.loads(row.payload) == {"n": 1}
+    assert (row.attempts, row.last_error) == (1, "rejected: bad n")
+
+    # a failed batch POST fails each of its items
+    row.next_attempt_at = datetime.datetime.utcnow()
+    db.commit()
+    assert _drain()[0] == 0
+    db.expire_all()
+    assert (row.attempts, row.last_error) == (2, "HTTP 500")
+
+
+def test_backoff_is_fully_jittered_and_capped():
+    delays = [webhooks.backoff_seconds(3) for _ in range(200)]
+    assert all(0 <= d <= 8 for d in delays)
+    assert len(set(delays)) > 100  # retries of one outage don't land together
+    assert max(webhooks.backoff_seconds(40) for _ in range(50)) <= (
+        webhooks.BACKOFF_MAX
+    )
+
+
+def test_circuit_breaker_states():
+    now = [0.0]
+    breaker = webhooks.CircuitBreaker(threshold=3, cooldown=10, clock=lambda: now[0])
+    for _ in range(2):
+        breaker.failure()
+    breaker.success()  # only consecutive failures count
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.retry_in() == 10
+    now[0] = 10
+    assert breaker.allow() and breaker.state == "half-open"
+    assert not breaker.allow()  # one probe at a time
+    breaker.failure()  # the probe failed: open again
+    assert breaker.state == "open" and breaker.retry_in() == 10
+    now[0] = 20
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def _due_rows(db):
+    db.expire_all()
+    return db.query(models.WebhookQueue).order_by(models.WebhookQueue.id).all()
+
+
+def test_open_circuit_skips_the_host_without_requests(db, receivers):
+    down = receivers(statuses=[503] * 100)
+    up = receivers()
+    _enqueue_many(db, down.url, 10)
+    _enqueue_many(db, up.url, 3)
+
+    delivered, stats = _drain(per_host=1, breaker_failures=3, breaker_cooldown=30)
+    assert delivered == 3 and len(up.bodies) == 3
+    assert down.requests == 3  # the circuit opened after the third failure
+    assert stats["skipped"] == 7
+    assert stats["open_circuits"] == [urlsplit(down.url).netloc]
+    rows = _due_rows(db)
+    skipped = [r for r in rows if r.last_error == "circuit open"]
+    assert len(skipped) == 7 and {r.attempts for r in skipped} == {0}
+    soon = datetime.datetime.utcnow() + datetime.timedelta(seconds=25)
+    assert all(r.next_attempt_at > soon for r in skipped)  # after the cooldown
+
+
+def test_malformed_url_counts_as_an_attempt(db, receivers):
+    receiver = receivers()
+    bad = integrations.enqueue_webhook(db, "http://[::1", {"n": 0}).id
+    integrations.enqueue_webhook(db, receiver.url, {"n": 1})
+
+    assert integrations.process_queue_once(db=db, max_attempts=2) == 1
+    assert receiver.bodies == [{"n": 1}]
+    (row,) = _due_rows(db)
+    assert (row.id, row.attempts, row.lease_until) == (bad, 1, None)
+    assert row.last_error.startswith("ValueError")
+
+    row.next_attempt_at = datetime.datetime.utcnow()
+    db.commit()
+    assert integrations.process_queue_once(db=db, max_attempts=2) == 0
+    assert _due_rows(db) == []
+    entry = db.query(models.WebhookHistory).filter_by(webhook_id=bad).one()
+    assert (entry.status, entry.attempts) == ("dead", 2)
+
+
+def test_a_raising_probe_does_not_wedge_the_circuit(monkeypatch):
+    async def main():
+        dispatcher = webhooks.Dispatcher()
+        url = "http://probe.invalid/hook"
+        breaker = dispatcher.breaker(url)
+        client = dispatcher._client()
+
+        async def boom(*args, **kwargs):
+            raise RuntimeError("boom")
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        try:
+            breaker.trip(0)  # the cooldown is over: the next request probes
+            monkeypatch.setattr(client, "post", boom)
+            assert await dispatcher._post(url, b"{}", {}) == (
+                "RuntimeError: boom",
+                None,
+            )
+            assert breaker.state == "open"
+
+            breaker.open_until = 0
+            monkeypatch.setattr(client, "post", hang)
+            probe = asyncio.create_task(dispatcher._post(url, b"{}", {}))
+            await asyncio.sleep(0.05)
+            assert breaker.state == "half-open" and not breaker.allow()
+            probe.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await probe
+            assert breaker.allow()  # the next request probes instead
+        finally:
+            await dispatcher.aclose()
+
+    asyncio.run(main())
+
+
+def test_429_retry_after_pauses_the_host(db, receivers):
+    receiver = receivers(statuses=[429], retry_after=120)
+    _enqueue_many(db, receiver.url, 4)
+
+    delivered, stats = _drain(per_host=1)
+    assert delivered == 0 and receiver.requests == 1
+    rows = _due_rows(db)
+    assert [(r.attempts, r.last_error) for r in rows] == [(1, "HTTP 429")] + [
+        (0, "circuit open")
+    ] * 3
+    earliest = datetime.datetime.utcnow() + datetime.timedelta(seconds=110)
+    assert all(r.next_attempt_at > earliest for r in rows)
+
+
+def test_lease_is_renewed_while_a_slow_pass_delivers(db, receivers):
+    receiver = receivers(delay=0.6)
+    _enqueue_many(db, receiver.url, 3)
+
+    def claim_elsewhere():
+        session = SessionLocal()
+        try:
+            return webhooks.claim_due(session, lease=0.5)[1]
+        finally:
+            session.close()
+
+    async def main():
+        dispatcher = webhooks.Dispatcher(per_host=1)
+        try:
+            # ~1.8 s of deliveries on a 0.5 s lease
+            task = asyncio.create_task(
+                webhooks.process_queue_once(dispatcher, lease=0.5)
+            )
+            await asyncio.sleep(1.2)
+            stolen = await asyncio.to_thread(claim_elsewhere)
+            return stolen, await task
+        finally:
+            await dispatcher.aclose()
+
+    stolen, delivered = asyncio.run(main())
+    assert stolen == []  # still leased: no second worker delivers them again
+    assert delivered == 3 and len(receiver.bodies) == 3
+    assert db.query(models.WebhookQueue).count() == 0